@@ -0,0 +1,120 @@
+import ffmpeg
+import struct
+import numpy as np
+
+# Peaks sidecar layout (little-endian):
+#   header: magic b"SWPK", version u8, bits u8 (8 or 16), level count u16, sample rate u32
+#   per level: samples_per_pixel u32, pixel count u32, then interleaved min/max samples
+PEAKS_MAGIC = b"SWPK"
+PEAKS_VERSION = 1
+
+
+class AudioProcessor:
+    """
+    Handles audio analysis tasks using ffmpeg-python and NumPy.
+    """
+
+    def generate_peaks(self, input_path: str, output_path: str, sample_rate: int = 22050,
+                       samples_per_pixel: int = 256, levels: int = 8, bits: int = 8,
+                       chunk_pixels: int = 4096) -> dict:
+        """
+        Computes multi-resolution min/max waveform peaks and writes them as a binary sidecar.
+
+        PCM is streamed from ffmpeg in chunks, so memory use depends on the
+        chunk size rather than the length of the track. Each coarser level
+        halves the resolution of the one before it.
+
+        Args:
+            input_path: Path to the input audio (or video) file.
+            output_path: Path where the peaks sidecar should be saved.
+            sample_rate: Rate the audio is resampled to before analysis.
+            samples_per_pixel: Samples per min/max pair at the finest level.
+            levels: Maximum number of resolution levels.
+            bits: 8 or 16 bit peak values.
+            chunk_pixels: Finest-level pixels computed per read from ffmpeg.
+
+        Returns:
+            Dict with 'sample_rate', 'bits', 'duration' and 'levels', a list of
+            {'samples_per_pixel', 'length'} entries.
+        """
+        if bits not in (8, 16):
+            raise ValueError("bits must be 8 or 16")
+
+        process = (
+            ffmpeg
+            .input(input_path)
+            .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=sample_rate)
+            .global_args('-nostats', '-loglevel', 'error')  # keep stderr small; it is only read at the end
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+
+        mins, maxs = [], []
+        total_samples = 0
+        leftover = np.empty(0, dtype=np.int16)
+        chunk_bytes = chunk_pixels * samples_per_pixel * 2
+        try:
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+                total_samples += len(samples)
+                if len(leftover):
+                    samples = np.concatenate([leftover, samples])
+                whole = len(samples) - len(samples) % samples_per_pixel
+                if whole:
+                    blocks = samples[:whole].reshape(-1, samples_per_pixel)
+                    mins.append(blocks.min(axis=1))
+                    maxs.append(blocks.max(axis=1))
+                leftover = samples[whole:]
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            process.wait()
+
+        if process.returncode != 0:
+            print('stderr:', stderr.decode('utf8'))
+            raise ffmpeg.Error('ffmpeg', b'', stderr)
+
+        if len(leftover):
+            mins.append(leftover.min(keepdims=True))
+            maxs.append(leftover.max(keepdims=True))
+
+        level_min = np.concatenate(mins) if mins else np.zeros(1, dtype=np.int16)
+        level_max = np.concatenate(maxs) if maxs else np.zeros(1, dtype=np.int16)
+
+        out_levels = []
+        spp = samples_per_pixel
+        for _ in range(levels):
+            out_levels.append((spp, level_min, level_max))
+            if len(level_min) < 2:
+                break
+            # Halve the resolution: pair up neighbours, padding odd lengths with the last value
+            if len(level_min) % 2:
+                level_min = np.append(level_min, level_min[-1])
+                level_max = np.append(level_max, level_max[-1])
+            level_min = level_min.reshape(-1, 2).min(axis=1)
+            level_max = level_max.reshape(-1, 2).max(axis=1)
+            spp *= 2
+
+        dtype = '<i1' if bits == 8 else '<i2'
+        with open(output_path, "wb") as f:
+            f.write(struct.pack("<4sBBHI", PEAKS_MAGIC, PEAKS_VERSION, bits, len(out_levels), sample_rate))
+            for spp, level_min, level_max in out_levels:
+                if bits == 8:
+                    level_min = level_min >> 8
+                    level_max = level_max >> 8
+                interleaved = np.empty(len(level_min) * 2, dtype=dtype)
+                interleaved[0::2] = level_min
+                interleaved[1::2] = level_max
+                f.write(struct.pack("<II", spp, len(level_min)))
+                f.write(interleaved.tobytes())
+
+        print(f"Waveform peaks ({len(out_levels)} levels) written to {output_path}")
+        return {
+            "sample_rate": sample_rate,
+            "bits": bits,
+            "duration": total_samples / sample_rate,
+            "levels": [{"samples_per_pixel": spp, "length": len(m)} for spp, m, _ in out_levels]
+        }
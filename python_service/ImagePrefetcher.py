@@ -0,0 +1,108 @@
+import io
+import os
+import asyncio
+import requests
+from PIL import Image
+
+class ImagePrefetcher:
+    """
+    Fetches storyboard panel images concurrently and downsamples them to print size.
+    """
+    def __init__(self, storage_manager=None, concurrency: int = 8,
+                 memory_limit: int = 128 * 1024 * 1024, max_image_bytes: int = 16 * 1024 * 1024,
+                 timeout: float = 15.0):
+        """
+        Initialize the ImagePrefetcher.
+
+        Args:
+            storage_manager: Used to read sources that are bucket paths rather than URLs.
+            concurrency: Maximum number of images fetched at once.
+            memory_limit: Cap on raw image bytes held in flight. Together with
+                          max_image_bytes this can lower the effective concurrency.
+            max_image_bytes: Sources larger than this are skipped.
+            timeout: Per-request HTTP timeout in seconds.
+        """
+        self.storage_manager = storage_manager
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self.concurrency = max(1, min(concurrency, memory_limit // max_image_bytes))
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def read_source(self, source: str) -> bytes:
+        """
+        Reads the raw bytes of an image from a URL, a local path or a bucket path.
+        """
+        if source.startswith(("http://", "https://")):
+            with self.session.get(source, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                chunks, size = [], 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        raise ValueError(f"Image larger than {self.max_image_bytes} bytes")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+
+        if os.path.exists(source):
+            if os.path.getsize(source) > self.max_image_bytes:
+                raise ValueError(f"Image larger than {self.max_image_bytes} bytes")
+            with open(source, "rb") as f:
+                return f.read()
+
+        if self.storage_manager:
+            return self.storage_manager.download_as_bytes(source, max_bytes=self.max_image_bytes)
+
+        raise ValueError(f"Cannot resolve image source {source}")
+
+    @staticmethod
+    def downscale(data: bytes, width_px: int, height_px: int, quality: int = 85) -> bytes:
+        """
+        Shrinks an image to fit within width_px x height_px and re-encodes it as JPEG.
+
+        Images that are already small enough are only re-encoded.
+        """
+        img = Image.open(io.BytesIO(data))
+        # For JPEGs, let the decoder scale by 1/2, 1/4 or 1/8 instead of decoding full size
+        img.draft("RGB", (width_px, height_px))
+        img = img.convert("RGB")
+        img.thumbnail((width_px, height_px), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+    def fetch_one(self, source: str, width_px: int, height_px: int):
+        try:
+            return self.downscale(self.read_source(source), width_px, height_px)
+        except Exception as e:
+            print(f"Could not prefetch image {source}: {e}")
+            return None
+
+    async def fetch_all(self, sources: list, width_in: float, height_in: float, dpi: int = 150) -> dict:
+        """
+        Fetches and downsamples every source concurrently.
+
+        Args:
+            sources: Image URLs or paths; duplicates and empty values are ignored.
+            width_in: Panel width in inches.
+            height_in: Panel height in inches.
+            dpi: Target print resolution.
+
+        Returns:
+            Dict mapping each source to JPEG bytes, or None if it could not be fetched.
+        """
+        width_px, height_px = int(width_in * dpi), int(height_in * dpi)
+        unique = list(dict.fromkeys(s for s in sources if s))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def fetch(source):
+            async with semaphore:
+                return await loop.run_in_executor(None, self.fetch_one, source, width_px, height_px)
+
+        results = await asyncio.gather(*(fetch(s) for s in unique))
+        return dict(zip(unique, results))
@@ -1,5 +1,6 @@
 import datetime
 from google.cloud import storage
+from google.api_core.exceptions import NotFound
 
 class StorageManager:
     """
@@ -78,3 +79,85 @@ class StorageManager:
         blob = self.bucket.blob(source_blob_name)
         blob.download_to_filename(destination_file_name)
         print(f"Downloaded {source_blob_name} to {destination_file_name}")
+
+    def download_as_bytes(self, source_blob_name: str, max_bytes: int = None) -> bytes:
+        """
+        Downloads a blob into memory.
+
+        Args:
+            source_blob_name: The name of the blob.
+            max_bytes: If given, blobs larger than this are refused before
+                       anything is downloaded.
+
+        Returns:
+            The blob contents.
+
+        Raises:
+            ValueError: If the blob is larger than max_bytes.
+        """
+        if max_bytes is None:
+            return self.bucket.blob(source_blob_name).download_as_bytes()
+
+        blob = self.bucket.get_blob(source_blob_name)
+        if blob is None:
+            raise NotFound(f"Blob {source_blob_name} not found")
+        if blob.size > max_bytes:
+            raise ValueError(f"Blob larger than {max_bytes} bytes")
+        # Pinned to the checked generation, so a larger replacement can't slip through
+        return blob.download_as_bytes(if_generation_match=blob.generation)
+
+    def open_read(self, source_blob_name: str, chunk_size: int = 1024 * 1024):
+        """
+        Opens a blob for streaming reads.
+
+        Args:
+            source_blob_name: The name of the blob.
+            chunk_size: Bytes fetched per ranged request.
+
+        Returns:
+            A readable file-like object; close it when done.
+        """
+        blob = self.bucket.blob(source_blob_name)
+        return blob.open("rb", chunk_size=chunk_size)
+
+    def open_writer(self, destination_blob_name: str, content_type: str = None,
+                    chunk_size: int = 8 * 1024 * 1024):
+        """
+        Opens a blob for streaming writes through a resumable upload.
+
+        The object only appears in the bucket once the writer is closed.
+
+        Args:
+            destination_blob_name: The path/name of the file in the bucket.
+            content_type: Content type stored with the object.
+            chunk_size: Bytes buffered per upload request (a multiple of 256 KiB).
+
+        Returns:
+            A writable file-like object.
+        """
+        blob = self.bucket.blob(destination_blob_name)
+        return blob.open("wb", chunk_size=chunk_size, content_type=content_type)
+
+    def list_blobs(self, prefix: str) -> list:
+        """
+        Lists the blobs under a prefix.
+
+        Args:
+            prefix: Name prefix, usually ending in '/'.
+
+        Returns:
+            (name, last updated) pairs, with timezone-aware UTC datetimes.
+        """
+        return [(blob.name, blob.updated) for blob in self.client.list_blobs(self.bucket, prefix=prefix)]
+
+    def delete_file(self, blob_name: str):
+        """
+        Deletes a blob from the bucket, ignoring blobs that do not exist.
+
+        Args:
+            blob_name: The name of the blob.
+        """
+        try:
+            self.bucket.blob(blob_name).delete()
+        except NotFound:
+            pass
@@ -1,4 +1,6 @@
 import ffmpeg
+import bisect
+import math
 import os
 
 class VideoProcessor:
@@ -6,20 +8,25 @@ class VideoProcessor:
     Handles video processing tasks using ffmpeg-python.
     """
 
-    def create_proxy(self, input_path: str, output_path: str):
+    def create_proxy(self, input_path: str, output_path: str, sprite_path: str = None):
         """
         Downscales video to 720p .mp4 with CRF 23 for web editor proxy.
 
         Args:
             input_path: Path to the input video file.
             output_path: Path where the proxy video should be saved.
+            sprite_path: If given, also writes a scrub sprite sheet here.
+
+        Returns:
+            The sprite sheet layout from generate_sprite_sheet, or None.
         """
         try:
             (
                 ffmpeg
                 .input(input_path)
                 .filter('scale', -2, 720) # Scale height to 720, keep aspect ratio (width divisible by 2)
-                .output(output_path, vcodec='libx264', crf=23, preset='fast', acodec='aac')
+                .output(output_path, vcodec='libx264', crf=23, preset='fast', acodec='aac',
+                        movflags='+faststart') # moov atom first so progressive playback can start early
                 .overwrite_output()
                 .run(capture_stdout=True, capture_stderr=True)
             )
@@ -29,6 +36,183 @@ class VideoProcessor:
             print('stderr:', e.stderr.decode('utf8'))
             raise e
 
+        # Thumbnails come from the 720p proxy, which is much cheaper to decode than the source
+        if sprite_path:
+            return self.generate_sprite_sheet(output_path, sprite_path)
+        return None
+
+    def package_hls(self, input_path: str, output_dir: str, renditions: list = None,
+                    segment_seconds: int = 4, fps: float = 24.0) -> dict:
+        """
+        Packages a video as HLS with fMP4 segments at one or more bitrates.
+
+        All renditions come out of a single ffmpeg run: the source is decoded
+        once and split into one scaled encode per rendition. Keyframes are
+        forced on segment boundaries so every rendition switches cleanly.
+
+        Args:
+            input_path: Path to the input video file (normally the proxy).
+            output_dir: Directory for the playlists and segments.
+            renditions: List of (height, video_bitrate) tuples, highest first.
+            segment_seconds: Target segment duration.
+            fps: Frame rate used to size the GOP.
+
+        Returns:
+            Dict with 'master' (playlist filename), 'renditions' and 'files',
+            every filename written to `output_dir`.
+        """
+        renditions = renditions or [(720, '2500k'), (360, '800k')]
+        os.makedirs(output_dir, exist_ok=True)
+        gop = int(round(segment_seconds * fps))
+
+        try:
+            probe = ffmpeg.probe(input_path)
+        except ffmpeg.Error as e:
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
+        has_audio = any(s.get('codec_type') == 'audio' for s in probe.get('streams', []))
+
+        source = ffmpeg.input(input_path)
+        split = source.video.filter_multi_output('split', len(renditions))
+
+        streams = []
+        stream_map = []
+        codec_args = {}
+        for i, (height, bitrate) in enumerate(renditions):
+            streams.append(split[i].filter('scale', -2, height))
+            if has_audio:
+                streams.append(source.audio)
+            stream_map.append(f"v:{i},a:{i}" if has_audio else f"v:{i}")
+            codec_args[f'b:v:{i}'] = bitrate
+            codec_args[f'maxrate:v:{i}'] = bitrate
+            codec_args[f'bufsize:v:{i}'] = bitrate
+
+        try:
+            (
+                ffmpeg
+                .output(
+                    *streams,
+                    os.path.join(output_dir, 'stream_%v.m3u8'),
+                    vcodec='libx264', preset='fast', acodec='aac', ac=2,
+                    g=gop, keyint_min=gop, sc_threshold=0,
+                    f='hls', hls_time=segment_seconds, hls_playlist_type='vod',
+                    hls_segment_type='fmp4',
+                    hls_fmp4_init_filename='init_%v.mp4',
+                    hls_segment_filename=os.path.join(output_dir, 'seg_%v_%03d.m4s'),
+                    master_pl_name='master.m3u8',
+                    var_stream_map=' '.join(stream_map),
+                    **codec_args
+                )
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+            print(f"HLS ({len(renditions)} renditions) packaged in {output_dir}")
+        except ffmpeg.Error as e:
+            print('stdout:', e.stdout.decode('utf8'))
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
+
+        return {
+            "master": "master.m3u8",
+            "renditions": [{"height": h, "bitrate": b} for h, b in renditions],
+            "files": sorted(os.listdir(output_dir))
+        }
+
+    def generate_sprite_sheet(self, input_path: str, output_path: str, interval: float = 1.0,
+                              columns: int = 10, thumb_width: int = 160, max_thumbnails: int = 100) -> dict:
+        """
+        Tiles thumbnails taken every `interval` seconds into a single JPEG.
+
+        Long videos are sampled more sparsely so the sheet never holds more
+        than `max_thumbnails` tiles.
+
+        Args:
+            input_path: Path to the input video file.
+            output_path: Path where the sprite JPEG should be saved.
+            interval: Seconds between thumbnails.
+            columns: Maximum number of tiles per row.
+            thumb_width: Width of each tile in pixels.
+            max_thumbnails: Upper bound on the number of tiles.
+
+        Returns:
+            Dict describing the layout: 'interval', 'count', 'columns', 'rows',
+            'thumb_width', 'thumb_height' and 'duration'.
+        """
+        try:
+            probe = ffmpeg.probe(input_path, select_streams='v:0')
+        except ffmpeg.Error as e:
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
+
+        stream = probe['streams'][0]
+        duration = float(stream.get('duration') or probe['format'].get('duration') or interval)
+        thumb_height = int(round(thumb_width * int(stream['height']) / int(stream['width']) / 2)) * 2
+
+        count = max(1, math.ceil(duration / interval))
+        if count > max_thumbnails:
+            count = max_thumbnails
+            interval = duration / count
+        columns = min(columns, count)
+        rows = math.ceil(count / columns)
+
+        try:
+            (
+                ffmpeg
+                .input(input_path)
+                .filter('fps', fps=1 / interval)
+                .filter('scale', thumb_width, thumb_height)
+                .filter('tile', f"{columns}x{rows}")
+                .output(output_path, vframes=1, **{'q:v': 4})
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+            print(f"Sprite sheet ({count} tiles) created at {output_path}")
+        except ffmpeg.Error as e:
+            print('stdout:', e.stdout.decode('utf8'))
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
+
+        return {
+            "interval": interval,
+            "count": count,
+            "columns": columns,
+            "rows": rows,
+            "thumb_width": thumb_width,
+            "thumb_height": thumb_height,
+            "duration": duration
+        }
+
+    @staticmethod
+    def build_thumbnail_vtt(sprite: dict, sprite_url: str) -> str:
+        """
+        Builds a WebVTT thumbnail track pointing into a sprite sheet.
+
+        Args:
+            sprite: Layout returned by generate_sprite_sheet.
+            sprite_url: URL of the sprite image, relative to the VTT file.
+
+        Returns:
+            The VTT document as a string.
+        """
+        def timestamp(seconds: float) -> str:
+            millis = int(round(seconds * 1000))
+            hours, millis = divmod(millis, 3600000)
+            minutes, millis = divmod(millis, 60000)
+            secs, millis = divmod(millis, 1000)
+            return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+        w, h = sprite["thumb_width"], sprite["thumb_height"]
+        lines = ["WEBVTT", ""]
+        for i in range(sprite["count"]):
+            start = i * sprite["interval"]
+            end = min((i + 1) * sprite["interval"], sprite["duration"])
+            x = (i % sprite["columns"]) * w
+            y = (i // sprite["columns"]) * h
+            lines.append(f"{timestamp(start)} --> {timestamp(end)}")
+            lines.append(f"{sprite_url}#xywh={x},{y},{w},{h}")
+            lines.append("")
+        return "\n".join(lines)
+
     def conform_framerate(self, input_path: str, output_path: str, fps: float = 23.976):
         """
         Forces standard frame rate for export.
@@ -105,3 +289,87 @@ class VideoProcessor:
                 os.remove(list_path)
             except Exception as e2:
                 raise e
+
+    def build_keyframe_index(self, input_path: str) -> dict:
+        """
+        Builds a seek index of the keyframes in the first video stream.
+
+        Only packet headers are read, so this is cheap compared to a decode
+        and only needs to run once per video.
+
+        Args:
+            input_path: Path to the input video file.
+
+        Returns:
+            Dict with 'fps', 'duration' and 'keyframes', a list of
+            [pts_seconds, byte_offset] pairs sorted by time.
+        """
+        try:
+            probe = ffmpeg.probe(
+                input_path,
+                select_streams='v:0',
+                show_packets=None,
+                show_entries='packet=pts_time,pos,flags'
+            )
+        except ffmpeg.Error as e:
+            print('stdout:', e.stdout.decode('utf8'))
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
+
+        stream = probe['streams'][0] if probe.get('streams') else {}
+        num, _, den = stream.get('avg_frame_rate', '24/1').partition('/')
+        fps = float(num) / float(den or 1) if float(den or 1) else 24.0
+
+        keyframes = []
+        for packet in probe.get('packets', []):
+            if 'K' not in packet.get('flags', '') or packet.get('pts_time') in (None, 'N/A'):
+                continue
+            pos = packet.get('pos')
+            keyframes.append([float(packet['pts_time']), int(pos) if pos not in (None, 'N/A') else -1])
+        keyframes.sort(key=lambda k: k[0])
+
+        duration = stream.get('duration') or probe.get('format', {}).get('duration') or 0
+        return {
+            "fps": fps or 24.0,
+            "duration": float(duration),
+            "keyframes": keyframes
+        }
+
+    @staticmethod
+    def nearest_keyframe(keyframe_index: dict, timestamp: float) -> float:
+        """
+        Returns the timestamp of the last keyframe at or before `timestamp`.
+        """
+        times = [k[0] for k in keyframe_index.get("keyframes", [])]
+        i = bisect.bisect_right(times, timestamp)
+        return times[i - 1] if i > 0 else 0.0
+
+    def extract_frame(self, input_path: str, output_path: str, timestamp: float,
+                      keyframe_index: dict = None, width: int = 320):
+        """
+        Extracts a single JPEG frame at `timestamp`.
+
+        With a keyframe index the demuxer jumps straight to the preceding
+        keyframe and only the frames between it and `timestamp` are decoded.
+
+        Args:
+            input_path: Path to the input video file.
+            output_path: Path where the JPEG should be saved.
+            timestamp: Time of the frame in seconds.
+            keyframe_index: Index from build_keyframe_index, if available.
+            width: Output width in pixels (height keeps aspect ratio).
+        """
+        seek_from = self.nearest_keyframe(keyframe_index, timestamp) if keyframe_index else 0.0
+        try:
+            (
+                ffmpeg
+                .input(input_path, ss=seek_from, noaccurate_seek=None)
+                .filter('scale', width, -2)
+                .output(output_path, ss=max(0.0, timestamp - seek_from), vframes=1, **{'q:v': 3})
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+        except ffmpeg.Error as e:
+            print('stdout:', e.stdout.decode('utf8'))
+            print('stderr:', e.stderr.decode('utf8'))
+            raise e
@@ -1,10 +1,16 @@
 import os
+import time
+import hashlib
+import requests as http_requests
+from cachecontrol import CacheControl
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from google.oauth2 import id_token
 from google.auth.transport import requests
-from database import get_db
+from database import get_db, id_filter
 from models import User
+from cache import TTLCache
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 # Security Scheme
@@ -12,6 +18,40 @@ security = HTTPBearer()
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
+# One HTTP session for the whole process; CacheControl keeps Google's signing
+# certs for as long as their Cache-Control header allows instead of refetching
+# them for every verification
+_cert_session = CacheControl(http_requests.Session())
+_google_request = requests.Request(session=_cert_session)
+
+# sha256(token) -> verified claims, each entry living until the token's exp
+token_cache = TTLCache(
+    "id_tokens",
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=3600
+)
+
+# user id -> users document. Kept short since writes from other workers are
+# only picked up on expiry; writes in this process call invalidate_user().
+user_cache = TTLCache(
+    "users",
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30"))
+)
+
+# (user_id, project_id) pairs known to be allowed. Only grants are cached, so a
+# freshly created project is never shadowed by a cached denial.
+project_access_cache = TTLCache(
+    "project_access",
+    maxsize=int(os.getenv("PROJECT_ACCESS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PROJECT_ACCESS_CACHE_TTL", "60"))
+)
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("projects", {"id": "p", "user_id": "u"}, None),
+]
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorDatabase = Depends(get_db)
@@ -21,24 +61,13 @@ async def get_current_user(
     Syncs the user to MongoDB if they don't exist.
     """
     token = credentials.credentials
-    
-    try:
-        # Verify the token
-        id_info = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
-        
-        # Extract info
-        google_sub = id_info.get("sub")
-        email = id_info.get("email")
-        
-        if not google_sub or not email:
-            raise ValueError("Invalid token payload")
-            
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid authentication credentials: {str(e)}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    id_info = await verify_token(token)
+    google_sub = id_info["sub"]
+    email = id_info["email"]
+
+    user_doc = user_cache.get(google_sub)
+    if user_doc is not None:
+        return User(**user_doc)
 
     # Sync User Logic
     users_collection = db.get_collection("users")
@@ -49,11 +78,50 @@ async def get_current_user(
     if not user_doc:
         # Create new user
         new_user = User(id=google_sub, email=email, credits_balance=10) # 10 free credits
-        await users_collection.insert_one(new_user.model_dump(by_alias=True))
-        return new_user
+        user_doc = new_user.model_dump(by_alias=True)
+        await users_collection.insert_one(user_doc)
     
+    user_cache.set(google_sub, user_doc)
     return User(**user_doc)
 
+async def verify_token(token: str) -> dict:
+    """
+    Verify a Google ID token, returning its claims.
+
+    Verified claims are cached under the token's hash until the token
+    expires, so repeat requests skip the signature check.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    id_info = token_cache.get(key)
+    if id_info is not None:
+        # Entries never outlive exp, but guard against clock adjustments anyway
+        if id_info["exp"] > time.time():
+            return id_info
+        token_cache.invalidate(key)
+
+    try:
+        # RSA verification (and the occasional cert fetch) stays off the event loop
+        id_info = await run_in_threadpool(
+            id_token.verify_oauth2_token, token, _google_request, GOOGLE_CLIENT_ID
+        )
+        
+        if not id_info.get("sub") or not id_info.get("email"):
+            raise ValueError("Invalid token payload")
+            
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid authentication credentials: {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    token_cache.set(key, id_info, ttl=id_info["exp"] - time.time())
+    return id_info
+
+def invalidate_user(user_id: str):
+    """Drop a cached user document, e.g. after its role or credits changed"""
+    user_cache.invalidate(user_id)
+
 # Alias for easy use in endpoints
 RequireAuth = Depends(get_current_user)
 
@@ -66,3 +134,40 @@ def get_admin_user(user: User = RequireAuth) -> User:
     return user
 
 RequireAdmin = Depends(get_admin_user)
+
+
+async def ensure_project_access(db: AsyncIOMotorDatabase, user: User, project_id: str):
+    """
+    Raise 404 unless `user` owns the project.
+
+    For project ids taken from a request body; routes with a project_id
+    path or query parameter use RequireProjectAccess instead.
+    """
+    key = (user.id, project_id)
+    if project_access_cache.get(key):
+        return
+
+    project = await db.get_collection("projects").find_one(
+        id_filter(project_id, user_id=user.id), {"_id": 1}
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    project_access_cache.set(key, True)
+
+
+async def get_project_access(
+    project_id: str,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+) -> str:
+    """Dependency checking ownership of the `project_id` path/query parameter"""
+    await ensure_project_access(db, user, project_id)
+    return project_id
+
+
+def invalidate_project_access(project_id: str):
+    """Forget cached grants for a project, e.g. after it was deleted or changed owner"""
+    project_access_cache.invalidate_where(lambda key: key[1] == project_id)
+
+
+RequireProjectAccess = Depends(get_project_access)
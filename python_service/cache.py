@@ -0,0 +1,92 @@
+"""
+In-process TTL/LRU caches.
+
+Each cache holds at most `maxsize` entries, evicting the least recently
+used, and drops entries older than `ttl` seconds on access. Caches are
+per process: every worker keeps its own copy, so anything cached here
+must tolerate being up to `ttl` seconds stale on the other workers after
+an invalidation.
+
+Every cache registers itself by name; cache_stats() reports hit rates
+for all of them (served at /api/admin/cache-stats).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+_caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Least-recently-used mapping whose entries expire after `ttl` seconds.
+    """
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (expires_at, value), oldest access first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Also used from threadpool workers, e.g. by code run through run_in_threadpool
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store `value`; `ttl` overrides the cache default for this entry"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches `predicate`"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Statistics of every cache created in this process, by name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,293 @@
+"""
+Per-project change tracking for delta sync.
+
+Every project carries a monotonic `version` counter. Each write to a
+scene, shot, asset or comment takes the next version with stamp() and
+stores it, together with `updated_at`, on the document; deletions leave
+a tombstone carrying the version instead. A client that last synced at
+version N then only needs the documents and tombstones with a version
+above N:
+
+    GET /api/projects/{id}/changes?since=<cursor>
+
+Cursors are issued by the snapshot and changes endpoints and encode the
+version along with when they were issued. A version is taken just before
+its write lands, so a read can race a write whose version is already
+counted; every sync therefore also re-sends documents stamped within
+SETTLE_SECONDS before the cursor was issued (clients apply changes
+idempotently, by id). Tombstones are kept for
+TOMBSTONE_RETENTION_DAYS, so a cursor older than that can no longer
+account for every deletion and is rejected; the client reloads the
+snapshot instead.
+
+tail_changes() pushes the same deltas live from a MongoDB change stream
+(replica sets and Atlas only).
+
+The version also validates cached list responses: revalidate() derives
+an ETag from it, so a client's If-None-Match is answered with 304 after
+reading the project's version alone.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from database import id_filter
+from media_response import etag_matches
+
+# Collections whose documents are versioned per project and reported by /changes
+SYNCED_COLLECTIONS = ("scenes", "shots", "assets", "comments")
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Longest a write is expected to take to land after stamp()
+SETTLE_SECONDS = 5
+
+# Past this many changed documents a client is better off reloading the snapshot
+MAX_CHANGES = 5000
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans;
+# changes_since reads each of SYNCED_COLLECTIONS plus tombstones
+QUERY_SHAPES = [
+    ("projects", {"id": "p"}, None),
+    *(
+        (collection, {"project_id": "p", "$or": [{"version": {"$gt": 0}}, {"updated_at": {"$gte": datetime(2000, 1, 1)}}]}, [("version", 1)])
+        for collection in ("scenes", "shots", "assets", "comments")
+    ),
+    ("tombstones", {"project_id": "p", "$or": [{"version": {"$gt": 0}}, {"deleted_at": {"$gte": datetime(2000, 1, 1)}}]}, [("version", 1)]),
+]
+
+
+async def current_version(db: AsyncIOMotorDatabase, project_id: str) -> int:
+    project = await db.get_collection("projects").find_one(id_filter(project_id), {"version": 1})
+    return (project or {}).get("version", 0)
+
+
+async def stamp(db: AsyncIOMotorDatabase, project_id: str) -> dict:
+    """
+    Take the project's next version.
+
+    Returns:
+        {"updated_at", "version"} to $set on (or merge into) the written documents.
+    """
+    project = await db.get_collection("projects").find_one_and_update(
+        id_filter(project_id),
+        {"$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return {"updated_at": datetime.utcnow(), "version": (project or {}).get("version", 0)}
+
+
+async def record_deletions(
+    db: AsyncIOMotorDatabase,
+    project_id: str,
+    collection: str,
+    ids: Iterable[str]
+):
+    """Leave tombstones for documents about to be (or just) deleted from `collection`"""
+    ids = [doc_id for doc_id in ids if doc_id]
+    if not ids:
+        return
+    version = (await stamp(db, project_id))["version"]
+    deleted_at = datetime.utcnow()
+    await db.get_collection("tombstones").insert_many([
+        {
+            "project_id": project_id,
+            "collection": collection,
+            "id": doc_id,
+            "version": version,
+            "deleted_at": deleted_at
+        }
+        for doc_id in ids
+    ])
+
+
+async def revalidate(
+    request: Request,
+    response: Response,
+    db: AsyncIOMotorDatabase,
+    project_id: str
+) -> Optional[Response]:
+    """
+    Conditional GET for a project's lists.
+
+    Sets the ETag for the current project version on `response` and
+    returns a 304 response when the request's If-None-Match already holds
+    it; otherwise None, and the caller builds the list as usual.
+    """
+    version = await current_version(db, project_id)
+    # The path and query pick the list, page and fields; the user is implied by the project
+    variant = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode("utf-8")).hexdigest()[:16]
+    # Weak: the compression middleware may re-encode the body
+    etag = f'W/"{version}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def encode_changes_cursor(version: int) -> str:
+    return f"{version}.{int(time.time())}"
+
+
+def decode_changes_cursor(cursor: str) -> Tuple[int, float]:
+    """
+    Returns:
+        (version, issued_at as a unix timestamp)
+
+    Raises:
+        ValueError: If the cursor is malformed.
+        LookupError: If it predates the tombstone retention window.
+    """
+    try:
+        version, issued_at = (int(part) for part in cursor.split("."))
+    except ValueError:
+        raise ValueError("Invalid changes cursor")
+    if time.time() - issued_at > TOMBSTONE_RETENTION_DAYS * 86400:
+        raise LookupError("Changes cursor expired; reload the project snapshot")
+    return version, issued_at
+
+
+async def changes_since(db: AsyncIOMotorDatabase, project_id: str, since: int, issued_at: float) -> dict:
+    """
+    Documents and deletions with a version above `since`, plus any stamped
+    within SETTLE_SECONDS before `issued_at`.
+
+    Returns:
+        {"version", "reset", "changed": {collection: [docs]}, "deleted": {collection: [ids]}}.
+        "reset" is true (and the lists empty) when there are more than
+        MAX_CHANGES changes to send.
+    """
+    # Read before querying, so nothing newer than the returned version is skipped next time
+    version = await current_version(db, project_id)
+    settle_from = datetime.utcfromtimestamp(issued_at) - timedelta(seconds=SETTLE_SECONDS)
+
+    async def fetch(collection: str, projection: dict, stamped_at: str = "updated_at") -> List[dict]:
+        query = {
+            "project_id": project_id,
+            "$or": [{"version": {"$gt": since}}, {stamped_at: {"$gte": settle_from}}]
+        }
+        return await db.get_collection(collection).find(query, projection).sort(
+            "version", 1
+        ).to_list(length=MAX_CHANGES + 1)
+
+    results = await asyncio.gather(
+        *(fetch(collection, {"_id": 0}) for collection in SYNCED_COLLECTIONS),
+        fetch("tombstones", {"_id": 0, "collection": 1, "id": 1}, stamped_at="deleted_at")
+    )
+    *changed_lists, tombstones = results
+
+    if sum(len(docs) for docs in results) > MAX_CHANGES:
+        return {"version": version, "reset": True, "changed": {}, "deleted": {}}
+
+    deleted: Dict[str, List[str]] = {}
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone["collection"], []).append(tombstone["id"])
+
+    return {
+        "version": version,
+        "reset": False,
+        "changed": {
+            collection: docs for collection, docs in zip(SYNCED_COLLECTIONS, changed_lists) if docs
+        },
+        "deleted": deleted
+    }
+
+
+async def tail_changes(
+    db: AsyncIOMotorDatabase,
+    project_id: str,
+    since: int,
+    issued_at: float
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Live deltas for a project from a change stream.
+
+    The stream is opened first and the backlog since the cursor
+    (changes_since) sent next, so nothing written before or while the
+    stream opens is missed; a document may arrive twice. Yields
+    ("change", {"collection", "document"}) and ("delete", {"collection", "id"}),
+    ("heartbeat", version) after the backlog and whenever nothing happened
+    for a while, or a single ("reset", None) when the backlog is too large
+    to send.
+
+    The heartbeat version only moves over contiguous versions, so a cursor
+    made from it never skips a write still on its way. A missing version
+    is given up on (its write failed) once a later one was stamped more
+    than twice SETTLE_SECONDS ago.
+
+    Raises:
+        OperationFailure: If the deployment doesn't support change streams.
+    """
+    pipeline = [
+        {"$match": {
+            "operationType": {"$in": ["insert", "update", "replace"]},
+            "ns.coll": {"$in": [*SYNCED_COLLECTIONS, "tombstones"]},
+            "fullDocument.project_id": project_id,
+            "fullDocument.version": {"$gt": since}
+        }}
+    ]
+    async with db.watch(pipeline, full_document="updateLookup", max_await_time_ms=15000) as stream:
+        backlog = await changes_since(db, project_id, since, issued_at)
+        if backlog["reset"]:
+            yield "reset", None
+            return
+        for collection, documents in backlog["changed"].items():
+            for document in documents:
+                yield "change", {"collection": collection, "document": document}
+        for collection, ids in backlog["deleted"].items():
+            for doc_id in ids:
+                yield "delete", {"collection": collection, "id": doc_id}
+
+        # Every version up to the one read before the backlog queries was either
+        # in the backlog or lands after the stream opened
+        last_version = max(since, backlog["version"])
+        # Versions received past last_version -> when they were stamped
+        ahead: Dict[int, datetime] = {}
+
+        yield "heartbeat", last_version
+        while stream.alive:
+            change = await stream.try_next()
+            if change is None:
+                last_version = _advance_version(last_version, ahead)
+                yield "heartbeat", last_version
+                continue
+
+            document = change["fullDocument"]
+            document.pop("_id", None)
+            collection = change["ns"]["coll"]
+
+            version = document.get("version", 0)
+            if version > last_version:
+                stamped_at = document.get("deleted_at" if collection == "tombstones" else "updated_at")
+                ahead[version] = stamped_at or datetime.utcnow()
+                last_version = _advance_version(last_version, ahead)
+
+            if collection == "tombstones":
+                yield "delete", {"collection": document["collection"], "id": document["id"]}
+            else:
+                yield "change", {"collection": collection, "document": document}
+
+
+def _advance_version(version: int, ahead: Dict[int, datetime]) -> int:
+    """Move `version` over every received (or abandoned) version that follows it"""
+    abandoned_before = datetime.utcnow() - timedelta(seconds=2 * SETTLE_SECONDS)
+    while ahead:
+        following = version + 1
+        if following in ahead:
+            del ahead[following]
+        elif not any(later > following and stamped_at <= abandoned_before for later, stamped_at in ahead.items()):
+            break
+        version = following
+    return version
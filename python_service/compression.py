@@ -0,0 +1,117 @@
+"""
+Response compression.
+
+Bodies of at least COMPRESSION_MIN_BYTES are encoded with brotli when the
+client accepts it and the `brotli` package is installed, and with gzip
+otherwise. Media, archives, event streams and partial (206) responses
+are passed through untouched (Starlette's defaults), as are responses
+that already carry a Content-Encoding and files sent with the
+"http.response.zerocopysend" extension (see media_response).
+
+Quality is tuned for dynamic JSON rather than for ratio: BROTLI_QUALITY
+4 and GZIP_LEVEL 6 compress a large shot listing several times over for
+a small fraction of the CPU the maximum settings cost.
+"""
+
+import os
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}, leaving out codings refused with q=0"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class ZeroCopyPassthrough:
+    """
+    Forwards "http.response.zerocopysend" messages unchanged.
+
+    Starlette's responders only know http.response.body and pathsend and
+    would drop them, leaving the response without a body.
+    """
+    async def send_with_compression(self, message: Message):
+        if message["type"] != "http.response.zerocopysend":
+            await super().send_with_compression(message)
+            return
+        if not (self.content_encoding_set or self.partial_response or self.content_type_is_excluded):
+            # The start message is still held back waiting for the first body
+            await self.send(self.initial_message)
+        await self.send(message)
+
+
+class ZeroCopyGZipResponder(ZeroCopyPassthrough, GZipResponder):
+    pass
+
+
+class BrotliResponder(ZeroCopyPassthrough, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.quality)
+        if more_body:
+            # Flush so streamed chunks reach the client as they are produced
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Brotli or gzip, whichever the client prefers (brotli on a tie)"""
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        br, gzip = accepted.get("br", 0), accepted.get("gzip", 0)
+        if brotli is not None and br and br >= gzip:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif gzip:
+            responder = ZeroCopyGZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            await self.app(scope, receive, send)
+            return
+        await responder(scope, receive, send)
@@ -0,0 +1,166 @@
+"""
+Read-through cache for rarely changing configuration collections.
+
+Style presets, pricing and AI provider configs are read on every call
+to their endpoints but only change through a handful of admin writes.
+Each cached config carries a version number stored in the
+`config_versions` collection. Writers call invalidate(), which bumps the
+version and drops the local copy; every worker polls the version
+documents in the background (one small query for all configs) and
+reloads whatever changed, so a write reaches other workers within
+CONFIG_REFRESH_SECONDS.
+
+Decrypted AI provider keys are kept separately in a TTLCache keyed by
+the ciphertext, so they are dropped after AI_KEY_CACHE_TTL seconds and a
+replaced key is never served from cache.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from cache import TTLCache
+from security import decrypt_value
+
+CONFIG_REFRESH_SECONDS = float(os.getenv("CONFIG_REFRESH_SECONDS", "30"))
+
+# Upper bound on staleness should the background refresh not be running
+CONFIG_MAX_AGE = 10 * CONFIG_REFRESH_SECONDS
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans.
+# config_versions is read by _id and the configs themselves are small collections
+# loaded whole, so there is nothing for an index to serve.
+QUERY_SHAPES = []
+
+provider_key_cache = TTLCache(
+    "ai_provider_keys",
+    maxsize=100,
+    ttl=float(os.getenv("AI_KEY_CACHE_TTL", "300"))
+)
+
+
+class ConfigCache:
+    """
+    Named configs loaded by registered loaders, reloaded when their version changes.
+    """
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[AsyncIOMotorDatabase], Awaitable[Any]]] = {}
+        # name -> (version, loaded_at, value)
+        self._entries: Dict[str, tuple] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def register(self, name: str, loader: Callable[[AsyncIOMotorDatabase], Awaitable[Any]]):
+        self._loaders[name] = loader
+        self._locks[name] = asyncio.Lock()
+
+    async def get(self, db: AsyncIOMotorDatabase, name: str) -> Any:
+        """
+        The cached value of a config, loading it on first use.
+
+        Values are shared between callers and must be treated as read-only.
+        """
+        entry = self._entries.get(name)
+        if entry and time.monotonic() - entry[1] < CONFIG_MAX_AGE:
+            self.hits += 1
+            return entry[2]
+
+        # One load per config at a time; later callers reuse its result
+        async with self._locks[name]:
+            entry = self._entries.get(name)
+            if entry and time.monotonic() - entry[1] < CONFIG_MAX_AGE:
+                self.hits += 1
+                return entry[2]
+            version = await self._version(db, name)
+            return await self._load(db, name, version)
+
+    async def invalidate(self, db: AsyncIOMotorDatabase, name: str):
+        """Call after writing a config: bumps its version for every worker"""
+        self._entries.pop(name, None)
+        await db.get_collection("config_versions").update_one(
+            {"_id": name}, {"$inc": {"version": 1}}, upsert=True
+        )
+
+    async def refresh(self, db: AsyncIOMotorDatabase):
+        """Reload every loaded config whose stored version moved on"""
+        if not self._entries:
+            return
+        versions = {
+            doc["_id"]: doc.get("version", 0)
+            async for doc in db.get_collection("config_versions").find(
+                {"_id": {"$in": list(self._entries)}}
+            )
+        }
+        for name, (version, _, _) in list(self._entries.items()):
+            current = versions.get(name, 0)
+            if current != version:
+                async with self._locks[name]:
+                    await self._load(db, name, current)
+            else:
+                # Unchanged: extend its lifetime
+                entry = self._entries.get(name)
+                if entry:
+                    self._entries[name] = (entry[0], time.monotonic(), entry[2])
+
+    async def refresh_loop(self, db: AsyncIOMotorDatabase):
+        """Background task keeping cached configs in step with other workers' writes"""
+        while True:
+            await asyncio.sleep(CONFIG_REFRESH_SECONDS)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                print(f"Config refresh failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.loads
+        return {
+            "configs": {name: entry[0] for name, entry in self._entries.items()},
+            "hits": self.hits,
+            "loads": self.loads,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+    async def _version(self, db: AsyncIOMotorDatabase, name: str) -> int:
+        doc = await db.get_collection("config_versions").find_one({"_id": name})
+        return doc.get("version", 0) if doc else 0
+
+    async def _load(self, db: AsyncIOMotorDatabase, name: str, version: int) -> Any:
+        value = await self._loaders[name](db)
+        self.loads += 1
+        self._entries[name] = (version, time.monotonic(), value)
+        return value
+
+
+def provider_api_key(encrypted: Optional[str]) -> str:
+    """Decrypted AI provider key, decrypting each ciphertext at most once per AI_KEY_CACHE_TTL"""
+    if not encrypted:
+        return ""
+    key = hashlib.sha256(encrypted.encode("utf-8")).hexdigest()
+    decrypted = provider_key_cache.get(key)
+    if decrypted is None:
+        decrypted = decrypt_value(encrypted)
+        provider_key_cache.set(key, decrypted)
+    return decrypted
+
+
+async def _load_style_presets(db: AsyncIOMotorDatabase) -> list:
+    return await db.get_collection("style_presets").find({}, {"_id": 0}).to_list(length=100)
+
+
+async def _load_pricing_config(db: AsyncIOMotorDatabase) -> Optional[dict]:
+    return await db.get_collection("pricing_config").find_one()
+
+
+async def _load_ai_configs(db: AsyncIOMotorDatabase) -> list:
+    return await db.get_collection("ai_configs").find().to_list(length=100)
+
+
+config_cache = ConfigCache()
+config_cache.register("style_presets", _load_style_presets)
+config_cache.register("pricing_config", _load_pricing_config)
+config_cache.register("ai_configs", _load_ai_configs)
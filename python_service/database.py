@@ -1,7 +1,12 @@
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+import base64
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 from dotenv import load_dotenv
 
+from db_monitoring import command_metrics, pool_metrics
+
 load_dotenv()
 
 MONGODB_URL = os.getenv("MONGODB_URL")
@@ -9,12 +14,207 @@ if not MONGODB_URL:
     # Fallback or warning
     print("Warning: MONGODB_URL not set.")
 
-client = AsyncIOMotorClient(MONGODB_URL)
+client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[command_metrics, pool_metrics])
 db = client.get_database("sceneweaver_db") # Default DB name
 
 async def get_db():
     return db
 
+# Collections whose documents are addressed by their string `id` field
+IDENTIFIED_COLLECTIONS = (
+    "projects", "scenes", "shots", "assets", "comments", "batch_jobs", "style_presets"
+)
+
+
+def id_filter(doc_id: str, **fields) -> dict:
+    """
+    Filter matching one document by its `id`, plus any extra equality fields
+    (e.g. user_id for an ownership check).
+
+    Every document in IDENTIFIED_COLLECTIONS carries an indexed string `id`
+    (backfilled from `_id` at startup and periodically, see
+    migrations.backfill_document_ids), so this replaces the old `$or` over
+    `_id` and `id`.
+    """
+    return {"id": doc_id, **fields}
+
+
+def with_id(document: dict) -> dict:
+    """
+    Copy a model-assigned `_id` into `id` before insertion.
+
+    Models dump their id under the `_id` alias; documents written by
+    hand already set `id` and are returned unchanged.
+    """
+    if "id" not in document and document.get("_id") is not None:
+        document["id"] = str(document["_id"])
+    return document
+
+
+# Large fields left out of list responses unless named in the `fields` query
+# parameter; the detail endpoints return them in full
+LIST_EXCLUDED_FIELDS = {
+    "projects": ("timeline", "script_content"),
+    "scenes": ("script_text",),
+    "shots": ("keyframe_index", "sprite", "hls"),
+}
+
+
+def list_projection(collection_name: str, fields: Optional[str] = None) -> Optional[dict]:
+    """
+    Projection for a list endpoint over `collection_name`.
+
+    Args:
+        collection_name: Key into LIST_EXCLUDED_FIELDS.
+        fields: The comma-separated `fields` query parameter, naming
+            excluded fields the client wants back.
+
+    Raises:
+        ValueError: If `fields` names anything other than an excluded field.
+    """
+    excluded = LIST_EXCLUDED_FIELDS.get(collection_name, ())
+    requested = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    unknown = requested.difference(excluded)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}; "
+            f"available: {', '.join(excluded) or 'none'}"
+        )
+    projection = {name: 0 for name in excluded if name not in requested}
+    return projection or None
+
+
+# Documents fetched per round trip when streaming a cursor
+DEFAULT_BATCH_SIZE = 200
+
+# Bounds for the `limit` of keyset-paginated list endpoints
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+async def iter_documents(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict] = None,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> AsyncIterator[dict]:
+    """
+    Streams the documents matching a query without loading them all at once.
+
+    Args:
+        collection: Collection to query.
+        query: Filter document.
+        projection: Fields to return; fetch only what the caller reads.
+        sort: List of (field, direction) pairs.
+        batch_size: Documents fetched per round trip.
+    """
+    cursor = collection.find(query, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    async for document in cursor:
+        yield document
+
+
+def encode_page_cursor(document: dict, sort_field: str) -> str:
+    """Opaque cursor pointing just past `document` in (sort_field, _id) order"""
+    position = json_util.dumps([document.get(sort_field), document["_id"]])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        value, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    return value, last_id
+
+
+async def find_page(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    sort_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetches one page of a keyset-paginated listing ordered by (sort_field, _id).
+
+    Unlike skip/limit, the cost of a page does not grow with its position
+    and inserts between requests do not shift later pages.
+
+    Args:
+        collection: Collection to query.
+        query: Filter document.
+        sort_field: Ordering field, e.g. shot_number or order_index.
+        limit: Maximum documents in the page.
+        cursor: Cursor returned with the previous page, if any.
+        projection: Fields to return. _id and sort_field are always included.
+
+    Returns:
+        (documents, next cursor or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if cursor:
+        value, last_id = decode_page_cursor(cursor)
+        if value is None:
+            # Missing values sort first, so everything with a value comes after
+            after = {"$or": [
+                {sort_field: None, "_id": {"$gt": last_id}},
+                {sort_field: {"$ne": None}}
+            ]}
+        else:
+            after = {"$or": [
+                {sort_field: {"$gt": value}},
+                {sort_field: value, "_id": {"$gt": last_id}}
+            ]}
+        query = {"$and": [query, after]}
+
+    if projection and all(projection.values()):
+        projection = {**projection, sort_field: 1, "_id": 1}
+
+    documents = await collection.find(query, projection).sort(
+        [(sort_field, 1), ("_id", 1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_page_cursor(documents[-1], sort_field)
+    return documents, next_cursor
+
+
+async def find_listing(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    sort_field: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Backs list endpoints: one keyset page when the client passes `limit` or
+    `cursor`, otherwise every matching document, streamed in batches.
+
+    Returns:
+        (documents, next cursor or None)
+    """
+    if limit is None and cursor is None:
+        documents = [
+            document async for document in iter_documents(
+                collection, query, projection, sort=[(sort_field, 1), ("_id", 1)]
+            )
+        ]
+        return documents, None
+
+    return await find_page(
+        collection, query, sort_field, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE), cursor, projection
+    )
+
+
 def get_vector_search_pipeline(query_embedding: list[float], limit: int = 10, num_candidates: int = 100) -> list[dict]:
     """
     Constructs the aggregation pipeline for Atlas Vector Search.
@@ -0,0 +1,319 @@
+"""
+MongoDB command instrumentation.
+
+A PyMongo CommandListener times every command and files it under
+(collection, command, query shape), where the shape is the filter with
+every value replaced by "?" - so `{"project_id": "abc"}` and
+`{"project_id": "xyz"}` share one histogram. getMore batches are
+attributed to the query that opened the cursor. A ConnectionPoolListener
+records how long operations wait to check out a connection.
+
+Commands slower than SLOW_QUERY_MS are printed and, sampled at
+SLOW_QUERY_SAMPLE_RATE, queued for the `logs` collection; the listener
+runs inside PyMongo's I/O path, so the queue is written out by
+flush_slow_queries() from the event loop rather than from the callback.
+
+Statistics are per process and served at /api/admin/db-stats.
+"""
+
+import os
+import json
+import random
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "1.0"))
+SLOW_QUERY_FLUSH_SECONDS = 10
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans;
+# slow queries are only ever inserted into logs
+QUERY_SHAPES = []
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+# Distinct (collection, command, shape) keys kept before new ones are lumped together
+MAX_SHAPES = 1000
+OTHER_SHAPE = "(other)"
+
+# Commands that are driver housekeeping rather than application queries
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo", "saslStart",
+    "saslContinue", "endSessions", "killCursors", "getLastError", "createIndexes", "explain"
+}
+
+# Where each command keeps its filter
+FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query"}
+
+
+def query_shape(value: Any) -> Any:
+    """Replace every literal in a filter with "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) for item in value):
+            return [query_shape(item) for item in value]
+        # $in/$nin lists: the number of values doesn't change the plan
+        return ["?"]
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> Optional[dict]:
+    """The normalised filter (plus sort, or the pipeline) of a command"""
+    if command_name in FILTER_FIELDS:
+        shape = {"filter": query_shape(command.get(FILTER_FIELDS[command_name], {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if command_name == "aggregate":
+        return {"pipeline": query_shape(command.get("pipeline", []))}
+    if command_name == "update":
+        return {"filter": query_shape((command.get("updates") or [{}])[0].get("q", {}))}
+    if command_name == "delete":
+        return {"filter": query_shape((command.get("deletes") or [{}])[0].get("q", {}))}
+    return None
+
+
+def _documents_returned(command_name: str, reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name in ("count", "insert", "update", "delete"):
+        return int(reply.get("n", 0))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.documents = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, duration_ms: float, documents: int = 0):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.documents += documents
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += bucket
+            if seen >= threshold:
+                return bound if bound != float("inf") else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "documents_returned": self.documents,
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): bucket
+                for bound, bucket in zip(LATENCY_BUCKETS_MS, self.buckets)
+            }
+        }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Latency histograms per (collection, command, query shape) and a slow-query queue.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        # (connection, request_id) -> (key, shape, getMore cursor id) for commands in flight
+        self._pending: Dict[Tuple[Any, int], tuple] = {}
+        # cursor id -> key of the query that opened it, so getMore lands in the same histogram
+        self._cursors: "OrderedDict[int, Tuple[Tuple[str, str, str], Optional[dict]]]" = OrderedDict()
+        self.slow_queries: deque = deque(maxlen=200)
+        self._unflushed: deque = deque(maxlen=1000)
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        if event.command_name == "getMore":
+            with self._lock:
+                origin = self._cursors.get(command.get("getMore"))
+            if origin is None:
+                collection = command.get("collection", "")
+                origin = ((collection, "getMore", "{}"), None)
+        else:
+            collection = command.get(event.command_name)
+            if not isinstance(collection, str):
+                # e.g. a database-level aggregate
+                collection = event.database_name
+            shape = command_shape(event.command_name, command)
+            key = (collection, event.command_name, json.dumps(shape, sort_keys=True, default=str))
+            origin = (key, shape)
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = origin + (command.get("getMore"),)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        with self._lock:
+            origin = self._pending.pop((event.connection_id, event.request_id), None)
+        if origin is None:
+            return
+        key, shape, cursor_id = origin
+        duration_ms = event.duration_micros / 1000
+        reply = event.reply
+
+        cursor = reply.get("cursor") if isinstance(reply, dict) else None
+        with self._lock:
+            if isinstance(cursor, dict):
+                if cursor.get("id") and cursor_id is None:
+                    self._cursors[cursor["id"]] = (key, shape)
+                    while len(self._cursors) > 10000:
+                        self._cursors.popitem(last=False)
+                elif not cursor.get("id") and cursor_id is not None:
+                    # Exhausted
+                    self._cursors.pop(cursor_id, None)
+
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                if len(self._histograms) >= MAX_SHAPES:
+                    key = (key[0], key[1], OTHER_SHAPE)
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+            histogram.record(duration_ms, _documents_returned(event.command_name, reply))
+
+        if duration_ms >= SLOW_QUERY_MS:
+            self._record_slow(key, shape, event.command_name, duration_ms)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        with self._lock:
+            self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _record_slow(self, key, shape, command_name: str, duration_ms: float):
+        collection = key[0]
+        entry = {
+            "timestamp": datetime.utcnow(),
+            "collection": collection,
+            "command": command_name,
+            "shape": shape,
+            "duration_ms": round(duration_ms, 3)
+        }
+        self.slow_queries.append(entry)
+        print(f"Slow query: {command_name} {collection} {key[2]} took {duration_ms:.1f} ms")
+        # Commands on logs are not persisted, so the flusher's own writes can't feed back
+        if collection != "logs" and random.random() < SLOW_QUERY_SAMPLE_RATE:
+            self._unflushed.append(entry)
+
+    def take_unflushed(self) -> List[dict]:
+        entries = []
+        while self._unflushed:
+            entries.append(self._unflushed.popleft())
+        return entries
+
+    def snapshot(self) -> List[dict]:
+        """Every tracked (collection, command, shape), slowest in total first"""
+        with self._lock:
+            rows = [
+                {"collection": c, "command": cmd, "shape": shape, **histogram.to_dict()}
+                for (c, cmd, shape), histogram in self._histograms.items()
+            ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        self.slow_queries.clear()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Time spent waiting for a pooled connection, per server"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wait: Dict[str, LatencyHistogram] = {}
+        self.checkout_failures = 0
+
+    def connection_checked_out(self, event):
+        # ConnectionCheckedOutEvent.duration (seconds) covers the whole checkout, including the wait
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            return
+        address = "%s:%s" % event.address
+        with self._lock:
+            self._wait.setdefault(address, LatencyHistogram()).record(duration * 1000)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkout_wait": {address: h.to_dict() for address, h in self._wait.items()},
+                "checkout_failures": self.checkout_failures
+            }
+
+    def reset(self):
+        with self._lock:
+            self._wait.clear()
+            self.checkout_failures = 0
+
+    # The remaining pool events aren't needed
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+command_metrics = CommandMetrics()
+pool_metrics = PoolMetrics()
+
+
+async def flush_slow_queries(db):
+    """Background task writing sampled slow queries to the logs collection"""
+    while True:
+        await asyncio.sleep(SLOW_QUERY_FLUSH_SECONDS)
+        entries = command_metrics.take_unflushed()
+        if not entries:
+            continue
+        try:
+            await db.get_collection("logs").insert_many([
+                {
+                    "timestamp": entry["timestamp"],
+                    "level": "warning",
+                    "service": "mongodb",
+                    "message": f"Slow {entry['command']} on {entry['collection']}: {entry['duration_ms']:.0f} ms",
+                    "meta": {
+                        "collection": entry["collection"],
+                        "command": entry["command"],
+                        "shape": json.dumps(entry["shape"], sort_keys=True, default=str),
+                        "duration_ms": entry["duration_ms"]
+                    }
+                }
+                for entry in entries
+            ], ordered=False)
+        except Exception as e:
+            print(f"Could not write slow query log: {e}")
@@ -0,0 +1,421 @@
+"""
+Content-addressed cache for storyboard export artifacts.
+
+An export is identified by a fingerprint of everything that ends up in
+the file: the ordered shots and the fields rendered from them, the
+scene slug lines, the export format and its options. Finished artifacts
+are uploaded to storage under exports/cache/ and recorded in the
+export_artifacts collection, so a repeated export is streamed straight
+back from the bucket without fetching images or rendering again.
+
+Concurrent requests for the same fingerprint are single-flighted within
+the process: the first one builds the artifact and the others wait for
+it to be stored, then stream the stored copy.
+
+The fingerprint can't tell whether every image could be fetched, so an
+artifact built with placeholders for missing images (see BuildReport)
+is sent but never cached; the next export tries the images again.
+
+Artifacts not exported again for EXPORT_CACHE_TTL_DAYS are evicted by
+eviction_loop, along with one-off uploads of incomplete artifacts older
+than EXPORT_CACHE_INCOMPLETE_TTL_HOURS.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Union
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.types import Receive, Scope, Send
+
+from pdf_render import iter_file
+
+# Bump to invalidate every cached artifact after a change to the export layouts
+FINGERPRINT_VERSION = 1
+
+# Shot fields that are rendered into at least one export format
+FINGERPRINT_SHOT_FIELDS = (
+    "updated_at", "gcs_path", "proxy_path", "scene_id", "shot_number", "shot_type",
+    "description", "prompt", "notes", "duration"
+)
+
+EXPORT_CACHE_PREFIX = "exports/cache"
+EXPORT_CACHE_SPOOL_DIR = os.getenv("EXPORT_CACHE_SPOOL_DIR", "temp_exports")
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# How long a request waits on an identical in-flight export before building it itself
+BUILD_WAIT_TIMEOUT = 600
+
+# Cached artifacts not exported again for this long are deleted, record and blob
+EXPORT_CACHE_TTL_DAYS = int(os.getenv("EXPORT_CACHE_TTL_DAYS", "30"))
+# One-off uploads of incomplete artifacts only have to outlive the export jobs handing them out
+EXPORT_CACHE_INCOMPLETE_TTL_HOURS = int(os.getenv("EXPORT_CACHE_INCOMPLETE_TTL_HOURS", "24"))
+EXPORT_CACHE_SWEEP_SECONDS = int(os.getenv("EXPORT_CACHE_SWEEP_SECONDS", "3600"))
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("export_artifacts", {"fingerprint": "f"}, None),
+    ("export_artifacts", {"$or": [
+        {"last_hit_at": {"$lt": datetime(2000, 1, 1)}},
+        {"last_hit_at": {"$exists": False}, "created_at": {"$lt": datetime(2000, 1, 1)}}
+    ]}, None),
+]
+
+# A builder returns either the path of a finished file or an async byte stream
+Artifact = Union[str, AsyncIterator[bytes]]
+
+
+class BuildReport:
+    """Filled in by a builder while it produces an artifact"""
+    def __init__(self):
+        # Time spent rendering PDFs, sent as Server-Timing on a cache miss
+        self.render_ms = 0.0
+        # Images that could not be fetched and were left out or replaced by a placeholder
+        self.missing_images = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.missing_images == 0
+
+
+Builder = Callable[[BuildReport], Awaitable[Artifact]]
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls `release` once the response is over, however it ended.
+
+    A client that disconnects before the body starts streaming leaves the
+    body iterator unstarted, so cleanup inside the iterator never runs.
+    """
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.release()
+
+
+def export_fingerprint(
+    export_format: str,
+    project_name: str,
+    shots: List[Dict],
+    scenes_map: Dict,
+    options: Dict
+) -> str:
+    """
+    Hash the inputs of an export into a stable hex digest.
+
+    Shots are taken in the order given, since that is the order they are
+    laid out in. Media paths stand in for content hashes: uploads are
+    stored under fresh uuid names, so a changed image means a changed path.
+    """
+    payload = {
+        "v": FINGERPRINT_VERSION,
+        "format": export_format,
+        "project_name": project_name,
+        "options": options,
+        "shots": [
+            [shot.get("id")] + [shot.get(field) for field in FINGERPRINT_SHOT_FIELDS]
+            for shot in shots
+        ],
+        "scenes": {
+            scene_id: scene.get("slug_line") for scene_id, scene in sorted(scenes_map.items())
+        }
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ExportArtifactCache:
+    """
+    Serves export artifacts from storage, building each fingerprint at most once at a time.
+    """
+    def __init__(self, storage_manager):
+        self.storage_manager = storage_manager
+        # fingerprint -> future resolved once the leading request has finished
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def serve(
+        self,
+        db: AsyncIOMotorDatabase,
+        fingerprint: str,
+        project_id: str,
+        filename: str,
+        media_type: str,
+        build: Builder
+    ) -> StreamingResponse:
+        """
+        Return the cached artifact for `fingerprint`, building it with `build` on a miss.
+
+        Args:
+            db: Database holding the export_artifacts collection.
+            fingerprint: Result of export_fingerprint().
+            project_id: Project the export belongs to.
+            filename: Download filename sent in Content-Disposition.
+            media_type: Content type of the artifact.
+            build: Coroutine function producing the artifact, given a BuildReport.
+        """
+        collection = db.get_collection("export_artifacts")
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+        cached, done = await self._claim(collection, fingerprint)
+        if cached:
+            headers["Content-Length"] = str(cached["size"])
+            headers["X-Export-Cache"] = "hit"
+            return StreamingResponse(
+                self._iter_blob(cached["gcs_path"]), media_type=media_type, headers=headers
+            )
+
+        record = {
+            "fingerprint": fingerprint,
+            "project_id": project_id,
+            "filename": filename,
+            "media_type": media_type
+        }
+
+        report = BuildReport()
+        try:
+            artifact = await build(report)
+        except BaseException:
+            self._finish(fingerprint, done)
+            raise
+
+        headers["X-Export-Cache"] = "miss"
+        if report.render_ms:
+            headers["Server-Timing"] = f"pdf-render;dur={report.render_ms:.1f}"
+
+        if isinstance(artifact, str):
+            try:
+                if report.complete:
+                    await self._store(collection, artifact, record)
+                else:
+                    print(f"Not caching export {fingerprint}: {report.missing_images} images missing")
+            except Exception as e:
+                print(f"Could not cache export {fingerprint}: {e}")
+            finally:
+                self._finish(fingerprint, done)
+            headers["Content-Length"] = str(os.path.getsize(artifact))
+            return StreamingResponse(iter_file(artifact), media_type=media_type, headers=headers)
+
+        return ReleasingStreamingResponse(
+            self._tee(artifact, collection, record, done, report),
+            release=lambda: self._finish(fingerprint, done),
+            media_type=media_type,
+            headers=headers
+        )
+
+    async def ensure(
+        self,
+        db: AsyncIOMotorDatabase,
+        fingerprint: str,
+        project_id: str,
+        filename: str,
+        media_type: str,
+        build: Builder
+    ) -> dict:
+        """
+        Like serve(), but only makes sure the artifact is in storage.
+
+        Used by export jobs, which hand out a signed URL instead of the bytes.
+        An incomplete artifact is still uploaded, under a one-off path, but
+        not recorded.
+
+        Returns:
+            The export_artifacts record, including 'gcs_path' and 'size'.
+        """
+        collection = db.get_collection("export_artifacts")
+
+        cached, done = await self._claim(collection, fingerprint)
+        if cached:
+            return cached
+
+        record = {
+            "fingerprint": fingerprint,
+            "project_id": project_id,
+            "filename": filename,
+            "media_type": media_type
+        }
+
+        report = BuildReport()
+        try:
+            artifact = await build(report)
+            if isinstance(artifact, str):
+                try:
+                    return await self._store(collection, artifact, record, cache=report.complete)
+                finally:
+                    os.remove(artifact)
+
+            os.makedirs(EXPORT_CACHE_SPOOL_DIR, exist_ok=True)
+            spool_path = os.path.join(EXPORT_CACHE_SPOOL_DIR, f"{fingerprint}_{uuid.uuid4().hex}.part")
+            try:
+                with open(spool_path, "wb") as spool:
+                    async for chunk in artifact:
+                        spool.write(chunk)
+                return await self._store(collection, spool_path, record, cache=report.complete)
+            finally:
+                if os.path.exists(spool_path):
+                    os.remove(spool_path)
+        finally:
+            self._finish(fingerprint, done)
+
+    async def _claim(self, collection, fingerprint: str):
+        """
+        Return (cached record, None) on a hit, or (None, future) once this
+        caller has become the one building the artifact.
+        """
+        while True:
+            cached = await collection.find_one({"fingerprint": fingerprint})
+            if cached:
+                await collection.update_one(
+                    {"fingerprint": fingerprint},
+                    {"$set": {"last_hit_at": datetime.utcnow()}, "$inc": {"hits": 1}}
+                )
+                return cached, None
+
+            waiter = self._inflight.get(fingerprint)
+            if waiter is None:
+                break
+            # Someone else is building this export; look again once they are done.
+            # If their build failed or stalled, this caller takes over.
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), BUILD_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._finish(fingerprint, waiter)
+
+        done = asyncio.get_running_loop().create_future()
+        self._inflight[fingerprint] = done
+        return None, done
+
+    async def _tee(
+        self,
+        stream: AsyncIterator[bytes],
+        collection,
+        record: dict,
+        done: asyncio.Future,
+        report: BuildReport
+    ):
+        """Pass a streamed artifact through to the client while spooling a copy to cache"""
+        os.makedirs(EXPORT_CACHE_SPOOL_DIR, exist_ok=True)
+        spool_path = os.path.join(EXPORT_CACHE_SPOOL_DIR, f"{record['fingerprint']}_{uuid.uuid4().hex}.part")
+        try:
+            with open(spool_path, "wb") as spool:
+                async for chunk in stream:
+                    spool.write(chunk)
+                    yield chunk
+            try:
+                # The report is final once the stream is exhausted
+                if report.complete:
+                    await self._store(collection, spool_path, record)
+                else:
+                    print(f"Not caching export {record['fingerprint']}: {report.missing_images} images missing")
+            except Exception as e:
+                print(f"Could not cache export {record['fingerprint']}: {e}")
+        finally:
+            # Also reached when the client disconnects mid-stream; nothing is cached then.
+            # If the stream never starts, ReleasingStreamingResponse releases the slot instead.
+            self._finish(record["fingerprint"], done)
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
+    async def _store(self, collection, path: str, record: dict, cache: bool = True) -> dict:
+        """Upload an artifact; with cache=False under a one-off path, without recording it"""
+        extension = os.path.splitext(record['filename'])[1]
+        if cache:
+            gcs_path = f"{EXPORT_CACHE_PREFIX}/{record['fingerprint']}{extension}"
+        else:
+            gcs_path = f"{EXPORT_CACHE_PREFIX}/incomplete/{record['fingerprint']}_{uuid.uuid4().hex}{extension}"
+
+        def upload():
+            with open(path, "rb") as f:
+                self.storage_manager.upload_file(f, gcs_path)
+
+        await run_in_threadpool(upload)
+        stored = {
+            **record,
+            "gcs_path": gcs_path,
+            "size": os.path.getsize(path),
+            "created_at": datetime.utcnow(),
+            "hits": 0
+        }
+        if not cache:
+            return stored
+        await collection.update_one(
+            {"fingerprint": record["fingerprint"]},
+            {"$set": stored},
+            upsert=True
+        )
+        return stored
+
+    async def evict(self, db: AsyncIOMotorDatabase) -> int:
+        """
+        Delete cached artifacts unused for EXPORT_CACHE_TTL_DAYS and stale one-off uploads.
+
+        Returns:
+            The number of blobs deleted.
+        """
+        collection = db.get_collection("export_artifacts")
+        cutoff = datetime.utcnow() - timedelta(days=EXPORT_CACHE_TTL_DAYS)
+        # last_hit_at is only set once an artifact has been served from cache
+        stale = {"$or": [
+            {"last_hit_at": {"$lt": cutoff}},
+            {"last_hit_at": {"$exists": False}, "created_at": {"$lt": cutoff}}
+        ]}
+
+        evicted = 0
+        async for record in collection.find(stale, {"fingerprint": 1, "gcs_path": 1}):
+            # The record goes first so no new request is handed the blob; the filter is
+            # repeated in case it was hit since, and another worker may have won the race
+            result = await collection.delete_one({"fingerprint": record["fingerprint"], **stale})
+            if result.deleted_count:
+                await run_in_threadpool(self.storage_manager.delete_file, record["gcs_path"])
+                evicted += 1
+
+        incomplete_cutoff = datetime.now(timezone.utc) - timedelta(hours=EXPORT_CACHE_INCOMPLETE_TTL_HOURS)
+        blobs = await run_in_threadpool(self.storage_manager.list_blobs, f"{EXPORT_CACHE_PREFIX}/incomplete/")
+        for name, updated in blobs:
+            if updated < incomplete_cutoff:
+                await run_in_threadpool(self.storage_manager.delete_file, name)
+                evicted += 1
+        return evicted
+
+    async def eviction_loop(self, db: AsyncIOMotorDatabase):
+        """Background task running evict() every EXPORT_CACHE_SWEEP_SECONDS"""
+        while True:
+            try:
+                evicted = await self.evict(db)
+                if evicted:
+                    print(f"Evicted {evicted} export artifacts")
+            except Exception as e:
+                print(f"Export cache eviction failed: {e}")
+            await asyncio.sleep(EXPORT_CACHE_SWEEP_SECONDS)
+
+    def _finish(self, fingerprint: str, done: asyncio.Future):
+        if self._inflight.get(fingerprint) is done:
+            del self._inflight[fingerprint]
+        if not done.done():
+            done.set_result(None)
+
+    async def _iter_blob(self, gcs_path: str):
+        reader = await run_in_threadpool(self.storage_manager.open_read, gcs_path)
+        try:
+            while True:
+                chunk = await run_in_threadpool(reader.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            reader.close()
@@ -0,0 +1,206 @@
+"""
+MongoDB index registry.
+
+Every index the API relies on is declared here and created at startup
+with create_indexes, which is a no-op for indexes that already exist.
+
+Each module in QUERY_SHAPE_MODULES declares the filters and sorts it
+issues in a module-level QUERY_SHAPES list kept next to those queries.
+verify_query_plans checks, with explain(), that none of them falls back
+to a collection scan. tests/test_indexes.py runs it against a scratch
+database, and this module can run it against a real one:
+
+    python indexes.py            # apply and verify
+    python indexes.py --verify   # verify only
+"""
+
+import os
+import ast
+import sys
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from changes import SYNCED_COLLECTIONS, TOMBSTONE_RETENTION_DAYS
+
+QueryShape = Tuple[str, dict, list]
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "shots": [
+        IndexModel([("id", ASCENDING)]),
+        # Project listings and exports, paged by (shot_number, _id)
+        IndexModel([("project_id", ASCENDING), ("shot_number", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("status", ASCENDING), ("shot_number", ASCENDING)]),
+        # Scene listings, regeneration and batch selection
+        IndexModel([("scene_id", ASCENDING), ("shot_number", ASCENDING), ("_id", ASCENDING)]),
+        # Ownership of waveform peaks sidecars (media.get_audio_peaks)
+        IndexModel([("peaks_path", ASCENDING)], sparse=True),
+    ],
+    "scenes": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("order_index", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "projects": [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("id", ASCENDING), ("user_id", ASCENDING)]),
+    ],
+    "assets": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING)]),
+        IndexModel([("type", ASCENDING)]),
+    ],
+    "batch_jobs": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "comments": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "logs": [
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("level", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("service", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "style_presets": [
+        IndexModel([("id", ASCENDING)]),
+    ],
+    "profiles": [
+        IndexModel([("id", ASCENDING)]),
+    ],
+    "moderation_queue": [
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "ai_configs": [
+        IndexModel([("provider_id", ASCENDING)]),
+    ],
+    "export_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Only queued/running jobs carry a dedupe_key, so this allows one active job per export
+        IndexModel([("dedupe_key", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "export_artifacts": [
+        IndexModel([("fingerprint", ASCENDING)], unique=True),
+        IndexModel([("project_id", ASCENDING)]),
+        IndexModel([("last_hit_at", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "tombstones": [
+        IndexModel([("project_id", ASCENDING), ("version", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("deleted_at", ASCENDING)]),
+        IndexModel([("deleted_at", ASCENDING)], expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 86400),
+    ],
+}
+
+# Delta sync (changes.changes_since) reads each synced collection by version or by write time
+for _collection in SYNCED_COLLECTIONS:
+    INDEXES[_collection] += [
+        IndexModel([("project_id", ASCENDING), ("version", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("updated_at", ASCENDING)]),
+    ]
+
+# Modules that query MongoDB. Each declares QUERY_SHAPES, a list of
+# (collection, filter, sort) for the queries it issues, where sample values
+# only need the right types: the planner picks the same plan for any value.
+# Lookups by _id and listings that scan a whole collection by design are left out.
+QUERY_SHAPE_MODULES = (
+    "main", "auth", "changes", "config_cache", "db_monitoring", "export_cache", "migrations",
+    "nle_package", "routers.admin", "routers.export_jobs", "routers.exports", "routers.media",
+    "routers.scenes",
+)
+
+
+def collect_query_shapes() -> List[QueryShape]:
+    """
+    The QUERY_SHAPES of every module in QUERY_SHAPE_MODULES.
+
+    The lists are read from source rather than imported, since importing
+    the routers connects to storage and the model providers. They may only
+    contain literals and datetime(...) samples.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    shapes = []
+    for module in QUERY_SHAPE_MODULES:
+        path = os.path.join(base_dir, *module.split(".")) + ".py"
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in tree.body:
+            if isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                if any(isinstance(t, ast.Name) and t.id == "QUERY_SHAPES" for t in targets):
+                    code = compile(ast.Expression(node.value), path, "eval")
+                    shapes.extend(eval(code, {"__builtins__": {}, "datetime": datetime}))
+                    break
+        else:
+            raise LookupError(f"{module} does not declare QUERY_SHAPES")
+    return shapes
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """
+    Create every registered index. Safe to run on each startup.
+
+    A conflicting existing index (same name, different options) is
+    reported instead of stopping the API from starting.
+    """
+    for collection_name, models in INDEXES.items():
+        try:
+            await db.get_collection(collection_name).create_indexes(models)
+        except OperationFailure as e:
+            print(f"Could not create indexes on {collection_name}: {e}")
+
+
+def _plan_stages(plan) -> List[str]:
+    """All stage names in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase, shapes: List[QueryShape] = None) -> List[str]:
+    """
+    Explain every query shape, by default those of collect_query_shapes().
+
+    Returns:
+        A description of each query whose winning plan scans the collection.
+    """
+    failures = []
+    for collection_name, query, sort in shapes or collect_query_shapes():
+        cursor = db.get_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explained = await cursor.explain()
+        winning_plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            failures.append(f"{collection_name}: find({query}) sort={sort}")
+    return failures
+
+
+async def _main(apply: bool) -> int:
+    from database import db
+
+    if apply:
+        await ensure_indexes(db)
+
+    shapes = collect_query_shapes()
+    failures = await verify_query_plans(db, shapes)
+    for failure in failures:
+        print(f"COLLSCAN {failure}")
+    print(f"{len(shapes) - len(failures)}/{len(shapes)} query shapes use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(apply="--verify" not in sys.argv)))
@@ -1,14 +1,19 @@
 import os
+import io
 import json
 import uuid
 import shutil
+import asyncio
 import base64
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Header, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Header, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 import stripe
+from pymongo.errors import OperationFailure
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 # Stripe Config
@@ -16,38 +21,95 @@ stripe.api_key = os.getenv("STRIPE_API_KEY")
 endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
 # Import Auth and Database
-from auth import get_current_user, RequireAuth
-from database import get_db, get_vector_search_pipeline
+from auth import get_current_user, RequireAuth, RequireProjectAccess, ensure_project_access, invalidate_user
+from database import (
+    db, get_db, get_vector_search_pipeline, find_listing, iter_documents, list_projection, id_filter, with_id,
+    MAX_PAGE_SIZE
+)
+from indexes import ensure_indexes
+from migrations import run_migrations, backfill_loop
+from db_monitoring import flush_slow_queries
+from config_cache import config_cache
+from compression import CompressionMiddleware
+from changes import (
+    stamp, record_deletions, current_version, changes_since, tail_changes, revalidate,
+    encode_changes_cursor, decode_changes_cursor
+)
 from StorageManager import StorageManager
 from SceneWeaverClient import SceneWeaverClient
 from VideoProcessor import VideoProcessor
+from AudioProcessor import AudioProcessor
 
 app = FastAPI()
 
 # Import Routers
 from routers import admin, users
-from routers.scenes import router as scenes_router, batch_router
-from routers.exports import router as exports_router
+from routers.scenes import router as scenes_router, batch_router, batch_progress
+from routers.exports import router as exports_router, export_cache
+from routers.export_jobs import router as export_jobs_router
+from nle_package import build_resolve_package
+from routers.media import router as media_router, clear_shot_cache
 
 app.include_router(admin.router)
 app.include_router(users.router)
 app.include_router(scenes_router)
 app.include_router(batch_router)
 app.include_router(exports_router)
+app.include_router(export_jobs_router)
+app.include_router(media_router)
+
+
+@app.on_event("startup")
+async def prepare_database():
+    await ensure_indexes(db)
+    await run_migrations(db)
+    # Held on app.state so the task is not garbage collected
+    app.state.slow_query_flusher = asyncio.create_task(flush_slow_queries(db))
+    app.state.config_refresher = asyncio.create_task(config_cache.refresh_loop(db))
+    app.state.export_cache_evictor = asyncio.create_task(export_cache.eviction_loop(db))
+    app.state.id_backfiller = asyncio.create_task(backfill_loop(db))
+
+# Optional HLS packaging of proxies for adaptive playback (adds an encode per repair)
+ENABLE_HLS_PACKAGING = os.getenv("ENABLE_HLS_PACKAGING", "false").lower() == "true"
 
 # Initialize Services
 storage_manager = StorageManager()
 nano_client = SceneWeaverClient() # Assuming this was used too
 video_processor = VideoProcessor()
+audio_processor = AudioProcessor()
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Queries issued below, checked against the indexes by indexes.verify_query_plans;
+# listings are also read page by page (database.find_page), and the snapshot
+# narrows them to documents changed since a timestamp
+QUERY_SHAPES = [
+    ("projects", {"user_id": "u"}, None),
+    ("projects", {"id": "p"}, None),
+    ("projects", {"id": "p", "user_id": "u"}, None),
+    ("profiles", {"id": "u"}, None),
+    ("shots", {"id": "s"}, None),
+    ("shots", {"project_id": "p"}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"$and": [{"project_id": "p"}, {"$or": [{"shot_number": {"$gt": 0}}, {"shot_number": 0, "_id": {"$gt": "x"}}]}]}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"project_id": "p", "$or": [{"updated_at": {"$gt": datetime(2000, 1, 1)}}, {"created_at": {"$gt": datetime(2000, 1, 1)}}]}, [("shot_number", 1), ("_id", 1)]),
+    ("scenes", {"project_id": "p"}, [("order_index", 1), ("_id", 1)]),
+    ("scenes", {"$and": [{"project_id": "p"}, {"$or": [{"order_index": {"$gt": 0}}, {"order_index": 0, "_id": {"$gt": "x"}}]}]}, [("order_index", 1), ("_id", 1)]),
+    ("scenes", {"project_id": "p", "$or": [{"updated_at": {"$gt": datetime(2000, 1, 1)}}, {"created_at": {"$gt": datetime(2000, 1, 1)}}]}, [("order_index", 1), ("_id", 1)]),
+    ("assets", {"id": "a"}, None),
+    ("assets", {"project_id": "p"}, None),
+    ("assets", {"id": "a", "project_id": "p"}, None),
+    ("comments", {"id": "c"}, None),
+    ("comments", {"project_id": "p"}, [("created_at", -1)]),
+]
+
 # Request Models
 class GenerateShotRequest(BaseModel):
     scene_id: str
@@ -138,6 +200,13 @@ async def process_lipsync(
         
         with open(synced_path, "rb") as f:
             storage_manager.upload_file(f, result_gcs_path)
+
+        # Waveform peaks sidecar so the editor doesn't decode the audio client-side
+        local_peaks_path = f"temp_process/{result_uuid}.peaks"
+        peaks_gcs_path = f"assets/synced/{result_uuid}.peaks"
+        audio_processor.generate_peaks(synced_path, local_peaks_path)
+        with open(local_peaks_path, "rb") as f:
+            storage_manager.upload_file(f, peaks_gcs_path)
             
         # 5. Create New Asset Record (as a Shot)
         new_shot_data = {
@@ -147,8 +216,10 @@ async def process_lipsync(
             "prompt": f"LipSync: {video_data.get('prompt', 'Unknown')}",
             "gcs_path": result_gcs_path,
             "proxy_path": result_gcs_path,
+            "peaks_path": peaks_gcs_path,
             "status": "ready",
-            "created_at": datetime.utcnow()
+            "created_at": datetime.utcnow(),
+            **await stamp(db, request.project_id)
         }
         
         await db.get_collection("shots").insert_one(new_shot_data)
@@ -160,6 +231,7 @@ async def process_lipsync(
         if os.path.exists(local_video_path): os.remove(local_video_path)
         if os.path.exists(local_audio_path): os.remove(local_audio_path)
         if os.path.exists(synced_path): os.remove(synced_path)
+        if os.path.exists(local_peaks_path): os.remove(local_peaks_path)
 
         return {"status": "success", "asset": new_shot_data}
 
@@ -199,7 +271,8 @@ async def generate_asset(
             "gcs_path": gcs_path,
             "public_url": public_url,
             "definition": request.definition,
-            "created_at": datetime.utcnow()
+            "created_at": datetime.utcnow(),
+            **await stamp(db, request.project_id)
         }
         
         await db.get_collection("assets").insert_one(asset_data)
@@ -220,151 +293,20 @@ async def generate_asset(
 @app.post("/api/export/resolve")
 async def export_resolve(
     request: ExportRequest,
+    user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     if not storage_manager:
         raise HTTPException(status_code=503, detail="Storage service not configured")
 
-    export_id = str(uuid.uuid4())
-    export_dir = f"exports/{export_id}"
-    media_dir = f"{export_dir}/media"
-    os.makedirs(media_dir, exist_ok=True)
+    await ensure_project_access(db, user, request.project_id)
 
     try:
-        # 1. Process Clips from Editor State
-        fcpxml_clips = []
-        
-        # Assumed Structure: { "tracks": [ { "id": "...", "clips": [ { ... } ] } ] }
-        tracks = request.editor_state.get("tracks", [])
-        
-        processed_clips_map = {} # Map clip_id to resource_id
-        
-        for track_index, track in enumerate(tracks):
-            clips = track.get("clips", [])
-            for clip in clips:
-                clip_id = clip.get("id")
-                shot_id = clip.get("metadata", {}).get("shot_id")
-                source_url = clip.get("source")
-                
-                # Determine GCS path
-                gcs_path = None
-                if shot_id:
-                     shot_data = await db.get_collection("shots").find_one({"id": shot_id})
-                     if shot_data:
-                         gcs_path = shot_data.get("gcs_path")
-                
-                if not gcs_path:
-                    print(f"Could not resolve high-res for clip {clip_id}, skipping download.")
-                    continue
-
-                filename = f"clip_{clip_id}.mp4"
-                local_raw_path = f"{media_dir}/raw_{filename}"
-                local_conformed_path = f"{media_dir}/{filename}"
-
-                # Download
-                storage_manager.download_file(gcs_path, local_raw_path)
-
-                # Conform
-                if os.path.exists(local_raw_path):
-                     if os.path.getsize(local_raw_path) > 1024:
-                         video_processor.conform_framerate(local_raw_path, local_conformed_path)
-                     else:
-                         shutil.copy(local_raw_path, local_conformed_path)
-                
-                # Remove raw
-                if os.path.exists(local_raw_path):
-                    os.remove(local_raw_path)
-
-                # Register Resource
-                resource_id = f"r{len(fcpxml_clips) + 1}"
-                duration_seconds = clip.get("duration", 0)
-                duration_frames = int(duration_seconds * 24)
-                
-                fcpxml_clips.append({
-                    "id": resource_id,
-                    "name": filename,
-                    "path": f"./media/{filename}",
-                    "duration": duration_seconds,
-                    "duration_frames": duration_frames,
-                    "track_index": track_index,
-                    "start": clip.get("start", 0),
-                    "offset": clip.get("offset", 0)
-                })
-                
-                processed_clips_map[clip_id] = resource_id
-
-        # 2. Generate FCPXML
-        # Group by track
-        tracks_data = {}
-        for c in fcpxml_clips:
-            t_idx = c["track_index"]
-            if t_idx not in tracks_data:
-                tracks_data[t_idx] = []
-            tracks_data[t_idx].append(c)
-            
-        # Sort clips by start time
-        for t_idx in tracks_data:
-            tracks_data[t_idx].sort(key=lambda x: x["start"])
-
-        # Build Resources XML
-        resources_xml = ""
-        for c in fcpxml_clips:
-            resources_xml += f'<asset id="{c["id"]}" name="{c["name"]}" uid="{uuid.uuid4()}" src="file://localhost/{c["path"]}" start="0s" duration="{c["duration"]}s" hasVideo="1" format="r1" />\n'
-
-        # Build Sequence XML
-        # Assuming Track 0 is the spine.
-        spine_xml = ""
-        
-        current_time = 0
-        if 0 in tracks_data:
-            for c in tracks_data[0]:
-                gap_duration = c["start"] - current_time
-                if gap_duration > 0.01: # Tolerance
-                    gap_frames = int(gap_duration * 24)
-                    spine_xml += f'<gap name="Gap" offset="{current_time}s" duration="{gap_duration}s" start="0s"/>\n'
-                
-                spine_xml += f'<asset-clip name="{c["name"]}" ref="{c["id"]}" offset="{c["start"]}s" duration="{c["duration"]}s" start="{c["offset"]}s" />\n'
-                current_time = c["start"] + c["duration"]
-
-        fcpxml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE fcpxml>
-<fcpxml version="1.9">
-    <resources>
-        <format id="r1" name="FFVideoFormat1080p2398" frameDuration="1001/24000s" width="1920" height="1080" colorSpace="1-1-1 (Rec. 709)"/>
-        {resources_xml}
-    </resources>
-    <library>
-        <event name="SceneWeaver Export">
-            <project name="Export_{export_id}">
-                <sequence format="r1">
-                    <spine>
-                        {spine_xml}
-                    </spine>
-                </sequence>
-            </project>
-        </event>
-    </library>
-</fcpxml>
-"""
-        with open(f"{export_dir}/project.fcpxml", "w") as f:
-            f.write(fcpxml_content)
-
-        # 3. Zip
-        shutil.make_archive(export_dir, 'zip', export_dir)
-        zip_path = f"{export_dir}.zip"
-        
-        # 4. Upload Zip to GCS
-        gcs_zip_path = f"exports/{export_id}.zip"
-        with open(zip_path, "rb") as f:
-            storage_manager.upload_file(f, gcs_zip_path)
-            
+        gcs_zip_path = await build_resolve_package(
+            db, storage_manager, video_processor, request.project_id, request.editor_state
+        )
         download_url = storage_manager.generate_signed_url(gcs_zip_path)
 
-        # Cleanup
-        shutil.rmtree(export_dir)
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-
         return {"status": "success", "download_url": download_url}
 
     except Exception as e:
@@ -402,18 +344,49 @@ async def repair_shot(
 
         # 5. Create Proxy
         local_proxy_path = local_repaired_path.replace(".mp4", "_proxy.mp4")
-        video_processor.create_proxy(local_repaired_path, local_proxy_path)
+        local_sprite_path = local_repaired_path.replace(".mp4", "_sprite.jpg")
+        sprite = video_processor.create_proxy(local_repaired_path, local_proxy_path, sprite_path=local_sprite_path)
 
         # 6. Upload (Overwrite or New Version? Let's overwrite for "Repair")
         # In a real system, we might want versioning.
         storage_manager.upload_file(open(local_repaired_path, "rb"), original_gcs_path)
         storage_manager.upload_file(open(local_proxy_path, "rb"), shot["proxy_path"])
 
+        # Sprite sheet + VTT live next to the proxy; the VTT references the sprite relatively
+        proxy_base = os.path.splitext(shot["proxy_path"])[0]
+        sprite["gcs_path"] = f"{proxy_base}_sprite.jpg"
+        sprite["vtt_gcs_path"] = f"{proxy_base}_thumbnails.vtt"
+        storage_manager.upload_file(open(local_sprite_path, "rb"), sprite["gcs_path"])
+        vtt = video_processor.build_thumbnail_vtt(sprite, "sprite.jpg")
+        storage_manager.upload_file(io.BytesIO(vtt.encode("utf-8")), sprite["vtt_gcs_path"])
+
+        # Optional HLS renditions, stored under a directory next to the proxy
+        hls = None
+        if ENABLE_HLS_PACKAGING:
+            local_hls_dir = local_repaired_path.replace(".mp4", "_hls")
+            hls = video_processor.package_hls(local_proxy_path, local_hls_dir)
+            hls["prefix"] = f"{proxy_base}_hls"
+            for name in hls["files"]:
+                with open(os.path.join(local_hls_dir, name), "rb") as f:
+                    storage_manager.upload_file(f, f"{hls['prefix']}/{name}")
+            shutil.rmtree(local_hls_dir)
+
+        # The old keyframe index and cached scrub frames describe the replaced video
+        await db.get_collection("shots").update_one(
+            {"id": request.shot_id},
+            {
+                "$set": {"sprite": sprite, "hls": hls, **await stamp(db, shot["project_id"])},
+                "$unset": {"keyframe_index": ""}
+            }
+        )
+        clear_shot_cache(request.shot_id)
+
         # 7. Cleanup
         os.remove(local_original_path)
         os.remove(local_mask_path)
         os.remove(local_repaired_path)
         os.remove(local_proxy_path)
+        os.remove(local_sprite_path)
 
         return {"status": "success", "message": "Shot repaired successfully"}
 
@@ -447,14 +420,27 @@ async def generate_sfx(request: GenerateSFXRequest): # We need user context here
         with open(local_sfx_path, "rb") as f:
             storage_manager.upload_file(f, gcs_path)
             
-        # 3. Generate Signed URL
+        # 3. Waveform peaks sidecar next to the audio blob
+        local_peaks_path = os.path.splitext(local_sfx_path)[0] + ".peaks"
+        audio_processor.generate_peaks(local_sfx_path, local_peaks_path)
+        with open(local_peaks_path, "rb") as f:
+            storage_manager.upload_file(f, f"sfx/{sfx_uuid}.peaks")
+
+        # 4. Generate Signed URL
         public_url = storage_manager.generate_signed_url(gcs_path)
 
-        # 4. Cleanup
+        # 5. Cleanup
         if os.path.exists(local_sfx_path):
             os.remove(local_sfx_path)
+        if os.path.exists(local_peaks_path):
+            os.remove(local_peaks_path)
 
-        return {"status": "success", "url": public_url, "name": request.prompt}
+        return {
+            "status": "success",
+            "url": public_url,
+            "name": request.prompt,
+            "peaks_url": storage_manager.generate_signed_url(f"sfx/{sfx_uuid}.peaks")
+        }
 
     except Exception as e:
         print(f"Error in generate_sfx: {e}")
@@ -494,7 +480,10 @@ async def breakdown_scene(
             script_text=request.scene_text
         )
         
-        await db.get_collection("scenes").insert_one(new_scene.model_dump(by_alias=True))
+        version = await stamp(db, request.project_id)
+        await db.get_collection("scenes").insert_one(
+            with_id({**new_scene.model_dump(by_alias=True), **version})
+        )
         scene_id = new_scene.id
 
         # 3. Insert Shots
@@ -505,9 +494,10 @@ async def breakdown_scene(
                 scene_id=scene_id,
                 project_id=request.project_id,
                 status="queued",
+                prompt=shot["prompt"],
                 prompt_data=ShotPromptData(prompt=shot["prompt"])
             )
-            shots_to_insert.append(new_shot.model_dump(by_alias=True))
+            shots_to_insert.append(with_id({**new_shot.model_dump(by_alias=True), **version}))
             
         if shots_to_insert:
             await db.get_collection("shots").insert_many(shots_to_insert)
@@ -577,6 +567,7 @@ async def stripe_webhook(
             )
             
             if result.matched_count > 0:
+                invalidate_user(client_reference_id)
                 print(f"Added {credits_to_add} credits to user {client_reference_id}")
             else:
                 print(f"User {client_reference_id} not found for credit update")
@@ -589,10 +580,16 @@ async def stripe_webhook(
 
 @app.get("/api/projects")
 async def get_projects(
+    fields: Optional[str] = None,
     user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    projects = await db.get_collection("projects").find({"user_id": user.id}).to_list(length=100)
+    # timeline and script_content are only sent when named in `fields`
+    try:
+        projection = list_projection("projects", fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    projects = await db.get_collection("projects").find({"user_id": user.id}, projection).to_list(length=100)
     return projects
 
 class ProjectCreateRequest(BaseModel):
@@ -617,7 +614,7 @@ async def create_project(
         created_at=datetime.utcnow()
     )
     
-    await db.get_collection("projects").insert_one(new_project.model_dump(by_alias=True))
+    await db.get_collection("projects").insert_one(with_id(new_project.model_dump(by_alias=True)))
     return new_project
 
 @app.get("/api/style_presets")
@@ -625,7 +622,7 @@ async def get_style_presets(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     # For prototype, return mock presets if collection is empty
-    presets = await db.get_collection("style_presets").find().to_list(length=100)
+    presets = await config_cache.get(db, "style_presets")
     if not presets:
         return [
             {"id": "1", "name": "The Anderson", "thumbnail_url": "https://images.unsplash.com/photo-1518834107812-67b0b7c58434?auto=format&fit=crop&q=80&w=300&h=200", "description": "Symmetrical, pastel, quirky"},
@@ -661,6 +658,7 @@ async def create_style_preset(
     }
     
     await db.get_collection("style_presets").insert_one(new_preset)
+    await config_cache.invalidate(db, "style_presets")
     # Remove _id before returning
     new_preset.pop("_id", None)
     return new_preset
@@ -671,15 +669,37 @@ async def get_project(
     user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        # Try searching by 'id' string field if _id lookup fails (legacy support)
-        project = await db.get_collection("projects").find_one({"id": project_id, "user_id": user.id})
-        
+    project = await db.get_collection("projects").find_one(id_filter(project_id, user_id=user.id))
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
+@app.get("/api/projects/{project_id}/timeline")
+async def get_project_timeline(
+    project_id: str,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    project = await db.get_collection("projects").find_one(
+        id_filter(project_id, user_id=user.id), {"_id": 0, "timeline": 1}
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"timeline": project.get("timeline")}
+
+@app.get("/api/projects/{project_id}/script")
+async def get_project_script(
+    project_id: str,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    project = await db.get_collection("projects").find_one(
+        id_filter(project_id, user_id=user.id), {"_id": 0, "script_content": 1}
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"script_content": project.get("script_content")}
+
 class ProjectUpdateRequest(BaseModel):
     name: Optional[str] = None
     genre: Optional[str] = None
@@ -701,7 +721,7 @@ async def update_project(
         return {"status": "no_changes"}
 
     result = await db.get_collection("projects").update_one(
-        {"$or": [{"_id": project_id}, {"id": project_id}], "user_id": user.id},
+        id_filter(project_id, user_id=user.id),
         {"$set": update_fields}
     )
     
@@ -711,60 +731,52 @@ async def update_project(
     return {"status": "success"}
 
 
-@app.get("/api/projects/{project_id}/shots")
+@app.get("/api/projects/{project_id}/shots", dependencies=[RequireProjectAccess])
 async def get_project_shots(
     project_id: str,
-    user: User = RequireAuth,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-        
-    shots = await db.get_collection("shots").find({"project_id": project_id}).to_list(length=1000)
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
+    # Paged by shot_number when limit/cursor are given; X-Next-Cursor points at the next page
+    try:
+        shots, next_cursor = await find_listing(
+            db.get_collection("shots"), {"project_id": project_id}, "shot_number", limit, cursor,
+            projection=list_projection("shots", fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return shots
 
-@app.get("/api/projects/{project_id}/assets")
+@app.get("/api/projects/{project_id}/assets", dependencies=[RequireProjectAccess])
 async def get_project_assets(
     project_id: str,
-    user: User = RequireAuth,
+    request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-        
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
     assets = await db.get_collection("assets").find({"project_id": project_id}).to_list(length=1000)
     return assets
 
-@app.delete("/api/projects/{project_id}/assets/{asset_id}")
+@app.delete("/api/projects/{project_id}/assets/{asset_id}", dependencies=[RequireProjectAccess])
 async def delete_asset(
     project_id: str,
     asset_id: str,
-    user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        # Try searching by 'id' string field if _id lookup fails
-        project = await db.get_collection("projects").find_one({"id": project_id, "user_id": user.id})
-        
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Find the asset
-    asset = await db.get_collection("assets").find_one({"id": asset_id, "project_id": project_id})
-    if not asset:
-        # Try searching by _id if id lookup fails
-        try:
-            from bson import ObjectId
-            asset = await db.get_collection("assets").find_one({"_id": ObjectId(asset_id), "project_id": project_id})
-        except:
-            pass
-            
+    asset = await db.get_collection("assets").find_one(id_filter(asset_id, project_id=project_id))
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
@@ -779,23 +791,200 @@ async def delete_asset(
 
     # Delete from Database
     await db.get_collection("assets").delete_one({"_id": asset["_id"]})
+    await record_deletions(db, project_id, "assets", [asset.get("id")])
 
     return {"status": "success", "message": "Asset deleted successfully"}
 
-@app.get("/api/projects/{project_id}/scenes")
+@app.get("/api/projects/{project_id}/scenes", dependencies=[RequireProjectAccess])
 async def get_project_scenes(
     project_id: str,
-    user: User = RequireAuth,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-        
-    scenes = await db.get_collection("scenes").find({"project_id": project_id}).sort("order_index", 1).to_list(length=100)
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
+    try:
+        scenes, next_cursor = await find_listing(
+            db.get_collection("scenes"), {"project_id": project_id}, "order_index", limit, cursor,
+            projection=list_projection("scenes", fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return scenes
 
+SNAPSHOT_SECTIONS = ("project", "scenes", "shots", "assets", "comments", "batch_progress")
+
+@app.get("/api/projects/{project_id}/snapshot", dependencies=[RequireProjectAccess])
+async def get_project_snapshot(
+    project_id: str,
+    sections: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[datetime] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Everything the editor loads when opening a project, in one request.
+
+    The sections' queries run concurrently. `sections` picks a subset of
+    SNAPSHOT_SECTIONS (default: all). Lists leave out the same heavy
+    fields as their own endpoints; `fields` opts them back in as
+    section.field, e.g. `scenes.script_text,project.timeline`.
+
+    With `since` (the snapshot_at of an earlier response), scenes, shots,
+    assets and comments only include documents created or updated after
+    it. Deletions are not reported; to keep a loaded snapshot current,
+    pass its `changes_cursor` to /changes instead.
+    """
+    snapshot_at = datetime.utcnow()
+    # Taken before the queries, so /changes re-sends anything written while they run
+    changes_cursor = encode_changes_cursor(await current_version(db, project_id))
+
+    wanted = [name.strip() for name in sections.split(",")] if sections else list(SNAPSHOT_SECTIONS)
+    unknown = set(wanted).difference(SNAPSHOT_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    # section.field pairs from `fields`, grouped per section
+    requested: Dict[str, List[str]] = {}
+    for item in (fields or "").split(","):
+        section, _, field = item.strip().partition(".")
+        if field:
+            requested.setdefault(section, []).append(field)
+    try:
+        projections = {
+            section: {**(list_projection(collection, ",".join(requested.get(section, []))) or {}), "_id": 0}
+            for section, collection in (("project", "projects"), ("scenes", "scenes"), ("shots", "shots"))
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if since and since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def changed(query: dict, iso_dates: bool = False) -> dict:
+        if not since:
+            return query
+        # Comments store created_at as an ISO string
+        created_after = {"$gt": since.isoformat() if iso_dates else since}
+        return {**query, "$or": [{"updated_at": {"$gt": since}}, {"created_at": created_after}]}
+
+    async def listing(collection: str, query: dict, projection: dict = None, sort=None) -> list:
+        return [
+            doc async for doc in iter_documents(
+                db.get_collection(collection), query, projection or {"_id": 0}, sort=sort
+            )
+        ]
+
+    loaders = {
+        "project": lambda: db.get_collection("projects").find_one(
+            id_filter(project_id), projections["project"]
+        ),
+        "scenes": lambda: listing(
+            "scenes", changed({"project_id": project_id}), projections["scenes"],
+            sort=[("order_index", 1), ("_id", 1)]
+        ),
+        "shots": lambda: listing(
+            "shots", changed({"project_id": project_id}), projections["shots"],
+            sort=[("shot_number", 1), ("_id", 1)]
+        ),
+        "assets": lambda: listing("assets", changed({"project_id": project_id})),
+        "comments": lambda: listing(
+            "comments", changed({"project_id": project_id}, iso_dates=True), sort=[("created_at", -1)]
+        ),
+        "batch_progress": lambda: batch_progress(db, project_id),
+    }
+
+    results = await asyncio.gather(*(loaders[name]() for name in wanted))
+    return {
+        "snapshot_at": snapshot_at,
+        "since": since,
+        "changes_cursor": changes_cursor,
+        **dict(zip(wanted, results))
+    }
+
+def parse_changes_cursor(since: str):
+    try:
+        return decode_changes_cursor(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+@app.get("/api/projects/{project_id}/changes", dependencies=[RequireProjectAccess])
+async def get_project_changes(
+    project_id: str,
+    since: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Scenes, shots, assets and comments written, and ids deleted, since a cursor.
+
+    `since` is the `changes_cursor` of a snapshot or the `cursor` of an
+    earlier response. Documents may repeat across responses and should be
+    applied by id. A cursor past the tombstone retention window is
+    answered with 410, as is a response marked "reset"; either way the
+    client reloads the snapshot.
+    """
+    version, issued_at = parse_changes_cursor(since)
+    changes = await changes_since(db, project_id, version, issued_at)
+    if changes["reset"]:
+        raise HTTPException(status_code=410, detail="Too many changes; reload the project snapshot")
+    return {**changes, "cursor": encode_changes_cursor(changes["version"])}
+
+@app.get("/api/projects/{project_id}/changes/stream", dependencies=[RequireProjectAccess])
+async def stream_project_changes(
+    project_id: str,
+    since: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    The same deltas as /changes, pushed as server-sent events.
+
+    Starts with the backlog since the cursor, then streams live. Events
+    are `change`, `delete` and a periodic `heartbeat` carrying a fresh
+    cursor to resume from. Needs a replica set (change streams); elsewhere
+    answers 501 and clients poll /changes. A backlog too large to send is
+    answered with 410, as by /changes.
+    """
+    version, issued_at = parse_changes_cursor(since)
+    events = tail_changes(db, project_id, version, issued_at)
+    try:
+        # Open the stream now so an unsupported deployment fails before the response starts
+        first = await events.__anext__()
+    except OperationFailure as e:
+        raise HTTPException(status_code=501, detail=f"Change streams unavailable: {e}")
+    if first[0] == "reset":
+        await events.aclose()
+        raise HTTPException(status_code=410, detail="Too many changes; reload the project snapshot")
+
+    async def event_source():
+        event = first
+        try:
+            while True:
+                kind, data = event
+                if kind == "heartbeat":
+                    data = {"cursor": encode_changes_cursor(data)}
+                yield f"event: {kind}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    return
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Comments for ReviewPlayer
 class CommentRequest(BaseModel):
     project_id: str
@@ -856,17 +1045,16 @@ async def search_vault(
 
     drawing_data: Optional[List[Any]] = None
 
-@app.get("/api/comments")
+@app.get("/api/comments", dependencies=[RequireProjectAccess])
 async def get_comments(
     project_id: str,
-    user: User = RequireAuth,
+    request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": project_id, "user_id": user.id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-        
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
     comments = await db.get_collection("comments").find({"project_id": project_id}).sort("created_at", -1).to_list(length=500)
     return comments
 
@@ -877,9 +1065,7 @@ async def create_comment(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     # Verify project access
-    project = await db.get_collection("projects").find_one({"_id": comment.project_id, "user_id": user.id})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    await ensure_project_access(db, user, comment.project_id)
     
     new_comment = {
         "id": str(uuid.uuid4()),
@@ -891,7 +1077,8 @@ async def create_comment(
         "timestamp": comment.timestamp,
         "is_resolved": comment.is_resolved,
         "drawing_data": comment.drawing_data,
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": datetime.utcnow().isoformat(),
+        **await stamp(db, comment.project_id)
     }
     
     await db.get_collection("comments").insert_one(new_comment)
@@ -913,6 +1100,7 @@ async def update_comment(
         # Check if project owner? For now strict ownership
         raise HTTPException(status_code=403, detail="Not authorized to update this comment")
         
+    update_data.update(await stamp(db, comment["project_id"]))
     await db.get_collection("comments").update_one({"id": comment_id}, {"$set": update_data})
     return {"status": "success"}
 
@@ -968,58 +1156,3 @@ async def search_vault(
     except Exception as e:
         print(f"Error in search_vault: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
-class ExportRequest(BaseModel):
-    project_id: str
-    editor_state: Dict[str, Any]
-
-@app.post("/api/export/resolve")
-async def resolve_export(
-    request: ExportRequest,
-    user: User = RequireAuth,
-    db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    try:
-        print(f"Exporting project {request.project_id}")
-        
-        # Extract clips from editor state
-        # Assuming simple structure for now: tracks -> clips
-        clips = []
-        if "tracks" in request.editor_state:
-            for track in request.editor_state["tracks"]:
-                if "clips" in track:
-                    for clip in track["clips"]:
-                        # In a real app, we'd resolve the source ID to a file path
-                        # Here we assume 'source' is the path (as set in EditorBridge)
-                        if "source" in clip:
-                            clips.append({
-                                "path": clip["source"],
-                                "start": clip.get("start", 0),
-                                "duration": clip.get("duration", 0)
-                            })
-        
-        if not clips:
-            raise HTTPException(status_code=400, detail="No clips found in timeline")
-            
-        # Generate output filename
-        filename = f"export_{uuid.uuid4()}.mp4"
-        output_path = os.path.abspath(os.path.join("temp_shots", filename))
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Render
-        video_processor.render_timeline(clips, output_path)
-        
-        # In a real app, we'd upload this to S3/GCS and return a signed URL
-        # For now, we return a file:// URL or just the path for local testing
-        # Or serve it via a static mount (which we haven't set up, but let's assume we can)
-        
-        return {
-            "status": "success",
-            "download_url": f"file://{output_path}",
-            "local_path": output_path
-        }
-
-    except Exception as e:
-        print(f"Error in resolve_export: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
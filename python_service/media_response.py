@@ -0,0 +1,187 @@
+"""
+HTTP file serving with Range and conditional request support.
+
+Files are sent with zero-copy sendfile where the deployment allows it:
+either through the ASGI "http.response.zerocopysend" extension when the
+server offers it, or by handing the transfer to a fronting nginx via
+X-Accel-Redirect when MEDIA_ACCEL_REDIRECT_PREFIX is set. Otherwise the
+requested byte range is streamed in chunks.
+"""
+
+import os
+import re
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+# e.g. "/protected-media/" with an nginx `internal` location aliased to the media root
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX")
+MEDIA_ROOT = os.path.abspath(os.getenv("MEDIA_ROOT", "."))
+
+CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range into an inclusive (start, end) pair.
+
+    Returns None for multi-range or malformed headers (served as a full
+    200 response) and raises 416 for ranges outside the file.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            # No byte of an empty file can satisfy a suffix range
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class MediaFileResponse(Response):
+    """
+    Sends `length` bytes of a file starting at `offset`.
+    """
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int = 200,
+                 headers: dict = None, media_type: str = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        # Response.__init__ sets Content-Length for an empty body; replace it with the real one
+        self.raw_headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"]
+        self.raw_headers.append((b"content-length", str(length).encode("latin-1")))
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False
+                })
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File shrank underneath us; close the body so the client sees a short read
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def media_file_response(
+    request: Request,
+    path: str,
+    media_type: str = None,
+    cache_control: str = "private, max-age=3600",
+    etag: str = None,
+    headers: dict = None
+) -> Response:
+    """
+    Build a response for a local file honouring Range, If-Range,
+    If-None-Match and If-Modified-Since.
+
+    Args:
+        request: The incoming request.
+        path: Absolute or relative path of the file on local disk.
+        media_type: Content type; guessed from the extension if omitted.
+        cache_control: Cache-Control header value.
+        etag: Strong ETag to use instead of the mtime/size based default.
+        headers: Extra headers, e.g. Content-Disposition.
+
+    Returns:
+        A 200, 206 or 304 response.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    size = stat.st_size
+    etag = etag or f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            if int(stat.st_mtime) <= parsedate_to_datetime(request.headers["if-modified-since"]).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() in (etag, last_modified):
+            byte_range = _parse_range(range_header, size)
+
+    status_code = 200
+    offset, length = 0, size
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        offset, length = start, end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx re-evaluates Range itself and serves the file with sendfile
+        real_path = os.path.realpath(path)
+        if real_path.startswith(MEDIA_ROOT + os.sep):
+            headers.pop("Content-Range", None)
+            headers["X-Accel-Redirect"] = MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + os.path.relpath(real_path, MEDIA_ROOT)
+            return Response(status_code=200, headers=headers, media_type=media_type)
+
+    return MediaFileResponse(path, offset, length, status_code=status_code, headers=headers, media_type=media_type)
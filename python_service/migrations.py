@@ -0,0 +1,139 @@
+"""
+Data migrations, applied at startup.
+
+Each migration is a server-side update that is safe to run while the
+previous release is still serving: fields are only ever added or
+normalised, never removed. Progress is recorded in the `migrations`
+collection so a migration runs once per database, and one that was
+interrupted (e.g. by a restart) is picked up again by the next instance.
+
+Migrations:
+    shot_status_completed: rename the legacy `done` shot status.
+    shot_prompt: copy `prompt_data.prompt` to `prompt` where it is missing.
+
+The `id` backfill is not one of them. Every lookup now goes through the
+string `id` (see database.id_filter), and a previous release still
+serving during a rolling deploy keeps inserting documents without one,
+so backfill_document_ids runs on every startup and then every
+ID_BACKFILL_SECONDS. It only touches documents that lack an `id`.
+"""
+
+import os
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Tuple
+
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from database import IDENTIFIED_COLLECTIONS
+
+# A migration still marked running after this long is assumed to have died with its instance
+MIGRATION_STALE_AFTER = timedelta(minutes=30)
+
+ID_BACKFILL_SECONDS = int(os.getenv("ID_BACKFILL_SECONDS", "60"))
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans.
+# Only the id backfill, which runs continually, over IDENTIFIED_COLLECTIONS; the
+# recorded migrations run once and scan by design.
+QUERY_SHAPES = [
+    (collection, {"id": {"$exists": False}}, None)
+    for collection in ("projects", "scenes", "shots", "assets", "comments", "batch_jobs", "style_presets")
+]
+
+
+async def backfill_document_ids(db: AsyncIOMotorDatabase):
+    """
+    Give documents without one a string `id` copied from `_id`.
+
+    Documents written through the pydantic models used to have only a
+    string `_id`, those written by the routers a uuid `id` next to an
+    ObjectId `_id`. Uses the `id` index, so a run with nothing to do is cheap.
+    """
+    for collection_name in IDENTIFIED_COLLECTIONS:
+        result = await db.get_collection(collection_name).update_many(
+            {"id": {"$exists": False}},
+            [{"$set": {"id": {"$toString": "$_id"}}}]
+        )
+        if result.modified_count:
+            print(f"Backfilled id on {result.modified_count} {collection_name}")
+
+
+async def backfill_loop(db: AsyncIOMotorDatabase):
+    """Background task catching documents inserted by writers that don't set `id`"""
+    while True:
+        await asyncio.sleep(ID_BACKFILL_SECONDS)
+        try:
+            await backfill_document_ids(db)
+        except Exception as e:
+            print(f"id backfill failed: {e}")
+
+
+async def migrate_shot_status_completed(db: AsyncIOMotorDatabase):
+    await db.get_collection("shots").update_many(
+        {"status": "done"},
+        {"$set": {"status": "completed"}}
+    )
+
+
+async def migrate_shot_prompt(db: AsyncIOMotorDatabase):
+    await db.get_collection("shots").update_many(
+        {"prompt": {"$exists": False}, "prompt_data": {"$exists": True}},
+        [{"$set": {"prompt": {"$ifNull": ["$prompt_data.prompt", ""]}}}]
+    )
+
+
+MIGRATIONS: List[Tuple[str, Callable[[AsyncIOMotorDatabase], Awaitable[None]]]] = [
+    ("shot_status_completed", migrate_shot_status_completed),
+    ("shot_prompt", migrate_shot_prompt),
+]
+
+
+async def claim_migration(db: AsyncIOMotorDatabase, name: str) -> bool:
+    """Mark a migration as running; False if it is complete or another instance is running it"""
+    now = datetime.utcnow()
+    try:
+        await db.get_collection("migrations").update_one(
+            {
+                "_id": name,
+                "$or": [
+                    {"status": "failed"},
+                    {"status": "running", "started_at": {"$lt": now - MIGRATION_STALE_AFTER}}
+                ]
+            },
+            {"$set": {"status": "running", "started_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The upsert collided with a record that is completed or freshly running
+        return False
+    return True
+
+
+async def run_migrations(db: AsyncIOMotorDatabase):
+    """Backfill ids, then apply every pending migration in order; stops at the first failure"""
+    try:
+        await backfill_document_ids(db)
+    except Exception as e:
+        print(f"id backfill failed: {e}")
+
+    migrations = db.get_collection("migrations")
+
+    for name, migrate in MIGRATIONS:
+        if not await claim_migration(db, name):
+            continue
+
+        try:
+            await migrate(db)
+        except Exception as e:
+            print(f"Migration {name} failed: {e}")
+            await migrations.update_one(
+                {"_id": name},
+                {"$set": {"status": "failed", "error": str(e), "failed_at": datetime.utcnow()}}
+            )
+            return
+
+        await migrations.update_one(
+            {"_id": name},
+            {"$set": {"status": "completed", "completed_at": datetime.utcnow()}}
+        )
@@ -91,6 +91,8 @@ class Shot(MongoBaseModel):
     project_id: PyObjectId
     status: str = "queued"  # pending, queued, processing, completed, failed, ready
     urls: ShotUrls = Field(default_factory=ShotUrls)
+    # Flat copy of prompt_data.prompt, which is what the editor reads
+    prompt: Optional[str] = None
     prompt_data: ShotPromptData
     # Enhanced shot metadata
     shot_type: str = "medium"  # wide, establishing, master, medium, close_up, etc.
@@ -106,6 +108,14 @@ class Shot(MongoBaseModel):
     # GCS paths (for backwards compatibility)
     gcs_path: Optional[str] = None
     proxy_path: Optional[str] = None
+    # Seek index built on first scrub: {"fps", "duration", "keyframes": [[pts, pos], ...]}
+    keyframe_index: Optional[Dict[str, Any]] = None
+    # Scrub sprite layout plus "gcs_path" / "vtt_gcs_path", written with the proxy
+    sprite: Optional[Dict[str, Any]] = None
+    # Binary waveform peaks sidecar for shots with an audio track
+    peaks_path: Optional[str] = None
+    # HLS packaging of the proxy: {"prefix", "master", "renditions", "files"}
+    hls: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # --- Batch Generation Job ---
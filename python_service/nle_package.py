@@ -0,0 +1,383 @@
+"""
+DaVinci Resolve / Final Cut Pro package export.
+
+Downloads the high-res media behind every clip of an editor timeline,
+conforms it to 23.976 fps and streams the clips, plus an FCPXML
+referencing them, into a ZIP uploaded to storage as it is written.
+
+Reference-only exports skip the media entirely: the FCPXML or EDL points
+at signed URLs, or at the relative media/ paths a later "collect media"
+package fills in, and durations come from stored shot metadata.
+"""
+
+import os
+import uuid
+import shutil
+import asyncio
+import zipfile
+from xml.sax.saxutils import escape
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from zip_stream import WriteOnly
+
+# Called with (done, total) as clips are processed
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+# Clip pipeline limits: downloads are network bound, conforms CPU bound (ffmpeg is
+# itself multi-threaded), and at most RESOLVE_MAX_CLIPS_IN_FLIGHT clips sit on disk
+DOWNLOAD_CONCURRENCY = int(os.getenv("RESOLVE_DOWNLOAD_CONCURRENCY", "4"))
+CONFORM_CONCURRENCY = int(os.getenv("RESOLVE_CONFORM_CONCURRENCY", str(max(1, (os.cpu_count() or 2) // 2))))
+MAX_CLIPS_IN_FLIGHT = int(os.getenv("RESOLVE_MAX_CLIPS_IN_FLIGHT", str(DOWNLOAD_CONCURRENCY + CONFORM_CONCURRENCY)))
+
+# Lifetime of media links in reference-only exports (V4 signed URLs allow at most 7 days)
+REFERENCE_URL_MINUTES = 7 * 24 * 60
+
+# EDL timecode base; the 23.976 timeline is counted at 24 fps non-drop
+EDL_FPS = 24
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("shots", {"id": {"$in": ["s"]}, "project_id": "p"}, None),
+]
+
+REFERENCE_MEDIA_MODES = ("signed", "relink")
+REFERENCE_FORMATS = {
+    "fcpxml": ("fcpxml", "application/xml"),
+    "edl": ("edl", "text/plain")
+}
+
+
+def timeline_clips(editor_state: Dict) -> List[Tuple[int, Dict]]:
+    """(track index, clip) for every clip of an editor timeline, in timeline order"""
+    return [
+        (track_index, clip)
+        for track_index, track in enumerate(editor_state.get("tracks", []))
+        for clip in track.get("clips", [])
+    ]
+
+
+async def resolve_clip_shots(
+    db: AsyncIOMotorDatabase,
+    project_id: str,
+    clips: List[Tuple[int, Dict]]
+) -> Dict[str, Dict]:
+    """
+    Load the shots behind the clips with a single query, keyed by shot id.
+
+    Shot ids come from the client's editor state, so only shots of
+    `project_id` are resolved; clips naming any other shot are left out.
+    """
+    shot_ids = list({
+        clip.get("metadata", {}).get("shot_id")
+        for _, clip in clips
+        if clip.get("metadata", {}).get("shot_id")
+    })
+    if not shot_ids:
+        return {}
+
+    shots = db.get_collection("shots").find(
+        {"id": {"$in": shot_ids}, "project_id": project_id},
+        {"_id": 0, "id": 1, "gcs_path": 1, "duration": 1}
+    )
+    return {shot["id"]: shot async for shot in shots}
+
+
+def clip_media_filename(clip: Dict) -> str:
+    return f"clip_{clip.get('id')}.mp4"
+
+
+def clip_entry(resource_number: int, track_index: int, clip: Dict, src: str, media_duration: float = None) -> Dict:
+    """A clip as laid out by build_fcpxml and build_edl"""
+    return {
+        "id": f"r{resource_number}",
+        "name": clip_media_filename(clip),
+        "src": src,
+        "duration": clip.get("duration", 0),
+        "media_duration": media_duration or clip.get("duration", 0),
+        "track_index": track_index,
+        "start": clip.get("start", 0),
+        "offset": clip.get("offset", 0)
+    }
+
+
+def _xml_attr(value: str) -> str:
+    # Signed URLs carry query strings with '&'
+    return escape(value, {'"': "&quot;"})
+
+
+def build_fcpxml(export_id: str, fcpxml_clips: List[Dict]) -> str:
+    """FCPXML for the package; clips reference their media through each entry's 'src'"""
+    # Group by track
+    tracks_data = {}
+    for c in fcpxml_clips:
+        t_idx = c["track_index"]
+        if t_idx not in tracks_data:
+            tracks_data[t_idx] = []
+        tracks_data[t_idx].append(c)
+
+    # Sort clips by start time
+    for t_idx in tracks_data:
+        tracks_data[t_idx].sort(key=lambda x: x["start"])
+
+    # Build Resources XML
+    resources_xml = ""
+    for c in fcpxml_clips:
+        resources_xml += f'<asset id="{c["id"]}" name="{c["name"]}" uid="{uuid.uuid4()}" src="{_xml_attr(c["src"])}" start="0s" duration="{c["media_duration"]}s" hasVideo="1" format="r1" />\n'
+
+    # Build Sequence XML
+    # Assuming Track 0 is the spine.
+    spine_xml = ""
+
+    current_time = 0
+    if 0 in tracks_data:
+        for c in tracks_data[0]:
+            gap_duration = c["start"] - current_time
+            if gap_duration > 0.01: # Tolerance
+                spine_xml += f'<gap name="Gap" offset="{current_time}s" duration="{gap_duration}s" start="0s"/>\n'
+
+            spine_xml += f'<asset-clip name="{c["name"]}" ref="{c["id"]}" offset="{c["start"]}s" duration="{c["duration"]}s" start="{c["offset"]}s" />\n'
+            current_time = c["start"] + c["duration"]
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE fcpxml>
+<fcpxml version="1.9">
+    <resources>
+        <format id="r1" name="FFVideoFormat1080p2398" frameDuration="1001/24000s" width="1920" height="1080" colorSpace="1-1-1 (Rec. 709)"/>
+        {resources_xml}
+    </resources>
+    <library>
+        <event name="SceneWeaver Export">
+            <project name="Export_{export_id}">
+                <sequence format="r1">
+                    <spine>
+                        {spine_xml}
+                    </spine>
+                </sequence>
+            </project>
+        </event>
+    </library>
+</fcpxml>
+"""
+
+
+def _timecode(seconds: float, hours: int = 0) -> str:
+    frames = int(round(seconds * EDL_FPS)) + hours * 3600 * EDL_FPS
+    return (
+        f"{frames // (3600 * EDL_FPS):02d}:{frames // (60 * EDL_FPS) % 60:02d}:"
+        f"{frames // EDL_FPS % 60:02d}:{frames % EDL_FPS:02d}"
+    )
+
+
+def build_edl(export_id: str, edl_clips: List[Dict]) -> str:
+    """CMX 3600 EDL of the spine (track 0), recorded from 01:00:00:00"""
+    lines = [f"TITLE: Export_{export_id}", "FCM: NON-DROP FRAME", ""]
+
+    spine = sorted((c for c in edl_clips if c["track_index"] == 0), key=lambda c: c["start"])
+    for number, c in enumerate(spine, start=1):
+        source_in, record_in = c["offset"], c["start"]
+        lines.append(
+            f"{number:03d}  AX       V     C        "
+            f"{_timecode(source_in)} {_timecode(source_in + c['duration'])} "
+            f"{_timecode(record_in, 1)} {_timecode(record_in + c['duration'], 1)}"
+        )
+        lines.append(f"* FROM CLIP NAME: {c['name']}")
+        lines.append(f"* SOURCE FILE: {c['src']}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+async def build_reference_project(
+    db: AsyncIOMotorDatabase,
+    storage_manager,
+    project_id: str,
+    editor_state: Dict,
+    export_id: str,
+    export_format: str = "fcpxml",
+    media: str = "signed"
+) -> str:
+    """
+    Build an FCPXML or EDL for a timeline without transferring any media.
+
+    Args:
+        db: Database used to resolve shot ids to high-res blobs.
+        storage_manager: Used to sign media URLs.
+        project_id: Project the timeline belongs to; clips of other projects' shots are left out.
+        editor_state: Editor JSON, as for build_resolve_package.
+        export_id: Name of the project.
+        export_format: "fcpxml" or "edl".
+        media: "signed" to reference signed URLs, or "relink" for the
+               ./media/ paths of a collect-media package.
+
+    Returns:
+        The document text.
+    """
+    clips = timeline_clips(editor_state)
+    shots = await resolve_clip_shots(db, project_id, clips)
+
+    def layout():
+        entries = []
+        for track_index, clip in clips:
+            shot = shots.get(clip.get("metadata", {}).get("shot_id"))
+            if not shot or not shot.get("gcs_path"):
+                print(f"Could not resolve high-res for clip {clip.get('id')}, leaving it out.")
+                continue
+
+            if media == "signed":
+                src = storage_manager.generate_signed_url(shot["gcs_path"], expiration_minutes=REFERENCE_URL_MINUTES)
+            else:
+                src = f"file://localhost/./media/{clip_media_filename(clip)}"
+            entries.append(clip_entry(len(entries) + 1, track_index, clip, src, shot.get("duration")))
+
+        if export_format == "edl":
+            return build_edl(export_id, entries)
+        return build_fcpxml(export_id, entries)
+
+    # Signing is local crypto, but enough of it to keep off the event loop
+    return await run_in_threadpool(layout)
+
+
+async def build_resolve_package(
+    db: AsyncIOMotorDatabase,
+    storage_manager,
+    video_processor,
+    project_id: str,
+    editor_state: Dict,
+    export_id: str = None,
+    progress: Optional[ProgressCallback] = None,
+    include_project: bool = True
+) -> str:
+    """
+    Build the package for an editor timeline and upload it.
+
+    Clips flow through a download -> conform -> archive pipeline with
+    bounded concurrency per stage, so network transfer of one clip
+    overlaps with encoding of others and the total time approaches that
+    of the slowest stage.
+
+    Args:
+        db: Database used to resolve shot ids to high-res blobs.
+        storage_manager: Used to download clips and stream the archive up.
+        video_processor: Used to conform clips.
+        project_id: Project the timeline belongs to; clips of other projects' shots are left out.
+        editor_state: Editor JSON: { "tracks": [ { "id": "...", "clips": [ { ... } ] } ] }
+        export_id: Name of the package; generated if omitted.
+        progress: Optional coroutine reporting clip progress.
+        include_project: Write project.fcpxml. Without it the ZIP is only
+                         the media/ folder a "relink" reference export points at.
+
+    Returns:
+        Storage path of the uploaded ZIP.
+    """
+    export_id = export_id or str(uuid.uuid4())
+    export_dir = f"exports/{export_id}"
+    media_dir = f"{export_dir}/media"
+    gcs_zip_path = f"exports/{export_id}.zip"
+    os.makedirs(media_dir, exist_ok=True)
+
+    clips = timeline_clips(editor_state)
+    shots = await resolve_clip_shots(db, project_id, clips)
+    total = len(clips)
+
+    download_slots = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    conform_slots = asyncio.Semaphore(CONFORM_CONCURRENCY)
+    in_flight = asyncio.Semaphore(MAX_CLIPS_IN_FLIGHT)
+    archive_lock = asyncio.Lock()
+    archived = set()
+    done = 0
+
+    # The archive is streamed into a resumable upload as clips finish, so each byte
+    # is written once and only the clips in flight ever touch local disk
+    upload = await run_in_threadpool(storage_manager.open_writer, gcs_zip_path, "application/zip")
+    sink = WriteOnly(upload)
+    archive = zipfile.ZipFile(sink, "w", allowZip64=True)
+
+    try:
+        async def process_clip(clip: Dict, gcs_path: str):
+            filename = clip_media_filename(clip)
+            local_raw_path = f"{media_dir}/raw_{filename}"
+            local_conformed_path = f"{media_dir}/{filename}"
+
+            async with in_flight:
+                async with download_slots:
+                    await run_in_threadpool(storage_manager.download_file, gcs_path, local_raw_path)
+
+                async with conform_slots:
+                    if os.path.getsize(local_raw_path) > 1024:
+                        await run_in_threadpool(video_processor.conform_framerate, local_raw_path, local_conformed_path)
+                    else:
+                        shutil.copy(local_raw_path, local_conformed_path)
+                os.remove(local_raw_path)
+
+                # Video is already compressed, so it is stored rather than deflated
+                async with archive_lock:
+                    await run_in_threadpool(
+                        archive.write, local_conformed_path, f"media/{filename}", zipfile.ZIP_STORED
+                    )
+                os.remove(local_conformed_path)
+
+            archived.add(clip.get("id"))
+            await report()
+
+        async def report():
+            nonlocal done
+            done += 1
+            if progress:
+                await progress(done, total)
+
+        tasks = []
+        for _, clip in clips:
+            shot = shots.get(clip.get("metadata", {}).get("shot_id"))
+            if shot and shot.get("gcs_path"):
+                tasks.append(asyncio.ensure_future(process_clip(clip, shot["gcs_path"])))
+            else:
+                print(f"Could not resolve high-res for clip {clip.get('id')}, skipping download.")
+                await report()
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        if include_project:
+            # Resources are numbered in timeline order, whatever order clips finished in
+            fcpxml_clips = []
+            for track_index, clip in clips:
+                if clip.get("id") in archived:
+                    fcpxml_clips.append(clip_entry(
+                        len(fcpxml_clips) + 1, track_index, clip,
+                        f"file://localhost/./media/{clip_media_filename(clip)}"
+                    ))
+
+            archive.writestr("project.fcpxml", build_fcpxml(export_id, fcpxml_clips), zipfile.ZIP_DEFLATED)
+
+        await run_in_threadpool(archive.close)
+        # Finalises the upload; the object does not exist in the bucket before this
+        await run_in_threadpool(upload.close)
+        return gcs_zip_path
+
+    except BaseException:
+        # Stop feeding the upload, then finalise and delete it so no truncated archive is left behind
+        sink.abort()
+
+        def discard():
+            try:
+                upload.close()
+            finally:
+                storage_manager.delete_file(gcs_zip_path)
+
+        try:
+            await run_in_threadpool(discard)
+        except Exception as e:
+            print(f"Could not discard partial export {gcs_zip_path}: {e}")
+        raise
+
+    finally:
+        # Cleanup
+        shutil.rmtree(export_dir, ignore_errors=True)
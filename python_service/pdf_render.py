@@ -0,0 +1,436 @@
+"""
+PDF layout for storyboard and pitch deck exports.
+
+Rendering runs in a process pool so large projects neither block the
+event loop nor hold the finished PDF in the API worker's memory. This
+module only depends on reportlab (and pypdf when merging) so worker
+processes start quickly.
+
+Storyboards are assembled from a separately rendered title page and one
+cached fragment per scene, so re-exporting after an edit only lays out
+the scenes that changed.
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import uuid
+import asyncio
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, A4, TABLOID
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+PAPER_SIZES = {
+    "letter": letter,
+    "a4": A4,
+    "tabloid": TABLOID
+}
+
+# Storyboard panel and pitch deck key frame sizes, in inches
+PANEL_SIZE = (2, 1.125)
+KEY_FRAME_SIZE = (9, 5)
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Address-space ceiling for each render process; a runaway export fails instead of starving the API
+PDF_RENDER_MEMORY_LIMIT = int(os.getenv("PDF_RENDER_MEMORY_LIMIT_MB", "1024")) * 1024 * 1024
+# Rendered PDFs are spooled here and streamed to the client, then deleted
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", "temp_exports")
+
+# Storyboard pages of each scene are cached here as separate PDFs and merged per export
+PDF_FRAGMENT_DIR = os.getenv("PDF_FRAGMENT_DIR", os.path.join(PDF_SPOOL_DIR, "fragments"))
+PDF_FRAGMENT_CACHE_BYTES = int(os.getenv("PDF_FRAGMENT_CACHE_MB", "1024")) * 1024 * 1024
+# Fragments used this recently are never pruned, so a running export cannot lose one mid-merge
+FRAGMENT_MIN_AGE_SECONDS = 15 * 60
+
+# Bump to discard cached fragments after a change to the scene layout
+FRAGMENT_VERSION = 1
+# Everything that affects how a scene's pages look
+FRAGMENT_SHOT_FIELDS = (
+    "id", "updated_at", "gcs_path", "proxy_path", "shot_number", "shot_type",
+    "description", "prompt", "notes"
+)
+FRAGMENT_OPTIONS = ("paperSize", "panelsPerRow", "includeNotes", "imageDpi")
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_pool = None
+
+
+def _storyboard_doc(output, options: Dict) -> SimpleDocTemplate:
+    return SimpleDocTemplate(
+        output,
+        pagesize=PAPER_SIZES.get(options.get("paperSize", "letter"), letter),
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.75*inch,
+        bottomMargin=0.5*inch
+    )
+
+
+def build_storyboard_title_pdf(
+    output,
+    project_name: str,
+    shot_count: int,
+    options: Dict
+):
+    """Lay out the storyboard title page and write it to `output`"""
+    doc = _storyboard_doc(output, options)
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'Title',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=20,
+        textColor=colors.black
+    )
+    
+    elements = []
+    elements.append(Spacer(1, 2*inch))
+    elements.append(Paragraph(project_name, title_style))
+    elements.append(Paragraph("Storyboard", styles['Heading2']))
+    elements.append(Spacer(1, 0.5*inch))
+    elements.append(Paragraph(f"Generated: {datetime.now().strftime('%B %d, %Y')}", styles['Normal']))
+    elements.append(Paragraph(f"{shot_count} shots", styles['Normal']))
+    
+    doc.build(elements)
+
+
+def build_storyboard_scene_pdf(
+    output,
+    slug_line: str,
+    scene_shots: List[Dict],
+    options: Dict,
+    images: Dict[str, bytes]
+):
+    """Lay out the storyboard pages of one scene and write them to `output`"""
+    panels_per_row = options.get("panelsPerRow", 3)
+    include_notes = options.get("includeNotes", True)
+    
+    doc = _storyboard_doc(output, options)
+    
+    styles = getSampleStyleSheet()
+    scene_style = ParagraphStyle(
+        'Scene',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceBefore=20,
+        spaceAfter=10,
+        textColor=colors.darkgray
+    )
+    shot_style = ParagraphStyle(
+        'Shot',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.gray
+    )
+    
+    elements = []
+    
+    # Scene header
+    elements.append(Paragraph(slug_line, scene_style))
+    
+    # Create panel rows
+    for i in range(0, len(scene_shots), panels_per_row):
+        row_shots = scene_shots[i:i + panels_per_row]
+        
+        # Panel images row
+        panel_data = []
+        for shot in row_shots:
+            # Download image from GCS or use placeholder
+            img_url = shot.get("proxy_path") or shot.get("gcs_path")
+            
+            if img_url:
+                img_data = images.get(img_url)
+                if img_data:
+                    img = Image(io.BytesIO(img_data), width=PANEL_SIZE[0]*inch, height=PANEL_SIZE[1]*inch)
+                else:
+                    img = Paragraph("[Image]", styles['Normal'])
+            else:
+                img = Paragraph("[Pending]", styles['Normal'])
+            
+            panel_data.append(img)
+        
+        # Pad row if needed
+        while len(panel_data) < panels_per_row:
+            panel_data.append("")
+        
+        table = Table([panel_data], colWidths=[2.2*inch] * panels_per_row)
+        table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+        ]))
+        elements.append(table)
+        
+        # Shot info row
+        info_data = []
+        for shot in row_shots:
+            shot_type = shot.get("shot_type", "medium").upper()[:3]
+            shot_num = shot.get("shot_number", 0)
+            desc = shot.get("description", shot.get("prompt", ""))[:100]
+            
+            info_text = f"<b>{shot_type}-{shot_num}</b><br/>{desc}"
+            if include_notes and shot.get("notes"):
+                info_text += f"<br/><i>{shot.get('notes')}</i>"
+            
+            info_data.append(Paragraph(info_text, shot_style))
+        
+        while len(info_data) < panels_per_row:
+            info_data.append("")
+        
+        info_table = Table([info_data], colWidths=[2.2*inch] * panels_per_row)
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ]))
+        elements.append(info_table)
+        elements.append(Spacer(1, 0.2*inch))
+    
+    doc.build(elements)
+
+
+def build_pitch_deck_pdf(
+    output,
+    project_name: str,
+    key_shots: List[Dict],
+    scenes_map: Dict,
+    images: Dict[str, bytes]
+):
+    """Lay out a pitch deck with one key frame per page and write it to `output`"""
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=TABLOID,  # Landscape-ish for presentations
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.5*inch,
+        bottomMargin=0.5*inch
+    )
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'BigTitle',
+        parent=styles['Title'],
+        fontSize=48,
+        spaceAfter=30
+    )
+    
+    elements = []
+    
+    # Title slide
+    elements.append(Spacer(1, 3*inch))
+    elements.append(Paragraph(project_name, title_style))
+    elements.append(Paragraph("Visual Treatment", styles['Heading2']))
+    elements.append(PageBreak())
+    
+    for shot in key_shots:
+        scene = scenes_map.get(shot.get("scene_id"), {})
+        
+        # Full page image
+        elements.append(Spacer(1, 0.5*inch))
+        
+        img_url = shot.get("proxy_path")
+        if img_url:
+            img_data = images.get(img_url)
+            if img_data:
+                elements.append(Image(io.BytesIO(img_data), width=KEY_FRAME_SIZE[0]*inch, height=KEY_FRAME_SIZE[1]*inch))
+            else:
+                elements.append(Paragraph("[Image]", styles['Normal']))
+        
+        elements.append(Spacer(1, 0.3*inch))
+        elements.append(Paragraph(scene.get("slug_line", ""), styles['Heading3']))
+        elements.append(Paragraph(shot.get("description", ""), styles['Normal']))
+        elements.append(PageBreak())
+    
+    doc.build(elements)
+
+
+def merge_pdfs(output, part_paths: List[str]):
+    """Concatenate already rendered PDFs into `output`"""
+    # Imported here: only merging workers need pypdf
+    from pypdf import PdfWriter
+    
+    writer = PdfWriter()
+    for path in part_paths:
+        writer.append(path)
+    writer.write(output)
+    writer.close()
+
+
+BUILDERS = {
+    "storyboard_title": build_storyboard_title_pdf,
+    "storyboard_scene": build_storyboard_scene_pdf,
+    "pitch_deck": build_pitch_deck_pdf,
+    "merge": merge_pdfs
+}
+
+
+def _init_worker(memory_limit: int):
+    if memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _render_in_worker(builder_name: str, output_path: str, args: tuple) -> float:
+    start = time.perf_counter()
+    with open(output_path, "wb") as f:
+        BUILDERS[builder_name](f, *args)
+    return (time.perf_counter() - start) * 1000
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: children must not inherit the parent's Motor client or event loop
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(PDF_RENDER_MEMORY_LIMIT,)
+        )
+    return _pool
+
+
+async def render_pdf(builder_name: str, *args) -> tuple:
+    """
+    Render a PDF in the process pool.
+
+    Args:
+        builder_name: Key into BUILDERS.
+        *args: Arguments for the builder after the output file.
+
+    Returns:
+        (path, render_ms): the spooled PDF on local disk, which the caller
+        must delete, and the time spent rendering in the worker.
+    """
+    global _pool
+    os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+    output_path = os.path.join(PDF_SPOOL_DIR, f"{builder_name}_{uuid.uuid4().hex}.pdf")
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        render_ms = await loop.run_in_executor(pool, _render_in_worker, builder_name, output_path, args)
+    except BrokenProcessPool:
+        # A worker died (most likely the memory ceiling); start a fresh pool for the next export.
+        # Shutting the broken one down stops its management thread and any surviving workers.
+        # Concurrent renders fail on the same pool, so only the first replaces it.
+        if _pool is pool:
+            _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        _remove(output_path)
+        raise MemoryError("PDF render exceeded its memory limit")
+    except BaseException:
+        _remove(output_path)
+        raise
+
+    print(f"Rendered {builder_name} PDF in {render_ms:.0f} ms ({os.path.getsize(output_path)} bytes)")
+    return output_path, render_ms
+
+
+def storyboard_fragment_key(slug_line: str, scene_shots: List[Dict], options: Dict) -> str:
+    """Hash of the inputs of one scene's storyboard pages"""
+    payload = {
+        "v": FRAGMENT_VERSION,
+        "slug_line": slug_line,
+        "options": {name: options.get(name) for name in FRAGMENT_OPTIONS},
+        "shots": [[shot.get(field) for field in FRAGMENT_SHOT_FIELDS] for shot in scene_shots]
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cached_fragment(key: str) -> Optional[str]:
+    """Path of a cached scene fragment, or None if it has to be rendered"""
+    path = os.path.join(PDF_FRAGMENT_DIR, f"{key}.pdf")
+    try:
+        # Touch it so pruning drops the least recently used fragments first
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+async def render_storyboard_fragment(
+    key: str,
+    slug_line: str,
+    scene_shots: List[Dict],
+    options: Dict,
+    images: Dict[str, bytes]
+) -> tuple:
+    """
+    Render one scene's storyboard pages into the fragment cache.
+
+    The key doesn't cover image fetches, so pages with an "[Image]"
+    placeholder for an image that could not be fetched are not cached:
+    the next export fetches the image again.
+
+    Returns:
+        (path, render_ms, cached). When not cached, the path is a spool
+        file the caller must delete.
+    """
+    path, render_ms = await render_pdf("storyboard_scene", slug_line, scene_shots, options, images)
+    sources = [shot.get("proxy_path") or shot.get("gcs_path") for shot in scene_shots]
+    if not all(images.get(source) for source in sources if source):
+        return path, render_ms, False
+    os.makedirs(PDF_FRAGMENT_DIR, exist_ok=True)
+    fragment_path = os.path.join(PDF_FRAGMENT_DIR, f"{key}.pdf")
+    os.replace(path, fragment_path)
+    return fragment_path, render_ms, True
+
+
+def prune_fragments():
+    """Delete least recently used fragments until the cache fits PDF_FRAGMENT_CACHE_BYTES"""
+    try:
+        entries = [entry for entry in os.scandir(PDF_FRAGMENT_DIR) if entry.is_file()]
+    except FileNotFoundError:
+        return
+    
+    stats = sorted(((entry.stat(), entry.path) for entry in entries), key=lambda item: item[0].st_mtime)
+    total = sum(stat.st_size for stat, _ in stats)
+    cutoff = time.time() - FRAGMENT_MIN_AGE_SECONDS
+    for stat, path in stats:
+        if total <= PDF_FRAGMENT_CACHE_BYTES or stat.st_mtime > cutoff:
+            break
+        _remove(path)
+        total -= stat.st_size
+
+
+def iter_file(path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Iterate a spooled file in chunks, deleting it straight away.
+
+    The file is opened and unlinked before this returns, so its space is
+    freed when the iterator is exhausted or dropped, even if the response
+    is never sent or the client disconnects before streaming starts.
+    """
+    f = open(path, "rb")
+    _remove(path)
+    return _iter_chunks(f, chunk_size)
+
+
+def _iter_chunks(f, chunk_size: int):
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
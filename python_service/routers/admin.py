@@ -3,11 +3,14 @@ from typing import List
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 
-from database import get_db
+from database import get_db, id_filter, list_projection
 from database import get_db
 from models import User, Log, ModerationItem, PricingConfig, AIProviderConfig
-from auth import RequireAdmin
-from security import encrypt_value, decrypt_value
+from auth import RequireAdmin, invalidate_project_access, invalidate_user
+from cache import cache_stats
+from config_cache import config_cache, provider_api_key
+from db_monitoring import command_metrics, pool_metrics
+from security import encrypt_value
 
 router = APIRouter(
     prefix="/api/admin",
@@ -15,6 +18,18 @@ router = APIRouter(
     dependencies=[RequireAdmin]
 )
 
+# Queries issued below, checked against the indexes by indexes.verify_query_plans.
+# The unfiltered user, project and asset listings scan by design.
+QUERY_SHAPES = [
+    ("assets", {"type": "character"}, None),
+    ("logs", {}, [("timestamp", -1)]),
+    ("logs", {"level": "error"}, [("timestamp", -1)]),
+    ("logs", {"service": "playback"}, None),
+    ("moderation_queue", {"status": "pending"}, None),
+    ("projects", {"id": "p"}, None),
+    ("ai_configs", {"provider_id": "p"}, None),
+]
+
 @router.get("/health")
 async def admin_health_check():
     """
@@ -53,6 +68,7 @@ async def update_user_role(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
         
     return {"status": "success", "message": f"User role updated to {role}"}
 
@@ -72,6 +88,7 @@ async def adjust_user_credits(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
         
     return {"status": "success", "message": f"Credits adjusted by {amount}"}
 
@@ -84,7 +101,9 @@ async def list_all_projects(
     """
     List all projects across all users.
     """
-    projects = await db.get_collection("projects").find().skip(skip).limit(limit).to_list(length=limit)
+    projects = await db.get_collection("projects").find(
+        {}, list_projection("projects")
+    ).skip(skip).limit(limit).to_list(length=limit)
     return projects
 
 @router.get("/assets")
@@ -120,6 +139,36 @@ async def check_services_health():
     ]
     return {"services": services, "timestamp": datetime.utcnow()}
 
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """
+    Hit rates and sizes of this worker's in-process caches.
+    """
+    return {"caches": cache_stats(), "config": config_cache.stats(), "timestamp": datetime.utcnow()}
+
+@router.get("/db-stats")
+async def get_db_stats(limit: int = 50):
+    """
+    Latency histograms of this worker's MongoDB commands by collection, command
+    and query shape (highest total time first), connection pool wait times and
+    the most recent slow queries.
+    """
+    return {
+        "commands": command_metrics.snapshot()[:limit],
+        "pool": pool_metrics.snapshot(),
+        "slow_queries": list(command_metrics.slow_queries),
+        "timestamp": datetime.utcnow()
+    }
+
+@router.post("/db-stats/reset")
+async def reset_db_stats():
+    """
+    Clear the command and pool statistics, e.g. before measuring a change.
+    """
+    command_metrics.reset()
+    pool_metrics.reset()
+    return {"status": "success"}
+
 @router.get("/logs", response_model=List[Log])
 async def list_logs(
     skip: int = 0,
@@ -133,6 +182,26 @@ async def list_logs(
     logs = await db.get_collection("logs").find(query).sort("timestamp", -1).skip(skip).limit(limit).to_list(length=limit)
     return logs
 
+@router.get("/playback-metrics")
+async def get_playback_metrics(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Compare player startup time for HLS and progressive playback.
+    """
+    pipeline = [
+        {"$match": {"service": "playback"}},
+        {"$group": {
+            "_id": "$meta.mode",
+            "count": {"$sum": 1},
+            "avg_startup_ms": {"$avg": "$meta.startup_ms"},
+            "min_startup_ms": {"$min": "$meta.startup_ms"},
+            "max_startup_ms": {"$max": "$meta.startup_ms"}
+        }}
+    ]
+    results = await db.get_collection("logs").aggregate(pipeline).to_list(length=10)
+    return {r.pop("_id"): r for r in results}
+
 @router.get("/moderation", response_model=List[ModerationItem])
 async def list_moderation_queue(
     status: str = "pending",
@@ -164,7 +233,7 @@ async def moderate_item(
 async def get_pricing_config(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    config = await db.get_collection("pricing_config").find_one()
+    config = await config_cache.get(db, "pricing_config")
     if not config:
         return PricingConfig()
     return config
@@ -175,6 +244,7 @@ async def update_pricing_config(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     await db.get_collection("pricing_config").replace_one({}, config.dict(by_alias=True), upsert=True)
+    await config_cache.invalidate(db, "pricing_config")
     return {"status": "success", "message": "Pricing config updated"}
 
 @router.delete("/projects/{project_id}")
@@ -182,9 +252,10 @@ async def delete_project(
     project_id: str,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    result = await db.get_collection("projects").delete_one({"_id": project_id})
+    result = await db.get_collection("projects").delete_one(id_filter(project_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
+    invalidate_project_access(project_id)
     return {"status": "success", "message": "Project deleted"}
 
 @router.post("/users/{user_id}/suspend")
@@ -199,6 +270,7 @@ async def suspend_user(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
         
     return {"status": "success", "message": "User suspended"}
 
@@ -206,12 +278,13 @@ async def suspend_user(
 async def list_ai_configs(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    configs = await db.get_collection("ai_configs").find().to_list(length=100)
+    # Cached documents are shared, so the masked keys go into copies
+    configs = [dict(config) for config in await config_cache.get(db, "ai_configs")]
     # Decrypt keys for display (or mask them)
     # For security, we'll mask them here, only showing last 4 chars if present
     for config in configs:
         if config.get("api_key"):
-            decrypted = decrypt_value(config["api_key"])
+            decrypted = provider_api_key(config["api_key"])
             if decrypted:
                 config["api_key"] = f"sk-...{decrypted[-4:]}" if len(decrypted) > 4 else "******"
             else:
@@ -238,4 +311,5 @@ async def update_ai_config(
         config.dict(by_alias=True), 
         upsert=True
     )
+    await config_cache.invalidate(db, "ai_configs")
     return {"status": "success", "message": f"Config for {config.provider_id} updated"}
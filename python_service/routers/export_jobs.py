@@ -0,0 +1,230 @@
+"""
+Asynchronous export jobs for SceneWeaver.
+
+Large storyboards and NLE packages can take longer than a proxy will
+wait, so instead of rendering inside the request a client submits a job,
+polls its progress and downloads the finished artifact from a signed URL.
+Submitting an export that is already queued or running returns the
+existing job instead of starting a second render.
+"""
+
+import json
+import uuid
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from auth import RequireAuth, ensure_project_access
+from database import get_db
+from VideoProcessor import VideoProcessor
+from models import User
+from export_cache import export_fingerprint
+from nle_package import build_resolve_package
+from routers.exports import (
+    StoryboardExportRequest, EXPORT_FORMATS, export_cache, storage_manager,
+    load_export_inputs, export_filename, storyboard_builder
+)
+
+router = APIRouter(prefix="/api/export/jobs", tags=["export"])
+
+video_processor = VideoProcessor()
+
+# Active jobs that have not reported progress for this long are treated as lost
+# (e.g. the worker process restarted) and no longer block new submissions
+JOB_STALE_AFTER = timedelta(minutes=30)
+
+DOWNLOAD_URL_MINUTES = 60
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("export_jobs", {"id": "j"}, None),
+    ("export_jobs", {"id": "j", "user_id": "u"}, None),
+    ("export_jobs", {"dedupe_key": "k"}, None),
+]
+
+class ResolveExportRequest(BaseModel):
+    project_id: str
+    editor_state: Dict[str, Any]
+
+
+class ExportJobRequest(BaseModel):
+    kind: str  # storyboard, resolve, collect_media (resolve package without project.fcpxml)
+    storyboard: Optional[StoryboardExportRequest] = None
+    resolve: Optional[ResolveExportRequest] = None
+
+
+async def set_job_progress(db: AsyncIOMotorDatabase, job_id: str, stage: str, progress: float):
+    await db.get_collection("export_jobs").update_one(
+        {"id": job_id},
+        {"$set": {"stage": stage, "progress": round(progress, 3), "updated_at": datetime.utcnow()}}
+    )
+
+
+@router.post("")
+async def submit_export_job(
+    request: ExportJobRequest,
+    background_tasks: BackgroundTasks,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Queue an export; returns the job id to poll"""
+    if request.kind == "storyboard" and request.storyboard:
+        await ensure_project_access(db, user, request.storyboard.project_id)
+        shots, scenes_map = await load_export_inputs(request.storyboard, db)
+        params = request.storyboard.model_dump()
+        project_id = request.storyboard.project_id
+        content_key = export_fingerprint(
+            request.storyboard.format, request.storyboard.project_name,
+            shots, scenes_map, request.storyboard.options
+        )
+    elif request.kind in ("resolve", "collect_media") and request.resolve:
+        await ensure_project_access(db, user, request.resolve.project_id)
+        params = request.resolve.model_dump()
+        project_id = request.resolve.project_id
+        content_key = hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+    else:
+        raise HTTPException(status_code=400, detail="kind must be 'storyboard', 'resolve' or 'collect_media' with matching parameters")
+
+    # Only queued/running jobs carry a dedupe_key; its unique index (see indexes.py) allows one per export
+    dedupe_key = f"{request.kind}:{user.id}:{content_key}"
+    jobs = db.get_collection("export_jobs")
+
+    job_data = {
+        "id": str(uuid.uuid4()),
+        "user_id": user.id,
+        "project_id": project_id,
+        "kind": request.kind,
+        "params": params,
+        "dedupe_key": dedupe_key,
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0.0,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+    for _ in range(2):
+        try:
+            await jobs.insert_one(job_data)
+            break
+        except DuplicateKeyError:
+            existing = await jobs.find_one({"dedupe_key": dedupe_key})
+            if not existing:
+                # Finished between the insert and the lookup; try again
+                continue
+            if existing["updated_at"] > datetime.utcnow() - JOB_STALE_AFTER:
+                return {
+                    "status": existing["status"],
+                    "job_id": existing["id"],
+                    "deduplicated": True
+                }
+            await jobs.update_one(
+                {"id": existing["id"]},
+                {"$set": {"status": "failed", "error": "Export worker stopped responding"},
+                 "$unset": {"dedupe_key": ""}}
+            )
+    else:
+        raise HTTPException(status_code=409, detail="Could not queue export, please retry")
+
+    background_tasks.add_task(run_export_job, job_data["id"])
+
+    return {
+        "status": "queued",
+        "job_id": job_data["id"],
+        "deduplicated": False
+    }
+
+
+@router.get("/{job_id}")
+async def get_export_job(
+    job_id: str,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get job status and progress; completed jobs include a signed download URL"""
+    job = await db.get_collection("export_jobs").find_one(
+        {"id": job_id, "user_id": user.id},
+        {"_id": 0, "params": 0, "dedupe_key": 0}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+
+    if job["status"] == "completed" and job.get("gcs_path"):
+        # Signed on every poll so the link is always fresh
+        job["download_url"] = storage_manager.generate_signed_url(
+            job["gcs_path"], expiration_minutes=DOWNLOAD_URL_MINUTES
+        )
+    return job
+
+
+async def run_export_job(job_id: str):
+    """Background task rendering an export job and recording the result"""
+    db = await get_db()
+    jobs = db.get_collection("export_jobs")
+
+    job = await jobs.find_one({"id": job_id})
+    if not job:
+        return
+
+    await jobs.update_one(
+        {"id": job_id},
+        {"$set": {"status": "running", "started_at": datetime.utcnow()}}
+    )
+
+    try:
+        if job["kind"] == "storyboard":
+            request = StoryboardExportRequest(**job["params"])
+
+            await set_job_progress(db, job_id, "loading", 0.05)
+            shots, scenes_map = await load_export_inputs(request, db)
+            fingerprint = export_fingerprint(
+                request.format, request.project_name, shots, scenes_map, request.options
+            )
+
+            await set_job_progress(db, job_id, "rendering", 0.2)
+            artifact = await export_cache.ensure(
+                db, fingerprint, request.project_id,
+                export_filename(request), EXPORT_FORMATS[request.format][1],
+                storyboard_builder(request, shots, scenes_map)
+            )
+            result = {"gcs_path": artifact["gcs_path"], "filename": export_filename(request), "size": artifact["size"]}
+        else:
+            async def report(done: int, total: int):
+                await set_job_progress(db, job_id, "collecting media", 0.9 * done / max(1, total))
+
+            gcs_path = await build_resolve_package(
+                db, storage_manager, video_processor, job["params"]["project_id"], job["params"]["editor_state"],
+                export_id=job_id, progress=report, include_project=job["kind"] == "resolve"
+            )
+            result = {"gcs_path": gcs_path, "filename": f"{job_id}.zip"}
+
+        await jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                **result,
+                "status": "completed",
+                "stage": "completed",
+                "progress": 1.0,
+                "completed_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }, "$unset": {"dedupe_key": ""}}
+        )
+
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"Export job {job_id} failed: {error}")
+        await jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": "failed",
+                "stage": "failed",
+                "error": error,
+                "updated_at": datetime.utcnow()
+            }, "$unset": {"dedupe_key": ""}}
+        )
@@ -4,29 +4,64 @@ Supports PDF storyboards, image strips, pitch decks, and NLE exports.
 """
 
 import os
-import io
+import json
 import uuid
-import zipfile
+import asyncio
+import itertools
+from collections import deque
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4, TABLOID
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-
-from auth import get_current_user, RequireAuth
-from database import get_db
+
+from auth import get_current_user, RequireAuth, ensure_project_access
+from database import get_db, iter_documents
 from StorageManager import StorageManager
+from ImagePrefetcher import ImagePrefetcher
+from pdf_render import (
+    render_pdf, storyboard_fragment_key, cached_fragment, render_storyboard_fragment,
+    prune_fragments, PANEL_SIZE, KEY_FRAME_SIZE, PDF_RENDER_WORKERS
+)
+from zip_stream import ZipStream
+from export_cache import ExportArtifactCache, BuildReport, export_fingerprint
+from nle_package import build_reference_project, REFERENCE_FORMATS, REFERENCE_MEDIA_MODES
 from models import User
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
 storage_manager = StorageManager()
+image_prefetcher = ImagePrefetcher(storage_manager)
+export_cache = ExportArtifactCache(storage_manager)
+
+# Print resolution panel images are downsampled to before layout
+DEFAULT_IMAGE_DPI = 150
+
+# Shot images downloaded ahead of the one being written into a png_strip archive
+STRIP_FETCH_WINDOW = 4
+
+# Shot fields read by the export builders and the artifact fingerprint
+EXPORT_SHOT_PROJECTION = {
+    field: 1 for field in ("id", "scene_id", "shot_number", "shot_type", "description", "prompt",
+                           "notes", "duration", "gcs_path", "proxy_path", "updated_at")
+}
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("shots", {"project_id": "p", "status": "completed"}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"project_id": "p", "status": "completed", "id": {"$in": ["s"]}}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"project_id": "p", "status": "completed", "scene_id": {"$in": ["sc"]}}, [("shot_number", 1), ("_id", 1)]),
+    ("scenes", {"id": {"$in": ["sc"]}}, None),
+]
+
+# format -> (download filename suffix, media type)
+EXPORT_FORMATS = {
+    "pdf": ("_storyboard.pdf", "application/pdf"),
+    "png_strip": ("_strips.zip", "application/zip"),
+    "pitch_deck": ("_pitch_deck.pdf", "application/pdf"),
+    "fcpxml": (".fcpxml", "application/xml")
+}
 
 
 class StoryboardExportRequest(BaseModel):
@@ -38,11 +73,11 @@ class StoryboardExportRequest(BaseModel):
     shot_ids: List[str] = []
 
 
-PAPER_SIZES = {
-    "letter": letter,
-    "a4": A4,
-    "tabloid": TABLOID
-}
+class ReferenceExportRequest(BaseModel):
+    project_id: str
+    editor_state: Dict[str, Any]
+    format: str = "fcpxml"  # fcpxml, edl
+    media: str = "signed"  # signed, relink
 
 
 @router.post("/storyboard")
@@ -52,6 +87,66 @@ async def export_storyboard(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Export storyboard in various formats"""
+    await ensure_project_access(db, user, request.project_id)
+    
+    shots, scenes_map = await load_export_inputs(request, db)
+    
+    # Identical exports are served from the artifact cache instead of being rebuilt
+    fingerprint = export_fingerprint(
+        request.format, request.project_name, shots, scenes_map, request.options
+    )
+    return await export_cache.serve(
+        db, fingerprint, request.project_id,
+        export_filename(request), EXPORT_FORMATS[request.format][1],
+        storyboard_builder(request, shots, scenes_map)
+    )
+
+
+@router.post("/resolve/reference")
+async def export_resolve_reference(
+    request: ReferenceExportRequest,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Export a timeline as FCPXML or EDL that references media instead of shipping it.
+    
+    With media="relink" the clips point at ./media/, which a collect_media
+    export job fills in later.
+    """
+    if request.format not in REFERENCE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
+    if request.media not in REFERENCE_MEDIA_MODES:
+        raise HTTPException(status_code=400, detail=f"media must be one of {list(REFERENCE_MEDIA_MODES)}")
+    await ensure_project_access(db, user, request.project_id)
+    
+    export_id = str(uuid.uuid4())
+    content = await build_reference_project(
+        db, storage_manager, request.project_id, request.editor_state, export_id, request.format, request.media
+    )
+    
+    extension, media_type = REFERENCE_FORMATS[request.format]
+    return Response(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="Export_{export_id}.{extension}"'}
+    )
+
+
+async def load_export_inputs(request: StoryboardExportRequest, db: AsyncIOMotorDatabase):
+    """
+    Validate an export request and load its shots and scenes.
+    
+    The slim shot records (EXPORT_SHOT_PROJECTION) are collected in full:
+    the artifact fingerprint covers every shot before anything is built,
+    and the layouts need the whole ordered set (scene grouping, page
+    breaks, key frame selection). What scales with the project, the
+    images, is handled incrementally by the builders: the PDF storyboard
+    fetches panels scene by scene and png_strip through a bounded window.
+    """
+    
+    if request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
     
     # Get shots
     query = {"project_id": request.project_id, "status": "completed"}
@@ -60,96 +155,68 @@ async def export_storyboard(
     elif request.scene_ids:
         query["scene_id"] = {"$in": request.scene_ids}
     
-    shots = await db.get_collection("shots").find(query).sort("shot_number", 1).to_list(length=500)
+    # Streamed in batches with only the fields the exports read, so there is no
+    # cap on project size and prompt data or embeddings are never loaded
+    shots = [
+        shot async for shot in iter_documents(
+            db.get_collection("shots"), query,
+            projection=EXPORT_SHOT_PROJECTION, sort=[("shot_number", 1), ("_id", 1)]
+        )
+    ]
     
     if not shots:
         raise HTTPException(status_code=400, detail="No completed shots to export")
     
     # Get scenes for context
     scene_ids = list(set(s.get("scene_id") for s in shots if s.get("scene_id")))
-    scenes = await db.get_collection("scenes").find({
-        "id": {"$in": scene_ids}
-    }).to_list(length=100)
-    scenes_map = {s.get("id"): s for s in scenes}
-    
-    if request.format == "pdf":
-        return await generate_pdf_storyboard(
-            request.project_name, shots, scenes_map, request.options
-        )
-    elif request.format == "png_strip":
-        return await generate_image_strips(
-            request.project_name, shots, scenes_map
+    scenes_map = {
+        s.get("id"): s async for s in iter_documents(
+            db.get_collection("scenes"), {"id": {"$in": scene_ids}},
+            projection={"_id": 0, "id": 1, "slug_line": 1}
         )
-    elif request.format == "pitch_deck":
-        return await generate_pitch_deck(
-            request.project_name, shots, scenes_map, request.options
-        )
-    elif request.format == "fcpxml":
-        return await generate_fcpxml(
-            request.project_name, shots, scenes_map
-        )
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
+    }
+    
+    return shots, scenes_map
+
+
+def export_filename(request: StoryboardExportRequest) -> str:
+    return f'{request.project_name.replace(" ", "_")}{EXPORT_FORMATS[request.format][0]}'
+
+
+def storyboard_builder(request: StoryboardExportRequest, shots: List[Dict], scenes_map: Dict):
+    """Return a coroutine function producing the artifact for the requested format"""
+    
+    async def build(report: BuildReport):
+        if request.format == "pdf":
+            return await generate_pdf_storyboard(
+                request.project_name, shots, scenes_map, request.options, report
+            )
+        elif request.format == "png_strip":
+            return await generate_image_strips(
+                request.project_name, shots, scenes_map, report
+            )
+        elif request.format == "pitch_deck":
+            return await generate_pitch_deck(
+                request.project_name, shots, scenes_map, request.options, report
+            )
+        else:
+            return await generate_fcpxml(
+                request.project_name, shots, scenes_map
+            )
+    
+    return build
 
 
 async def generate_pdf_storyboard(
     project_name: str,
     shots: List[Dict],
     scenes_map: Dict,
-    options: Dict
-) -> StreamingResponse:
-    """Generate PDF storyboard with panels"""
-    
-    paper_size = PAPER_SIZES.get(options.get("paperSize", "letter"), letter)
-    panels_per_row = options.get("panelsPerRow", 3)
-    include_notes = options.get("includeNotes", True)
-    include_dialogue = options.get("includeDialogue", True)
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=paper_size,
-        rightMargin=0.5*inch,
-        leftMargin=0.5*inch,
-        topMargin=0.75*inch,
-        bottomMargin=0.5*inch
-    )
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=20,
-        textColor=colors.black
-    )
-    scene_style = ParagraphStyle(
-        'Scene',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceBefore=20,
-        spaceAfter=10,
-        textColor=colors.darkgray
-    )
-    shot_style = ParagraphStyle(
-        'Shot',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.gray
-    )
-    
-    elements = []
-    
-    # Title page
-    elements.append(Spacer(1, 2*inch))
-    elements.append(Paragraph(project_name, title_style))
-    elements.append(Paragraph("Storyboard", styles['Heading2']))
-    elements.append(Spacer(1, 0.5*inch))
-    elements.append(Paragraph(f"Generated: {datetime.now().strftime('%B %d, %Y')}", styles['Normal']))
-    elements.append(Paragraph(f"{len(shots)} shots", styles['Normal']))
-    elements.append(PageBreak())
+    options: Dict,
+    report: BuildReport
+) -> str:
+    """Generate PDF storyboard with panels; returns the path of the spooled file"""
     
-    # Group shots by scene
+    # Group by scene
     shots_by_scene = {}
     for shot in shots:
         scene_id = shot.get("scene_id", "unsorted")
@@ -157,233 +224,184 @@ async def generate_pdf_storyboard(
             shots_by_scene[scene_id] = []
         shots_by_scene[scene_id].append(shot)
     
-    # Create storyboard pages
+    # Reuse the cached pages of every scene whose shots and layout are unchanged
+    parts = []  # (fragment key, slug line, shots, cached fragment path or None)
     for scene_id, scene_shots in shots_by_scene.items():
-        scene = scenes_map.get(scene_id, {})
+        slug_line = scenes_map.get(scene_id, {}).get("slug_line", f"Scene {scene_id}")
+        key = storyboard_fragment_key(slug_line, scene_shots, options)
+        parts.append((key, slug_line, scene_shots, cached_fragment(key)))
+    
+    stale = [part for part in parts if part[3] is None]
+    
+    # Fragments rendered with missing images are used for this export only
+    uncached = []
+    
+    # Only the panels of scenes being re-rendered are fetched, already shrunk to panel size.
+    # Scenes are fetched one at a time (each fetch is itself concurrent) and rendered
+    # PDF_RENDER_WORKERS at a time, so only the panels of the scenes in progress are held
+    # in memory rather than every panel of the export
+    scene_slots = asyncio.Semaphore(PDF_RENDER_WORKERS)
+    fetch_lock = asyncio.Lock()
+    
+    async def render_fragment(key, slug_line, scene_shots):
+        async with scene_slots:
+            async with fetch_lock:
+                scene_images = await image_prefetcher.fetch_all(
+                    [shot.get("proxy_path") or shot.get("gcs_path") for shot in scene_shots],
+                    *PANEL_SIZE,
+                    dpi=options.get("imageDpi", DEFAULT_IMAGE_DPI)
+                )
+            report.missing_images += sum(1 for data in scene_images.values() if data is None)
+            path, render_ms, cached = await render_storyboard_fragment(
+                key, slug_line, scene_shots, options, scene_images
+            )
+        report.render_ms += render_ms
+        if not cached:
+            uncached.append(path)
+        return key, path
+    
+    title_path = await render_pdf_file(report, "storyboard_title", project_name, len(shots), options)
+    try:
+        try:
+            rendered = dict(await asyncio.gather(*(
+                render_fragment(key, slug_line, scene_shots) for key, slug_line, scene_shots, _ in stale
+            )))
+        except MemoryError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         
-        # Scene header
-        slug_line = scene.get("slug_line", f"Scene {scene_id}")
-        elements.append(Paragraph(slug_line, scene_style))
+        fragment_paths = [cached or rendered[key] for key, _, _, cached in parts]
+        print(f"Storyboard: reused {len(parts) - len(stale)} of {len(parts)} scene fragments")
         
-        # Create panel rows
-        for i in range(0, len(scene_shots), panels_per_row):
-            row_shots = scene_shots[i:i + panels_per_row]
-            
-            # Panel images row
-            panel_data = []
-            for shot in row_shots:
-                # Download image from GCS or use placeholder
-                img_url = shot.get("proxy_path") or shot.get("gcs_path")
-                
-                if img_url:
-                    try:
-                        # For local testing, use a placeholder
-                        # In production, download from GCS
-                        img = Image(img_url, width=2*inch, height=1.125*inch)
-                    except:
-                        img = Paragraph("[Image]", styles['Normal'])
-                else:
-                    img = Paragraph("[Pending]", styles['Normal'])
-                
-                panel_data.append(img)
-            
-            # Pad row if needed
-            while len(panel_data) < panels_per_row:
-                panel_data.append("")
-            
-            table = Table([panel_data], colWidths=[2.2*inch] * panels_per_row)
-            table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOX', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-            ]))
-            elements.append(table)
-            
-            # Shot info row
-            info_data = []
-            for shot in row_shots:
-                shot_type = shot.get("shot_type", "medium").upper()[:3]
-                shot_num = shot.get("shot_number", 0)
-                desc = shot.get("description", shot.get("prompt", ""))[:100]
-                
-                info_text = f"<b>{shot_type}-{shot_num}</b><br/>{desc}"
-                if include_notes and shot.get("notes"):
-                    info_text += f"<br/><i>{shot.get('notes')}</i>"
-                
-                info_data.append(Paragraph(info_text, shot_style))
-            
-            while len(info_data) < panels_per_row:
-                info_data.append("")
-            
-            info_table = Table([info_data], colWidths=[2.2*inch] * panels_per_row)
-            info_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('TOPPADDING', (0, 0), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            elements.append(info_table)
-            elements.append(Spacer(1, 0.2*inch))
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f'attachment; filename="{project_name.replace(" ", "_")}_storyboard.pdf"'
-        }
-    )
+        return await render_pdf_file(report, "merge", [title_path] + fragment_paths)
+    finally:
+        os.remove(title_path)
+        for path in uncached:
+            os.remove(path)
+        prune_fragments()
+
+
+async def render_pdf_file(report: BuildReport, builder_name: str, *args) -> str:
+    """Render a PDF off the event loop into a spool file, adding the render time to `report`"""
+    try:
+        path, render_ms = await render_pdf(builder_name, *args)
+    except MemoryError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    report.render_ms += render_ms
+    return path
 
 
 async def generate_image_strips(
     project_name: str,
     shots: List[Dict],
-    scenes_map: Dict
-) -> StreamingResponse:
-    """Generate ZIP file with image strips per scene"""
-    
-    buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # Group by scene
-        shots_by_scene = {}
-        for shot in shots:
-            scene_id = shot.get("scene_id", "unsorted")
-            if scene_id not in shots_by_scene:
-                shots_by_scene[scene_id] = []
-            shots_by_scene[scene_id].append(shot)
+    scenes_map: Dict,
+    report: BuildReport
+):
+    """Generate ZIP file with image strips per scene; returns an async byte stream"""
+    
+    # Group by scene
+    shots_by_scene = {}
+    for shot in shots:
+        scene_id = shot.get("scene_id", "unsorted")
+        if scene_id not in shots_by_scene:
+            shots_by_scene[scene_id] = []
+        shots_by_scene[scene_id].append(shot)
+    
+    # Create a manifest
+    manifest = {
+        "project_name": project_name,
+        "generated_at": datetime.now().isoformat(),
+        "scenes": []
+    }
+    
+    entries = []  # (filename, image url, manifest entry)
+    for scene_id, scene_shots in shots_by_scene.items():
+        scene = scenes_map.get(scene_id, {})
+        slug_line = scene.get("slug_line", f"Scene_{scene_id}")
+        safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in slug_line)
         
-        # Create a manifest
-        manifest = {
-            "project_name": project_name,
-            "generated_at": datetime.now().isoformat(),
-            "scenes": []
+        scene_manifest = {
+            "id": scene_id,
+            "slug_line": slug_line,
+            "shots": []
         }
         
-        for scene_id, scene_shots in shots_by_scene.items():
-            scene = scenes_map.get(scene_id, {})
-            slug_line = scene.get("slug_line", f"Scene_{scene_id}")
-            safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in slug_line)
-            
-            scene_manifest = {
-                "id": scene_id,
-                "slug_line": slug_line,
-                "shots": []
+        for i, shot in enumerate(scene_shots):
+            shot_info = {
+                "number": i + 1,
+                "type": shot.get("shot_type", "medium"),
+                "description": shot.get("description", ""),
+                "filename": f"{safe_name}/shot_{i+1:03d}.jpg"
             }
+            scene_manifest["shots"].append(shot_info)
             
-            for i, shot in enumerate(scene_shots):
-                shot_info = {
-                    "number": i + 1,
-                    "type": shot.get("shot_type", "medium"),
-                    "description": shot.get("description", ""),
-                    "filename": f"{safe_name}/shot_{i+1:03d}.jpg"
-                }
-                scene_manifest["shots"].append(shot_info)
-                
-                # Add shot image (placeholder for now)
-                img_url = shot.get("proxy_path")
-                if img_url:
-                    # In production, download from GCS
-                    # For now, create placeholder
-                    zf.writestr(
-                        f"{safe_name}/shot_{i+1:03d}.jpg",
-                        f"Placeholder for shot {i+1}".encode()
-                    )
-            
-            manifest["scenes"].append(scene_manifest)
+            img_url = shot.get("proxy_path")
+            if img_url:
+                entries.append((shot_info["filename"], img_url, shot_info))
         
-        # Add manifest
-        import json
-        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+        manifest["scenes"].append(scene_manifest)
     
-    buffer.seek(0)
+    async def stream_zip():
+        loop = asyncio.get_running_loop()
+        archive = ZipStream()
+        
+        def start_fetch(entry):
+            filename, img_url, shot_info = entry
+            return filename, shot_info, loop.run_in_executor(None, image_prefetcher.read_source, img_url)
+        
+        # Keep a bounded window of downloads in flight so memory stays flat for any shot count
+        remaining = iter(entries)
+        pending = deque(start_fetch(e) for e in itertools.islice(remaining, STRIP_FETCH_WINDOW))
+        
+        while pending:
+            filename, shot_info, fetch = pending.popleft()
+            for entry in itertools.islice(remaining, 1):
+                pending.append(start_fetch(entry))
+            
+            try:
+                data = await fetch
+            except Exception as e:
+                print(f"Could not fetch image for {filename}: {e}")
+                shot_info["filename"] = None
+                report.missing_images += 1
+                continue
+            
+            # JPEGs are already compressed; storing them avoids burning CPU for no gain
+            yield archive.add(filename, data)
+        
+        yield archive.add("manifest.json", json.dumps(manifest, indent=2).encode("utf-8"), compress=True)
+        yield archive.close()
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/zip",
-        headers={
-            "Content-Disposition": f'attachment; filename="{project_name.replace(" ", "_")}_strips.zip"'
-        }
-    )
+    return stream_zip()
 
 
 async def generate_pitch_deck(
     project_name: str,
     shots: List[Dict],
     scenes_map: Dict,
-    options: Dict
-) -> StreamingResponse:
-    """Generate pitch deck style PDF with key frames"""
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=TABLOID,  # Landscape-ish for presentations
-        rightMargin=0.5*inch,
-        leftMargin=0.5*inch,
-        topMargin=0.5*inch,
-        bottomMargin=0.5*inch
-    )
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'BigTitle',
-        parent=styles['Title'],
-        fontSize=48,
-        spaceAfter=30
-    )
-    
-    elements = []
-    
-    # Title slide
-    elements.append(Spacer(1, 3*inch))
-    elements.append(Paragraph(project_name, title_style))
-    elements.append(Paragraph("Visual Treatment", styles['Heading2']))
-    elements.append(PageBreak())
+    options: Dict,
+    report: BuildReport
+) -> str:
+    """Generate pitch deck style PDF with key frames; returns the path of the spooled file"""
     
     # Key frames - select every Nth shot for highlights
     key_shots = shots[::max(1, len(shots) // 10)][:10]  # Max 10 key frames
-    
-    for shot in key_shots:
-        scene = scenes_map.get(shot.get("scene_id"), {})
-        
-        # Full page image
-        elements.append(Spacer(1, 0.5*inch))
-        
-        img_url = shot.get("proxy_path")
-        if img_url:
-            try:
-                img = Image(img_url, width=9*inch, height=5*inch)
-                elements.append(img)
-            except:
-                elements.append(Paragraph("[Image]", styles['Normal']))
-        
-        elements.append(Spacer(1, 0.3*inch))
-        elements.append(Paragraph(scene.get("slug_line", ""), styles['Heading3']))
-        elements.append(Paragraph(shot.get("description", ""), styles['Normal']))
-        elements.append(PageBreak())
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f'attachment; filename="{project_name.replace(" ", "_")}_pitch_deck.pdf"'
-        }
+    images = await image_prefetcher.fetch_all(
+        [shot.get("proxy_path") for shot in key_shots],
+        *KEY_FRAME_SIZE,
+        dpi=options.get("imageDpi", DEFAULT_IMAGE_DPI)
     )
+    report.missing_images += sum(1 for data in images.values() if data is None)
+    
+    return await render_pdf_file(report, "pitch_deck", project_name, key_shots, scenes_map, images)
 
 
 async def generate_fcpxml(
     project_name: str,
     shots: List[Dict],
     scenes_map: Dict
-) -> StreamingResponse:
-    """Generate FCPXML for import into Final Cut Pro / DaVinci Resolve"""
+):
+    """Generate FCPXML for import into Final Cut Pro / DaVinci Resolve; returns an async byte stream"""
     
     # Calculate total duration
     total_duration = sum(shot.get("duration", 3.0) for shot in shots)
@@ -435,12 +453,7 @@ async def generate_fcpxml(
 </fcpxml>
 '''
     
-    buffer = io.BytesIO(fcpxml.encode('utf-8'))
+    async def stream_xml():
+        yield fcpxml.encode('utf-8')
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/xml",
-        headers={
-            "Content-Disposition": f'attachment; filename="{project_name.replace(" ", "_")}.fcpxml"'
-        }
-    )
+    return stream_xml()
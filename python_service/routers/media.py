@@ -0,0 +1,291 @@
+"""
+Media routes for SceneWeaver.
+Serves scrub frames, sprite sheets, waveform peaks, HLS and proxies, all
+with Range and conditional GET support.
+"""
+
+import os
+import uuid
+import shutil
+import hashlib
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from auth import RequireAuth, ensure_project_access
+from database import get_db
+from StorageManager import StorageManager
+from VideoProcessor import VideoProcessor
+from models import User
+from media_response import media_file_response
+
+router = APIRouter(prefix="/api/media", tags=["media"])
+
+storage_manager = StorageManager()
+video_processor = VideoProcessor()
+
+# Local cache for downloaded sources and derived media, one directory per shot
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "temp_media")
+
+FRAME_WIDTHS = (160, 320, 640)
+
+# Storage prefixes of project audio blobs that get a .peaks sidecar (see AudioProcessor);
+# SFX sidecars are handed out as signed URLs, like the SFX audio itself
+PEAKS_PREFIXES = ("assets/synced/",)
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans
+QUERY_SHAPES = [
+    ("shots", {"id": "s"}, None),
+    ("shots", {"peaks_path": "p"}, None),
+]
+
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4"
+}
+
+
+class PlaybackMetricRequest(BaseModel):
+    shot_id: str
+    mode: str  # hls, progressive
+    startup_ms: float
+    rendition: Optional[str] = None
+
+
+async def get_owned_shot(shot_id: str, user: User, db: AsyncIOMotorDatabase) -> dict:
+    """Fetch a shot and verify the user owns its project"""
+    shot = await db.get_collection("shots").find_one({"id": shot_id})
+    if not shot:
+        raise HTTPException(status_code=404, detail="Shot not found")
+
+    try:
+        await ensure_project_access(db, user, shot.get("project_id"))
+    except HTTPException:
+        raise HTTPException(status_code=404, detail="Shot not found")
+
+    return shot
+
+
+def shot_cache_dir(shot_id: str) -> str:
+    path = os.path.join(MEDIA_CACHE_DIR, shot_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clear_shot_cache(shot_id: str):
+    """Drop cached media for a shot, e.g. after its video was replaced"""
+    shutil.rmtree(os.path.join(MEDIA_CACHE_DIR, shot_id), ignore_errors=True)
+
+
+async def get_local_source(shot: dict) -> str:
+    """Download the shot's proxy (or high-res) video once and reuse it"""
+    gcs_path = shot.get("proxy_path") or shot.get("gcs_path")
+    if not gcs_path:
+        raise HTTPException(status_code=404, detail="Shot has no video")
+
+    local_path = os.path.join(shot_cache_dir(shot["id"]), "source.mp4")
+    if not os.path.exists(local_path):
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}.part"
+        await run_in_threadpool(storage_manager.download_file, gcs_path, tmp_path)
+        os.replace(tmp_path, local_path)
+    return local_path
+
+
+async def get_cached_blob(cache_key: str, gcs_path: str, filename: str) -> str:
+    """Download a derived media blob into a cache directory (usually a shot id) once"""
+    local_path = os.path.join(shot_cache_dir(cache_key), filename)
+    if not os.path.exists(local_path):
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}.part"
+        await run_in_threadpool(storage_manager.download_file, gcs_path, tmp_path)
+        os.replace(tmp_path, local_path)
+    return local_path
+
+
+async def get_keyframe_index(shot: dict, source_path: str, db: AsyncIOMotorDatabase) -> dict:
+    """Return the shot's stored keyframe index, building it on first use"""
+    index = shot.get("keyframe_index")
+    if index:
+        return index
+
+    index = await run_in_threadpool(video_processor.build_keyframe_index, source_path)
+    await db.get_collection("shots").update_one(
+        {"id": shot["id"]},
+        {"$set": {"keyframe_index": index}}
+    )
+    return index
+
+
+@router.get("/shots/{shot_id}/frame")
+async def get_shot_frame(
+    shot_id: str,
+    request: Request,
+    t: float = Query(0.0, ge=0),
+    width: int = 320,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get a JPEG frame of a video shot at time `t` (seconds)"""
+    if width not in FRAME_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"width must be one of {list(FRAME_WIDTHS)}")
+
+    shot = await get_owned_shot(shot_id, user, db)
+
+    # The index is built once per video; after that cached frames never touch the source
+    index = shot.get("keyframe_index")
+    if not index:
+        source_path = await get_local_source(shot)
+        index = await get_keyframe_index(shot, source_path, db)
+
+    # Snap to the frame grid so nearby scrub positions share a cache entry
+    fps = index.get("fps") or 24.0
+    frame_number = int(round(t * fps))
+    frame_path = os.path.join(shot_cache_dir(shot_id), f"frame_{width}_{frame_number}.jpg")
+
+    if not os.path.exists(frame_path):
+        source_path = await get_local_source(shot)
+        timestamp = min(frame_number / fps, max(0.0, index.get("duration", 0) - 1 / fps))
+
+        tmp_path = f"{frame_path}.{uuid.uuid4().hex}.part.jpg"
+        try:
+            await run_in_threadpool(
+                video_processor.extract_frame, source_path, tmp_path, timestamp, index, width
+            )
+            os.replace(tmp_path, frame_path)
+        except Exception as e:
+            print(f"Error extracting frame for shot {shot_id}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise HTTPException(status_code=500, detail="Frame extraction failed")
+
+    return media_file_response(request, frame_path, "image/jpeg", cache_control="private, max-age=86400")
+
+
+@router.get("/shots/{shot_id}/sprite.jpg")
+async def get_shot_sprite(
+    shot_id: str,
+    request: Request,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get the scrub sprite sheet for a video shot"""
+    shot = await get_owned_shot(shot_id, user, db)
+    sprite = shot.get("sprite")
+    if not sprite:
+        raise HTTPException(status_code=404, detail="Shot has no sprite sheet")
+
+    path = await get_cached_blob(shot_id, sprite["gcs_path"], "sprite.jpg")
+    return media_file_response(request, path, "image/jpeg", cache_control="private, max-age=86400")
+
+
+@router.get("/shots/{shot_id}/thumbnails.vtt")
+async def get_shot_thumbnails_vtt(
+    shot_id: str,
+    request: Request,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get the WebVTT thumbnail track; cues point into sprite.jpg next to it"""
+    shot = await get_owned_shot(shot_id, user, db)
+    sprite = shot.get("sprite")
+    if not sprite:
+        raise HTTPException(status_code=404, detail="Shot has no sprite sheet")
+
+    path = await get_cached_blob(shot_id, sprite["vtt_gcs_path"], "thumbnails.vtt")
+    return media_file_response(request, path, "text/vtt", cache_control="private, max-age=86400")
+
+
+@router.get("/peaks/{audio_path:path}")
+async def get_audio_peaks(
+    audio_path: str,
+    request: Request,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get the binary waveform peaks sidecar of an audio blob belonging to one of the user's shots"""
+    if ".." in audio_path or not audio_path.startswith(PEAKS_PREFIXES):
+        raise HTTPException(status_code=404, detail="Peaks not found")
+
+    peaks_path = os.path.splitext(audio_path)[0] + ".peaks"
+
+    owner = await db.get_collection("shots").find_one({"peaks_path": peaks_path}, {"project_id": 1})
+    if not owner:
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    try:
+        await ensure_project_access(db, user, owner.get("project_id"))
+    except HTTPException:
+        raise HTTPException(status_code=404, detail="Peaks not found")
+
+    try:
+        path = await get_cached_blob("peaks", peaks_path, peaks_path.replace("/", "_"))
+    except Exception as e:
+        print(f"Error fetching peaks {peaks_path}: {e}")
+        raise HTTPException(status_code=404, detail="Peaks not found")
+
+    # Sidecars sit next to uniquely named blobs and never change once written
+    return media_file_response(
+        request, path, "application/octet-stream",
+        cache_control="private, max-age=31536000, immutable",
+        etag=f'"{hashlib.sha1(peaks_path.encode()).hexdigest()}"'
+    )
+
+
+@router.get("/shots/{shot_id}/hls/{filename}")
+async def get_shot_hls_file(
+    shot_id: str,
+    filename: str,
+    request: Request,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get an HLS playlist or segment; playlists reference their files relatively"""
+    shot = await get_owned_shot(shot_id, user, db)
+    hls = shot.get("hls")
+    if not hls or filename not in hls.get("files", []):
+        raise HTTPException(status_code=404, detail="HLS file not found")
+
+    path = await get_cached_blob(shot_id, f"{hls['prefix']}/{filename}", f"hls_{filename}")
+    media_type = HLS_MEDIA_TYPES.get(os.path.splitext(filename)[1], "application/octet-stream")
+    return media_file_response(request, path, media_type, cache_control="private, max-age=86400")
+
+
+@router.get("/shots/{shot_id}/proxy")
+async def get_shot_proxy(
+    shot_id: str,
+    request: Request,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Stream the locally cached proxy of a video shot (supports seeking via Range)"""
+    shot = await get_owned_shot(shot_id, user, db)
+    path = await get_local_source(shot)
+    return media_file_response(request, path, "video/mp4")
+
+
+@router.post("/playback-metrics")
+async def record_playback_metric(
+    request: PlaybackMetricRequest,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Record time-to-first-frame reported by the review player for HLS vs progressive playback"""
+    if request.mode not in ("hls", "progressive"):
+        raise HTTPException(status_code=400, detail="mode must be 'hls' or 'progressive'")
+
+    await db.get_collection("logs").insert_one({
+        "timestamp": datetime.utcnow(),
+        "level": "info",
+        "service": "playback",
+        "message": f"{request.mode} playback started in {request.startup_ms:.0f} ms",
+        "meta": {
+            "shot_id": request.shot_id,
+            "user_id": user.id,
+            "mode": request.mode,
+            "startup_ms": request.startup_ms,
+            "rendition": request.rendition
+        }
+    })
+    return {"status": "success"}
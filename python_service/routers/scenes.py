@@ -7,15 +7,38 @@ import uuid
 import asyncio
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request, Response
 from pydantic import BaseModel
+from pymongo import ReturnDocument
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from auth import get_current_user, RequireAuth
-from database import get_db
+from auth import get_current_user, RequireAuth, RequireProjectAccess
+from database import get_db, find_listing, iter_documents, id_filter, list_projection, MAX_PAGE_SIZE
 from models import Scene, Shot, ShotPromptData, BatchGenerationJob, User
-
-router = APIRouter(prefix="/api/projects/{project_id}", tags=["scenes"])
+from changes import stamp, record_deletions, revalidate
+
+# Every route here is project-scoped, so ownership of {project_id} is checked once for the router
+router = APIRouter(
+    prefix="/api/projects/{project_id}", tags=["scenes"], dependencies=[RequireProjectAccess]
+)
+
+# Queries issued below, checked against the indexes by indexes.verify_query_plans;
+# listings are also read page by page (database.find_page)
+QUERY_SHAPES = [
+    ("scenes", {"project_id": "p"}, [("order_index", 1), ("_id", 1)]),
+    ("scenes", {"$and": [{"project_id": "p"}, {"$or": [{"order_index": {"$gt": 0}}, {"order_index": 0, "_id": {"$gt": "x"}}]}]}, [("order_index", 1), ("_id", 1)]),
+    ("scenes", {"project_id": "p"}, [("order_index", -1)]),
+    ("scenes", {"id": "sc", "project_id": "p"}, None),
+    ("shots", {"scene_id": "sc"}, None),
+    ("shots", {"scene_id": "sc", "project_id": "p"}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"$and": [{"scene_id": "sc", "project_id": "p"}, {"$or": [{"shot_number": {"$gt": 0}}, {"shot_number": 0, "_id": {"$gt": "x"}}]}]}, [("shot_number", 1), ("_id", 1)]),
+    ("shots", {"scene_id": {"$in": ["sc"]}, "status": {"$in": ["pending", "failed"]}}, None),
+    ("shots", {"id": "s"}, None),
+    ("assets", {"id": "a"}, None),
+    ("assets", {"id": {"$in": ["a"]}}, None),
+    ("batch_jobs", {"id": "j"}, None),
+    ("batch_jobs", {"project_id": "p"}, [("created_at", -1)]),
+]
 
 # --- Coverage Presets Configuration ---
 COVERAGE_PRESETS = {
@@ -139,25 +162,31 @@ class BreakdownRequest(BaseModel):
 @router.get("/scenes")
 async def get_scenes(
     project_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get all scenes for a project"""
-    # Verify project access
-    project = await db.get_collection("projects").find_one({
-        "$or": [{"_id": project_id}, {"id": project_id}],
-        "user_id": user.id
-    })
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    scenes = await db.get_collection("scenes").find(
-        {"project_id": project_id}
-    ).sort("order_index", 1).to_list(length=100)
-    
-    # Convert _id to id for frontend compatibility
+    """Get all scenes for a project; script_text is only included when named in `fields`"""
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
+    # Paged by order_index when limit/cursor are given; X-Next-Cursor points at the next page
+    try:
+        scenes, next_cursor = await find_listing(
+            db.get_collection("scenes"), {"project_id": project_id}, "order_index", limit, cursor,
+            projection=list_projection("scenes", fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
     for scene in scenes:
-        scene["id"] = str(scene.pop("_id", scene.get("id")))
+        scene.pop("_id", None)
     
     return scenes
 
@@ -170,14 +199,6 @@ async def create_scene(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Create a new scene"""
-    # Verify project access
-    project = await db.get_collection("projects").find_one({
-        "$or": [{"_id": project_id}, {"id": project_id}],
-        "user_id": user.id
-    })
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
     # Get next order_index if not provided
     order_index = request.order_index
     if order_index is None:
@@ -210,7 +231,7 @@ async def create_scene(
         "style_preset_id": request.style_preset_id,
         "characters": request.characters,
         "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        **await stamp(db, project_id)
     }
     
     await db.get_collection("scenes").insert_one(scene_data)
@@ -227,18 +248,34 @@ async def get_scene(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get a single scene"""
-    scene = await db.get_collection("scenes").find_one({
-        "$or": [{"_id": scene_id}, {"id": scene_id}],
-        "project_id": project_id
-    })
+    scene = await db.get_collection("scenes").find_one(
+        id_filter(scene_id, project_id=project_id), {"_id": 0}
+    )
     
     if not scene:
         raise HTTPException(status_code=404, detail="Scene not found")
     
-    scene["id"] = str(scene.pop("_id", scene.get("id")))
     return scene
 
 
+@router.get("/scenes/{scene_id}/script")
+async def get_scene_script(
+    project_id: str,
+    scene_id: str,
+    user: User = RequireAuth,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get only a scene's script text, which scene listings leave out"""
+    scene = await db.get_collection("scenes").find_one(
+        id_filter(scene_id, project_id=project_id), {"_id": 0, "script_text": 1}
+    )
+    
+    if not scene:
+        raise HTTPException(status_code=404, detail="Scene not found")
+    
+    return {"script_text": scene.get("script_text")}
+
+
 @router.put("/scenes/{scene_id}")
 async def update_scene(
     project_id: str,
@@ -250,26 +287,21 @@ async def update_scene(
     """Update a scene"""
     # Build update dict, excluding None values
     update_data = {k: v for k, v in request.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.utcnow()
     
     if not update_data:
         return {"status": "no_changes"}
+    update_data.update(await stamp(db, project_id))
     
-    result = await db.get_collection("scenes").update_one(
-        {"$or": [{"_id": scene_id}, {"id": scene_id}], "project_id": project_id},
-        {"$set": update_data}
+    scene = await db.get_collection("scenes").find_one_and_update(
+        id_filter(scene_id, project_id=project_id),
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if not scene:
         raise HTTPException(status_code=404, detail="Scene not found")
     
-    # Return updated scene
-    scene = await db.get_collection("scenes").find_one({
-        "$or": [{"_id": scene_id}, {"id": scene_id}],
-        "project_id": project_id
-    })
-    scene["id"] = str(scene.pop("_id", scene.get("id")))
-    
     return scene
 
 
@@ -282,16 +314,16 @@ async def delete_scene(
 ):
     """Delete a scene and its shots"""
     # Delete associated shots
+    shot_ids = await db.get_collection("shots").distinct("id", {"scene_id": scene_id})
     await db.get_collection("shots").delete_many({"scene_id": scene_id})
+    await record_deletions(db, project_id, "shots", shot_ids)
     
     # Delete scene
-    result = await db.get_collection("scenes").delete_one({
-        "$or": [{"_id": scene_id}, {"id": scene_id}],
-        "project_id": project_id
-    })
+    result = await db.get_collection("scenes").delete_one(id_filter(scene_id, project_id=project_id))
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Scene not found")
+    await record_deletions(db, project_id, "scenes", [scene_id])
     
     return {"status": "success"}
 
@@ -301,23 +333,32 @@ async def delete_scene(
 async def get_scene_shots(
     project_id: str,
     scene_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     user: User = RequireAuth,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get all shots for a scene"""
-    shots = await db.get_collection("shots").find({
-        "scene_id": scene_id,
-        "project_id": project_id
-    }).sort("shot_number", 1).to_list(length=500)
+    """Get all shots for a scene, or one page of them when limit/cursor are given"""
+    unchanged = await revalidate(request, response, db, project_id)
+    if unchanged:
+        return unchanged
+    try:
+        shots, next_cursor = await find_listing(
+            db.get_collection("shots"),
+            {"scene_id": scene_id, "project_id": project_id},
+            "shot_number", limit, cursor,
+            projection=list_projection("shots", fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     for shot in shots:
-        shot["id"] = str(shot.pop("_id", shot.get("id")))
-        # Normalize status for frontend
-        if shot.get("status") == "done":
-            shot["status"] = "completed"
-        # Add prompt from prompt_data if missing
-        if "prompt" not in shot and "prompt_data" in shot:
-            shot["prompt"] = shot["prompt_data"].get("prompt", "")
+        shot.pop("_id", None)
     
     return shots
 
@@ -346,7 +387,8 @@ async def create_shot(
         "camera_movement": request.camera_movement,
         "linked_cast_ids": request.linked_cast_ids,
         "linked_prop_ids": request.linked_prop_ids,
-        "created_at": datetime.utcnow()
+        "created_at": datetime.utcnow(),
+        **await stamp(db, project_id)
     }
     
     await db.get_collection("shots").insert_one(shot_data)
@@ -372,10 +414,7 @@ async def breakdown_scene(
     shot_types = preset["shot_types"]
     
     # Get scene if it exists
-    scene = await db.get_collection("scenes").find_one({
-        "$or": [{"_id": scene_id}, {"id": scene_id}],
-        "project_id": project_id
-    })
+    scene = await db.get_collection("scenes").find_one(id_filter(scene_id, project_id=project_id))
     
     # If scene doesn't exist, create it
     if not scene:
@@ -390,7 +429,7 @@ async def breakdown_scene(
             "coverage_preset": request.coverage_preset,
             "style_mode": request.style_mode,
             "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            **await stamp(db, project_id)
         }
         await db.get_collection("scenes").insert_one(scene)
     
@@ -409,6 +448,7 @@ async def breakdown_scene(
     
     # Generate shots based on coverage preset
     shots_to_insert = []
+    version = await stamp(db, project_id)
     
     # Determine number of shots based on scene length
     scene_length = len(request.scene_text) if request.scene_text else 100
@@ -459,15 +499,16 @@ async def breakdown_scene(
             "description": SHOT_TYPE_PROMPTS.get(shot_type, ""),
             "duration": 3.0,
             "linked_cast_ids": request.linked_cast_ids,
-            "created_at": datetime.utcnow()
+            "created_at": datetime.utcnow(),
+            **version
         }
         shots_to_insert.append(shot_data)
     
     # Delete existing shots for this scene (regenerating)
-    await db.get_collection("shots").delete_many({
-        "scene_id": scene_id,
-        "project_id": project_id
-    })
+    replaced = {"scene_id": scene_id, "project_id": project_id}
+    replaced_ids = await db.get_collection("shots").distinct("id", replaced)
+    await db.get_collection("shots").delete_many(replaced)
+    await record_deletions(db, project_id, "shots", replaced_ids)
     
     # Insert new shots
     if shots_to_insert:
@@ -493,6 +534,11 @@ async def get_batch_progress(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get batch generation progress for a project"""
+    return await batch_progress(db, project_id)
+
+
+async def batch_progress(db: AsyncIOMotorDatabase, project_id: str) -> dict:
+    """Progress of the project's most recent batch generation job"""
     job = await db.get_collection("batch_jobs").find_one({
         "project_id": project_id
     }, sort=[("created_at", -1)])
@@ -533,11 +579,13 @@ async def start_batch_generation(
     
     if request.scene_ids and not shot_ids:
         # Get all pending shots from specified scenes
-        shots = await db.get_collection("shots").find({
-            "scene_id": {"$in": request.scene_ids},
-            "status": {"$in": ["pending", "failed"]}
-        }).to_list(length=500)
-        shot_ids = [s.get("id") or str(s.get("_id")) for s in shots]
+        shot_ids = [
+            s["id"] async for s in iter_documents(
+                db.get_collection("shots"),
+                {"scene_id": {"$in": request.scene_ids}, "status": {"$in": ["pending", "failed"]}},
+                projection={"id": 1}
+            )
+        ]
     
     if not shot_ids:
         raise HTTPException(status_code=400, detail="No shots to generate")
@@ -613,7 +661,7 @@ async def process_batch_generation(
             # Update shot status
             await db.get_collection("shots").update_one(
                 {"id": shot_id},
-                {"$set": {"status": "processing"}}
+                {"$set": {"status": "processing", **await stamp(db, shot["project_id"])}}
             )
             
             # Generate image
@@ -636,7 +684,8 @@ async def process_batch_generation(
                         "status": "completed",
                         "gcs_path": gcs_path,
                         "proxy_path": public_url,
-                        "urls": {"high_res": gcs_path, "proxy": public_url}
+                        "urls": {"high_res": gcs_path, "proxy": public_url},
+                        **await stamp(db, shot["project_id"])
                     }}
                 )
                 
@@ -646,7 +695,7 @@ async def process_batch_generation(
                 print(f"Error generating shot {shot_id}: {e}")
                 await db.get_collection("shots").update_one(
                     {"id": shot_id},
-                    {"$set": {"status": "failed"}}
+                    {"$set": {"status": "failed", **await stamp(db, shot["project_id"])}}
                 )
                 failed += 1
             
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from compression import CompressionMiddleware
+from media_response import MediaFileResponse
+
+
+def run_media_response(path, size, media_type, accept_encoding):
+    """Send a MediaFileResponse through the middleware on a server offering zerocopysend"""
+    app = CompressionMiddleware(
+        MediaFileResponse(path, 0, size, media_type=media_type), minimum_size=100
+    )
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/media",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "extensions": {"http.response.zerocopysend": {}},
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "gzip, br", "identity"])
+@pytest.mark.parametrize("media_type", ["video/mp4", "application/pdf"])
+def test_zerocopysend_passes_through(tmp_path, accept_encoding, media_type):
+    path = tmp_path / "media.bin"
+    path.write_bytes(b"x" * 4096)
+
+    messages = run_media_response(str(path), 4096, media_type, accept_encoding)
+
+    assert [m["type"] for m in messages] == ["http.response.start", "http.response.zerocopysend"]
+    headers = dict(messages[0]["headers"])
+    assert b"content-encoding" not in headers
+    assert headers[b"content-length"] == b"4096"
+    assert messages[1]["count"] == 4096
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from export_cache import ExportArtifactCache
+
+
+class FakeCollection:
+    async def find_one(self, query):
+        return None
+
+
+class FakeDb:
+    def get_collection(self, name):
+        return FakeCollection()
+
+
+async def build_stream(report):
+    async def stream():
+        yield b"<fcpxml/>"
+    return stream()
+
+
+def test_streamed_export_releases_slot_when_client_leaves_before_streaming():
+    cache = ExportArtifactCache(storage_manager=None)
+
+    async def scenario():
+        response = await cache.serve(FakeDb(), "f", "p", "a.fcpxml", "application/xml", build_stream)
+        assert "f" in cache._inflight
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client went away")
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+
+    asyncio.run(scenario())
+    assert "f" not in cache._inflight
@@ -0,0 +1,66 @@
+import os
+import re
+import uuid
+import asyncio
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from indexes import QUERY_SHAPE_MODULES, collect_query_shapes, ensure_indexes, verify_query_plans
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scratch databases are created on, and dropped from, this server
+MONGODB_TEST_URL = os.getenv("MONGODB_TEST_URL", "mongodb://localhost:27017")
+
+# Generic helpers whose queries are declared by their callers, and the registry itself
+HELPER_MODULES = {"database", "indexes"}
+
+
+def querying_modules():
+    """Modules under python_service that touch a collection"""
+    modules = set()
+    for root, dirs, files in os.walk(SERVICE_DIR):
+        dirs[:] = [d for d in dirs if d not in ("tests", "__pycache__") and not d.startswith(".")]
+        for name in files:
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(root, name)
+            with open(path, encoding="utf-8") as f:
+                if re.search(r"get_collection\(", f.read()):
+                    module = os.path.relpath(path, SERVICE_DIR)[:-3].replace(os.sep, ".")
+                    modules.add(module)
+    return modules - HELPER_MODULES
+
+
+def test_every_querying_module_declares_its_query_shapes():
+    assert querying_modules() <= set(QUERY_SHAPE_MODULES)
+    assert collect_query_shapes()
+
+
+def test_query_shapes_use_an_index():
+    async def verify():
+        client = AsyncIOMotorClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=2000)
+        try:
+            await client.admin.command("ping")
+        except PyMongoError:
+            client.close()
+            return None
+
+        db = client[f"test_indexes_{uuid.uuid4().hex[:12]}"]
+        try:
+            shapes = collect_query_shapes()
+            # explain() on a missing collection reports EOF, which would hide a missing index
+            for collection_name in {collection for collection, _, _ in shapes}:
+                await db.create_collection(collection_name)
+            await ensure_indexes(db)
+            return await verify_query_plans(db, shapes)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    failures = asyncio.run(verify())
+    if failures is None:
+        pytest.skip(f"No MongoDB reachable at {MONGODB_TEST_URL}")
+    assert failures == []
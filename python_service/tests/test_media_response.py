@@ -0,0 +1,23 @@
+import pytest
+from fastapi import HTTPException
+
+from media_response import _parse_range
+
+
+@pytest.mark.parametrize("header, size, expected", [
+    ("bytes=0-99", 1000, (0, 99)),
+    ("bytes=900-", 1000, (900, 999)),
+    ("bytes=-100", 1000, (900, 999)),
+    ("bytes=-5000", 1000, (0, 999)),
+    ("bytes=0-1,5-9", 1000, None),
+])
+def test_parse_range(header, size, expected):
+    assert _parse_range(header, size) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-100", "bytes=0-", "bytes=0-0"])
+def test_range_on_empty_file_is_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        _parse_range(header, 0)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers["Content-Range"] == "bytes */0"
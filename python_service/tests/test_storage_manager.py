@@ -0,0 +1,41 @@
+import pytest
+
+from StorageManager import StorageManager
+
+
+class FakeBlob:
+    def __init__(self, size):
+        self.size = size
+        self.generation = 7
+        self.downloaded_with = None
+
+    def download_as_bytes(self, **kwargs):
+        self.downloaded_with = kwargs
+        return b"x" * self.size
+
+
+class FakeBucket:
+    def __init__(self, blob):
+        self._blob = blob
+
+    def get_blob(self, name):
+        return self._blob
+
+
+def storage_with(blob):
+    manager = StorageManager.__new__(StorageManager)
+    manager.bucket = FakeBucket(blob)
+    return manager
+
+
+def test_download_refuses_blobs_over_max_bytes_without_downloading():
+    blob = FakeBlob(size=2048)
+    with pytest.raises(ValueError):
+        storage_with(blob).download_as_bytes("images/big.png", max_bytes=1024)
+    assert blob.downloaded_with is None
+
+
+def test_download_within_max_bytes_is_pinned_to_the_checked_generation():
+    blob = FakeBlob(size=512)
+    assert storage_with(blob).download_as_bytes("images/small.png", max_bytes=1024) == b"x" * 512
+    assert blob.downloaded_with == {"if_generation_match": 7}
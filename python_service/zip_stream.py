@@ -0,0 +1,87 @@
+"""
+Streaming ZIP writer.
+
+zipfile falls back to data descriptors when its output cannot seek, so
+each entry can be sent as soon as it has been written instead of after
+the whole archive is finished. ZIP64 records are added automatically
+once the archive grows past the classic 4 GiB / 65535 entry limits.
+WriteOnly gives the same behaviour to archives that zipfile writes
+straight into another stream.
+"""
+
+import time
+import zipfile
+
+
+class _Sink:
+    """Write-only, unseekable buffer that is emptied after every entry"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class WriteOnly:
+    """
+    Wraps a writable stream for zipfile.ZipFile.
+
+    Hiding tell/seek makes zipfile track offsets itself and write data
+    descriptors, and flush is a no-op because some sinks (e.g. storage
+    upload writers) cannot flush without finalising. After abort(),
+    writes are dropped so a half-built archive is never sent on.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def write(self, data) -> int:
+        if self._raw is not None:
+            self._raw.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def abort(self):
+        self._raw = None
+
+
+class ZipStream:
+    """
+    Builds a ZIP archive entry by entry, returning the encoded bytes of each.
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zf = zipfile.ZipFile(self._sink, "w", allowZip64=True)
+
+    def add(self, name: str, data: bytes, compress: bool = False) -> bytes:
+        """
+        Adds an entry and returns the bytes to send for it.
+
+        Args:
+            name: Path of the entry inside the archive.
+            data: Entry contents.
+            compress: Deflate the entry. Leave off for already-compressed media.
+        """
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        self._zf.writestr(info, data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Writes the central directory and returns the final bytes of the archive"""
+        self._zf.close()
+        return self._sink.drain()
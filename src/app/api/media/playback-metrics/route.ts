@@ -0,0 +1,40 @@
+import { NextResponse, NextRequest } from "next/server";
+import { getServerSession } from "next-auth";
+import { authOptions } from "../../auth/[...nextauth]/route";
+
+// POST /api/media/playback-metrics - Time-to-first-frame reported by the review player
+export async function POST(request: NextRequest) {
+    try {
+        const session = await getServerSession(authOptions);
+        if (!session?.id_token) {
+            return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+        }
+
+        const body = await request.json();
+        const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
+        const res = await fetch(`${apiUrl}/api/media/playback-metrics`, {
+            method: "POST",
+            headers: {
+                "Authorization": `Bearer ${session.id_token}`,
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify(body),
+        });
+
+        if (!res.ok) {
+            return NextResponse.json(
+                { error: `Backend error: ${res.statusText}` },
+                { status: res.status }
+            );
+        }
+
+        return NextResponse.json(await res.json());
+    } catch (error) {
+        console.error("Error recording playback metric:", error);
+        return NextResponse.json(
+            { error: "Internal Server Error" },
+            { status: 500 }
+        );
+    }
+}
@@ -0,0 +1,63 @@
+import { NextResponse, NextRequest } from "next/server";
+import { getServerSession } from "next-auth";
+import { authOptions } from "../../../../auth/[...nextauth]/route";
+
+// Headers passed through in each direction; the backend handles Range and conditional GETs
+const REQUEST_HEADERS = ["range", "if-none-match", "if-modified-since", "if-range"];
+const RESPONSE_HEADERS = [
+    "content-type", "content-length", "content-range", "accept-ranges",
+    "etag", "last-modified", "cache-control",
+];
+
+// GET /api/media/shots/[shotId]/... - Shot media (proxy video, HLS playlists and segments).
+// HLS playlists reference their files relatively, so a whole rendition set resolves under this route.
+export async function GET(
+    request: NextRequest,
+    { params }: { params: Promise<{ shotId: string; path: string[] }> }
+) {
+    try {
+        const session = await getServerSession(authOptions);
+        if (!session?.id_token) {
+            return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+        }
+
+        const { shotId, path } = await params;
+        const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
+        const headers: Record<string, string> = { "Authorization": `Bearer ${session.id_token}` };
+        for (const name of REQUEST_HEADERS) {
+            const value = request.headers.get(name);
+            if (value) headers[name] = value;
+        }
+
+        const subpath = path.map(encodeURIComponent).join("/");
+        const res = await fetch(
+            `${apiUrl}/api/media/shots/${encodeURIComponent(shotId)}/${subpath}${request.nextUrl.search}`,
+            { headers, cache: "no-store" }
+        );
+
+        if (!res.ok && res.status !== 304) {
+            return NextResponse.json(
+                { error: res.status === 404 ? "Media not found" : `Backend error: ${res.statusText}` },
+                { status: res.status }
+            );
+        }
+
+        const responseHeaders = new Headers();
+        for (const name of RESPONSE_HEADERS) {
+            const value = res.headers.get(name);
+            if (value) responseHeaders.set(name, value);
+        }
+        // Video is streamed through rather than buffered
+        return new NextResponse(res.status === 304 ? null : res.body, {
+            status: res.status,
+            headers: responseHeaders,
+        });
+    } catch (error) {
+        console.error("Error fetching shot media:", error);
+        return NextResponse.json(
+            { error: "Internal Server Error" },
+            { status: 500 }
+        );
+    }
+}
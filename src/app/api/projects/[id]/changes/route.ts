@@ -0,0 +1,45 @@
+import { NextResponse, NextRequest } from "next/server";
+import { getServerSession } from "next-auth";
+import { authOptions } from "../../../auth/[...nextauth]/route";
+
+// GET /api/projects/[id]/changes - Scenes, shots, assets and comments written or
+// deleted since a snapshot's changes_cursor; a 410 means reload the snapshot
+export async function GET(
+    request: NextRequest,
+    { params }: { params: Promise<{ id: string }> }
+) {
+    try {
+        const session = await getServerSession(authOptions);
+        if (!session?.id_token) {
+            return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+        }
+
+        const { id } = await params;
+        const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
+        const res = await fetch(`${apiUrl}/api/projects/${id}/changes${request.nextUrl.search}`, {
+            headers: {
+                "Authorization": `Bearer ${session.id_token}`,
+            },
+        });
+
+        if (!res.ok) {
+            if (res.status === 404) {
+                return NextResponse.json({ error: "Project not found" }, { status: 404 });
+            }
+            return NextResponse.json(
+                { error: `Backend error: ${res.statusText}` },
+                { status: res.status }
+            );
+        }
+
+        const data = await res.json();
+        return NextResponse.json(data);
+    } catch (error) {
+        console.error("Error fetching project changes:", error);
+        return NextResponse.json(
+            { error: "Internal Server Error" },
+            { status: 500 }
+        );
+    }
+}
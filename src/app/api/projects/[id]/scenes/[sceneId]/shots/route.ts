@@ -11,13 +11,25 @@ export async function GET(
         const { id, sceneId } = await params;
         const authHeader = request.headers.get('authorization');
 
+        // Revalidate the browser's cached copy against the project version (ETag)
+        const ifNoneMatch = request.headers.get('if-none-match');
         const response = await fetch(`${PYTHON_API_URL}/api/projects/${id}/scenes/${sceneId}/shots`, {
             headers: {
                 'Authorization': authHeader || '',
-                'Content-Type': 'application/json'
-            }
+                'Content-Type': 'application/json',
+                ...(ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : {})
+            },
+            cache: 'no-store'
         });
 
+        const etag = response.headers.get('etag');
+        const cacheHeaders: Record<string, string> = etag
+            ? { 'ETag': etag, 'Cache-Control': response.headers.get('cache-control') || 'private, no-cache' }
+            : {};
+        if (response.status === 304) {
+            return new NextResponse(null, { status: 304, headers: cacheHeaders });
+        }
+
         if (!response.ok) {
             return NextResponse.json(
                 { error: 'Failed to fetch shots' },
@@ -26,7 +38,7 @@ export async function GET(
         }
 
         const shots = await response.json();
-        return NextResponse.json(shots);
+        return NextResponse.json(shots, { headers: cacheHeaders });
     } catch (error) {
         console.error('Error fetching shots:', error);
         return NextResponse.json(
@@ -11,13 +11,26 @@ export async function GET(
         const { id } = await params;
         const authHeader = request.headers.get('authorization');
 
-        const response = await fetch(`${PYTHON_API_URL}/api/projects/${id}/scenes`, {
+        // Pass fields/limit/cursor through; script_text is only listed when asked for
+        // Revalidate the browser's cached copy against the project version (ETag)
+        const ifNoneMatch = request.headers.get('if-none-match');
+        const response = await fetch(`${PYTHON_API_URL}/api/projects/${id}/scenes${request.nextUrl.search}`, {
             headers: {
                 'Authorization': authHeader || '',
-                'Content-Type': 'application/json'
-            }
+                'Content-Type': 'application/json',
+                ...(ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : {})
+            },
+            cache: 'no-store'
         });
 
+        const etag = response.headers.get('etag');
+        const cacheHeaders: Record<string, string> = etag
+            ? { 'ETag': etag, 'Cache-Control': response.headers.get('cache-control') || 'private, no-cache' }
+            : {};
+        if (response.status === 304) {
+            return new NextResponse(null, { status: 304, headers: cacheHeaders });
+        }
+
         if (!response.ok) {
             return NextResponse.json(
                 { error: 'Failed to fetch scenes' },
@@ -26,7 +39,7 @@ export async function GET(
         }
 
         const scenes = await response.json();
-        return NextResponse.json(scenes);
+        return NextResponse.json(scenes, { headers: cacheHeaders });
     } catch (error) {
         console.error('Error fetching scenes:', error);
         return NextResponse.json(
@@ -171,21 +171,15 @@ function ProductionContent() {
                 }
 
                 if (pid) {
-                    const res = await fetch(`/api/projects/${pid}`);
+                    // Project, scenes and shots in one round trip
+                    const res = await fetch(
+                        `/api/projects/${pid}/snapshot?sections=project,scenes,shots&fields=scenes.script_text`
+                    );
                     if (res.ok) {
-                        setProject(await res.json());
-                    }
-                    
-                    // Fetch scenes
-                    const scenesRes = await fetch(`/api/projects/${pid}/scenes`);
-                    if (scenesRes.ok) {
-                        setScenes(await scenesRes.json());
-                    }
-                    
-                    // Fetch shots
-                    const shotsRes = await fetch(`/api/projects/${pid}/shots`);
-                    if (shotsRes.ok) {
-                        setShots(await shotsRes.json());
+                        const snapshot = await res.json();
+                        setProject(snapshot.project);
+                        setScenes(snapshot.scenes);
+                        setShots(snapshot.shots);
                     }
                 }
             } catch (error) {
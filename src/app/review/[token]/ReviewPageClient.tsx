@@ -35,6 +35,7 @@ export default function ReviewPageClient({ data, token }: ReviewPageClientProps)
     const [reviewerName, setReviewerName] = useState('');
     const [submitting, setSubmitting] = useState(false);
     const [showShotDetail, setShowShotDetail] = useState(false);
+    const [playingShot, setPlayingShot] = useState<Shot | null>(null);
 
     const shots = data.shots || [];
     const scenes = data.scenes || [];
@@ -154,13 +155,16 @@ export default function ReviewPageClient({ data, token }: ReviewPageClientProps)
         );
     }
 
-    // Video mode
-    if (viewMode === 'video' && data.video_url) {
+    // Video mode: the project cut, or a single shot picked from the storyboard
+    if (viewMode === 'video' && (playingShot || data.video_url)) {
         return (
             <div className="h-screen">
                 <div className="absolute top-4 left-4 z-10">
                     <button
-                        onClick={() => setViewMode('storyboard')}
+                        onClick={() => {
+                            setPlayingShot(null);
+                            setViewMode('storyboard');
+                        }}
                         className="flex items-center gap-2 px-4 py-2 bg-black/50 backdrop-blur-md rounded-lg text-white hover:bg-black/70 transition-colors"
                     >
                         <Grid size={16} />
@@ -168,9 +172,11 @@ export default function ReviewPageClient({ data, token }: ReviewPageClientProps)
                     </button>
                 </div>
                 <ReviewPlayer
-                    videoUrl={data.video_url}
+                    key={playingShot?.id ?? 'project'}
+                    videoUrl={playingShot ? `/api/media/shots/${playingShot.id}/proxy` : data.video_url!}
                     projectId={data.project_id}
                     initialComments={comments}
+                    shotId={playingShot?.id}
                 />
             </div>
         );
@@ -272,6 +278,20 @@ export default function ReviewPageClient({ data, token }: ReviewPageClientProps)
                                     </div>
                                 )}
                                 
+                                {currentShot.proxy_path?.endsWith('.mp4') && (
+                                    <button
+                                        onClick={() => {
+                                            setPlayingShot(currentShot);
+                                            setViewMode('video');
+                                        }}
+                                        className="absolute inset-0 flex items-center justify-center bg-black/0 hover:bg-black/30 transition-colors group"
+                                    >
+                                        <span className="w-16 h-16 rounded-full bg-black/60 backdrop-blur-md flex items-center justify-center group-hover:bg-yellow-500 group-hover:text-black transition-colors">
+                                            <Play size={28} />
+                                        </span>
+                                    </button>
+                                )}
+
                                 {/* Shot Type Badge */}
                                 <div className="absolute top-4 left-4 px-3 py-1.5 bg-black/70 backdrop-blur-md rounded-lg">
                                     <span className="text-sm font-medium text-white">
@@ -55,7 +55,7 @@ export default function ScriptSidebar({ editor, projectId, onScenesSync }: Scrip
     const fetchSyncedScenes = useCallback(async () => {
         if (!projectId) return;
         try {
-            const res = await fetch(`/api/projects/${projectId}/scenes`);
+            const res = await fetch(`/api/projects/${projectId}/scenes?fields=script_text`);
             if (res.ok) {
                 const data = await res.json();
                 setSyncedScenes(data);
@@ -30,7 +30,7 @@ export default function SceneManager({ projectId, onScenesChange }: SceneManager
             setLoading(true);
             try {
                 const [scenesRes, assetsRes] = await Promise.all([
-                    fetch(`/api/projects/${projectId}/scenes`),
+                    fetch(`/api/projects/${projectId}/scenes?fields=script_text`),
                     fetch(`/api/projects/${projectId}/assets`)
                 ]);
 
@@ -4,14 +4,20 @@ import React, { useState, useRef, useEffect } from 'react';
 import { Play, Pause, MessageSquare, CheckCircle, Circle, PenTool, Trash2 } from 'lucide-react';
 import { Comment } from '@/types';
 
+type PlaybackMode = 'hls' | 'progressive';
+
 interface ReviewPlayerProps {
     videoUrl: string;
     projectId: string;
     initialComments?: Comment[];
+    // Set when playing a single shot; enables HLS playback and startup metrics
+    shotId?: string;
 }
 
-export default function ReviewPlayer({ videoUrl, projectId, initialComments = [] }: ReviewPlayerProps) {
+export default function ReviewPlayer({ videoUrl, projectId, initialComments = [], shotId }: ReviewPlayerProps) {
     const videoRef = useRef<HTMLVideoElement>(null);
+    const [source, setSource] = useState<{ url: string; mode: PlaybackMode } | null>(null);
+    const startupRef = useRef({ startedAt: 0, reported: false });
     const canvasRef = useRef<HTMLCanvasElement>(null);
     const [isPlaying, setIsPlaying] = useState(false);
     const [currentTime, setCurrentTime] = useState(0);
@@ -43,6 +49,45 @@ export default function ReviewPlayer({ videoUrl, projectId, initialComments = []
         return () => clearInterval(interval);
     }, [projectId]);
 
+    // Shots play from their HLS renditions where the browser supports HLS natively
+    useEffect(() => {
+        const canPlayHls = !!shotId && !!videoRef.current?.canPlayType('application/vnd.apple.mpegurl');
+        setSource(canPlayHls
+            ? { url: `/api/media/shots/${shotId}/hls/master.m3u8`, mode: 'hls' }
+            : { url: videoUrl, mode: 'progressive' });
+    }, [shotId, videoUrl]);
+
+    useEffect(() => {
+        startupRef.current = { startedAt: performance.now(), reported: false };
+    }, [source]);
+
+    // Time-to-first-frame, reported once per source so HLS and progressive startup can be compared
+    const handleLoadedData = () => {
+        const video = videoRef.current;
+        if (!shotId || !source || !video || startupRef.current.reported) return;
+        startupRef.current.reported = true;
+
+        fetch('/api/media/playback-metrics', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                shot_id: shotId,
+                mode: source.mode,
+                startup_ms: Math.round(performance.now() - startupRef.current.startedAt),
+                rendition: source.mode === 'hls' && video.videoHeight ? `${video.videoHeight}p` : undefined
+            })
+        }).catch(() => {
+            // Metrics are best-effort
+        });
+    };
+
+    const handleError = () => {
+        // Shots packaged without HLS (or unreachable playlists) fall back to the progressive proxy
+        if (source?.mode === 'hls') {
+            setSource({ url: videoUrl, mode: 'progressive' });
+        }
+    };
+
     const togglePlay = () => {
         if (videoRef.current) {
             if (isPlaying) {
@@ -224,10 +269,12 @@ export default function ReviewPlayer({ videoUrl, projectId, initialComments = []
                 <div className="flex-1 relative flex items-center justify-center bg-neutral-900">
                     <video
                         ref={videoRef}
-                        src={videoUrl}
+                        src={source?.url}
                         className="max-h-full max-w-full"
                         onTimeUpdate={handleTimeUpdate}
                         onLoadedMetadata={handleLoadedMetadata}
+                        onLoadedData={handleLoadedData}
+                        onError={handleError}
                         onClick={togglePlay}
                     />
                     {/* Annotation Layer */}